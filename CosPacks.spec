@@ -6,11 +6,34 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('.env', '.')],
-    hiddenimports=['app', 'app.main'],
+    hiddenimports=[
+        'app.main',
+        'uvicorn.logging',
+        'uvicorn.loops.auto',
+        'uvicorn.loops.asyncio',
+        'uvicorn.protocols.http.auto',
+        'uvicorn.protocols.http.h11_impl',
+        'uvicorn.lifespan.on',
+        'sqlalchemy.dialects.mssql.pyodbc',
+        'pyodbc',
+    ],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=[
+        'numpy',
+        'tkinter',
+        'PySide6.QtNetwork',
+        'PySide6.QtQml',
+        'PySide6.QtQuick',
+        'PySide6.QtWebEngineCore',
+        'PySide6.QtWebEngineWidgets',
+        'PySide6.QtMultimedia',
+        'PySide6.Qt3DCore',
+        'PySide6.QtCharts',
+        'PySide6.QtPdf',
+        'uvicorn.protocols.websockets',
+    ],
     noarchive=False,
     optimize=0,
 )
@@ -3,12 +3,13 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 import logging
 
-from app.db.base import get_db
+from app.db.base import get_batch_db
 from app.schemas.carrier_selection import (
     CarrierSelectionRequest,
     CarrierSelectionResponse,
     CarrierSelectionBatchRequest,
-    CarrierSelectionBatchResponse
+    CarrierSelectionBatchResponse,
+    CarrierOptimizationRequest
 )
 from app.services import carrier_selection_service
 
@@ -20,7 +21,7 @@ router = APIRouter()
 @router.post("/select", response_model=CarrierSelectionResponse)
 def select_carrier(
     request: CarrierSelectionRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_batch_db)
 ):
     """
     Select optimal carrier for a picking
@@ -29,7 +30,9 @@ def select_carrier(
     based on shipping metrics, carrier capacity, and cost.
     """
     try:
-        result = carrier_selection_service.select_carriers_for_picking(db, request.picking_id)
+        result = carrier_selection_service.select_carriers_for_picking(
+            db, request.picking_id, include_timings=request.include_timings
+        )
         return result
     except Exception as e:
         logger.error(f"Error selecting carrier: {str(e)}")
@@ -39,7 +42,7 @@ def select_carrier(
 def batch_select_carriers(
     request: CarrierSelectionBatchRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_batch_db)
 ):
     """
     Process carrier selection for multiple pickings in batch
@@ -53,7 +56,9 @@ def batch_select_carriers(
     print(f"Processing batch of {len(request.picking_ids)} pickings")
     if len(request.picking_ids) <= 10:
         try:
-            result = carrier_selection_service.batch_select_carriers(db, request.picking_ids)
+            result = carrier_selection_service.batch_select_carriers(
+                db, request.picking_ids, include_timings=request.include_timings
+            )
             return result
         except Exception as e:
             logger.error(f"Error processing batch carrier selection: {str(e)}")
@@ -72,10 +77,51 @@ def batch_select_carriers(
         "message": f"Processing {len(request.picking_ids)} pickings in background"
     }
 
+@router.post("/simulate", response_model=CarrierSelectionBatchResponse)
+def simulate_carrier_selection(
+    request: CarrierSelectionBatchRequest,
+    db: Session = Depends(get_batch_db)
+):
+    """
+    Preview carrier selection for multiple pickings without writing anything
+    
+    Runs the full selection against cached master data and returns the decisions
+    that would be made. No waybills, logs or SmileV updates are written; a later
+    batch-select of the same pickings reuses the computed waybill groupings.
+    """
+    try:
+        return carrier_selection_service.simulate_carrier_selection(
+            db, request.picking_ids, include_timings=request.include_timings
+        )
+    except Exception as e:
+        logger.error(f"Error simulating carrier selection: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error simulating carrier selection: {str(e)}")
+
+@router.post("/optimize", response_model=CarrierSelectionBatchResponse)
+def optimize_carrier_selection(
+    request: CarrierOptimizationRequest,
+    db: Session = Depends(get_batch_db)
+):
+    """
+    Assign carriers to all waybills of a set of pickings at once
+    
+    Minimizes the total fee of the wave subject to the carriers' daily capacity,
+    delivery deadlines and a preference for previously used carriers, instead of
+    choosing greedily one waybill at a time. With dry_run (the default) the
+    assignment is only returned; otherwise it is written like batch-select.
+    """
+    try:
+        return carrier_selection_service.optimize_carrier_selection(
+            db, request.picking_ids, include_timings=request.include_timings, dry_run=request.dry_run
+        )
+    except Exception as e:
+        logger.error(f"Error optimizing carrier selection: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error optimizing carrier selection: {str(e)}")
+
 @router.get("/{picking_id}", response_model=CarrierSelectionResponse)
 def get_carrier_selection(
     picking_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_batch_db)
 ):
     """
     Get carrier selection results for a picking
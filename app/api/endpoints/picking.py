@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import Optional
 
-from app.db.base import get_db
+from app.db.base import get_read_db
 from app.schemas.picking import PickingList
 from app.services import picking_service
 
@@ -10,6 +10,8 @@ router = APIRouter()
 
 @router.get("/", response_model=PickingList)
 def read_pickings(
+    request: Request,
+    response: Response,
     skip: int = 0, 
     limit: int = 50,
     query: Optional[str] = None,
@@ -17,13 +19,16 @@ def read_pickings(
     # shipping_date_to: Optional[str] = None,
     # customer_code: Optional[str] = None,
     # staff_code: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Retrieve pickings with pagination and optional filtering.
     - **skip**: Number of records to skip (pagination)
     - **limit**: Number of records to return per page
     - **query**: Filter by query
+
+    Responses carry an ETag; a request whose If-None-Match matches it is
+    answered with 304 Not Modified.
     """
     filters = {}
     
@@ -41,11 +46,20 @@ def read_pickings(
     
     if query:
         filters["query"] = query
-    result = picking_service.get_pickings(db, skip=skip, limit=limit, filters=filters)
+    page, etag = picking_service.get_picking_page(db, skip=skip, limit=limit, filters=filters)
+
+    # Clients may keep the page but must revalidate it
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return page
+
 
-    return {
-        "pickings": result["pickings"],
-        "total": result["total"],
-        "page": skip // limit + 1 if limit > 0 else 1,
-        "size": limit
-    }
\ No newline at end of file
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # Weak comparison: compressed responses may come back as W/"..."
+    return "*" in candidates or etag in [candidate[2:] if candidate.startswith("W/") else candidate
+                                         for candidate in candidates]
\ No newline at end of file
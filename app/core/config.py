@@ -44,6 +44,57 @@ class Settings(BaseSettings):
 
     CARRIER_UNASSIGNED_CODE: str = "95"
 
+    # Carrier selection caches
+    MASTER_DATA_CACHE_TTL: int = 300  # Seconds before cached master data is reloaded
+    MASTER_DATA_VERSION_CHECK_INTERVAL: int = 30  # Seconds between probes for master data changes
+    SELECTION_PLAN_CACHE_SIZE: int = 200  # Pickings whose dry-run waybill groupings are kept
+    SELECTION_PLAN_TTL: int = 1800  # Seconds a dry-run grouping may be reused by a commit
+    SELECTION_MEMO_SIZE: int = 5000  # Shipment fingerprints whose carrier evaluation is memoized
+    CAPACITY_LEDGER_TTL: int = 60  # Seconds before committed daily capacity usage is re-read
+    BATCH_PREVIOUS_CARRIER_BONUS: float = 0.1  # Fee fraction the previous carrier may cost more in batch optimization
+    BATCH_OPTIMIZER_MAX_ITERATIONS: int = 200  # Subgradient iterations of the batch optimizer
+    BATCH_OPTIMIZER_TIME_LIMIT: float = 10.0  # Seconds after which the batch optimizer returns its best assignment
+
+    # Picking list response cache
+    PICKING_LIST_CACHE_TTL: int = 30  # Seconds a picking list page is served from memory
+    PICKING_LIST_CACHE_SIZE: int = 200  # Pages (query, skip, limit) kept
+    PICKING_LIST_CHECK_INTERVAL: int = 5  # Seconds between probes of HAN99CA11PICKING for changes
+
+    # External postal code API (postcode-jp.com), asked when a postal code is not in HAN99MA45JYUYUHIMODUKE
+    POSTCODE_API_URL: str = "https://postcode-jp.com/api/postcode"
+    POSTCODE_API_KEY: str = ""  # Empty disables the API
+    POSTCODE_API_TIMEOUT: float = 5.0  # Seconds per API request
+    POSTCODE_API_CONCURRENCY: int = 4  # API requests in flight at once
+    POSTCODE_CACHE_SIZE: int = 20000  # Postal codes kept in the resolver's memory cache
+    POSTCODE_CACHE_TTL: int = 300  # Seconds a resolved postal code is kept in memory
+    POSTCODE_NEGATIVE_TTL: int = 3600  # Seconds an unknown postal code is remembered as unknown
+
+    # Readable secondary for the picking list and master data (see app.db.routing); for an
+    # availability group add ApplicationIntent=ReadOnly to the URL's query string
+    READ_REPLICA_URL: Optional[str] = None
+    READ_REPLICA_STICKY_SECONDS: float = 5.0  # Seconds after one of our own commits during which reads use the primary
+    READ_REPLICA_RETRY_SECONDS: float = 60.0  # Seconds reads stay on the primary after the replica could not be reached
+
+    # Connection pools (see app.db.pool): interactive reads, batch carrier selection and write-back
+    DB_POOL_SIZE: int = 5  # Connections kept open for interactive reads (picking list, UI)
+    DB_MAX_OVERFLOW: int = 10  # Extra interactive connections opened under load
+    DB_BATCH_POOL_SIZE: int = 3  # Connections kept open for carrier selection runs
+    DB_BATCH_MAX_OVERFLOW: int = 5
+    DB_WRITE_POOL_SIZE: int = 1  # Connections kept open for imports and cache write-back
+    DB_WRITE_MAX_OVERFLOW: int = 2
+    DB_READ_POOL_SIZE: int = 5  # Connections kept open to the read replica
+    DB_READ_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # Seconds to wait for a free connection before failing
+    DB_POOL_RECYCLE: int = 1800  # Seconds after which a pooled connection is replaced
+
+    # Schema management
+    SCHEMA_MODE: str = ""  # create, verify or skip; empty means create in Development and verify elsewhere
+    SCHEMA_FINGERPRINT_FILE: Optional[str] = None  # Cache of the verified schema fingerprint (next to the app by default)
+
+    # Startup warm-up
+    WARMUP_ON_STARTUP: bool = True  # Prefill the pool and load the caches when the backend starts
+    WARMUP_PRELOAD_POSTAL_CODES: bool = True  # Also load the whole postal code -> JIS table during warm-up
+
     class Config:
         env_file = env_path
 
@@ -57,6 +108,10 @@ class Settings(BaseSettings):
         self.SQL_PASSWORD = self.DEV_SQL_PASSWORD if self.ENV == "Development" else self.PROD_SQL_PASSWORD
         encoded_password = urllib.parse.quote_plus(self.SQL_PASSWORD)
 
+        # An explicit DATABASE_URL (e.g. a local SQLite file for benchmarks) wins
+        if self.DATABASE_URL:
+            return
+
         self.DATABASE_URL = (
             f"mssql+pyodbc://{self.SQL_USER}:{encoded_password}@"
             f"{self.SQL_SERVER}:{self.SQL_PORT}/{self.SQL_DB}"
@@ -66,10 +121,6 @@ class Settings(BaseSettings):
             "&timeout=60"
             "&connection_timeout=60"
             "&query_timeout=60"
-            "&pool_timeout=60"
-            "&max_pool_size=20"
-            "&min_pool_size=5"
-            "&pool_pre_ping=true"
         )
 
 @lru_cache
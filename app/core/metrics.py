@@ -0,0 +1,214 @@
+"""
+Lightweight stage timing and query counting for carrier selection.
+
+Services open spans around each stage of a picking run (header fetch,
+product lookups, metrics, fee evaluation, lead time and the write-back
+steps).  Every span records its wall time and the number of database
+round trips issued while it was open.  Totals are aggregated process-wide
+in ``metrics_registry`` and rendered in Prometheus text format by the
+``/metrics`` endpoint.
+"""
+
+from contextlib import contextmanager
+import functools
+from typing import Dict, Any, Optional, List
+import threading
+import time
+
+from sqlalchemy import event
+
+METRIC_PREFIX = "cospacks"
+
+_query_state = threading.local()
+
+
+def query_count() -> int:
+    """Number of cursor executions issued by the current thread so far"""
+    return getattr(_query_state, "count", 0)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _query_state.count = getattr(_query_state, "count", 0) + 1
+    metrics_registry.increment("db_round_trips_total")
+
+
+def install_query_counter(engine) -> None:
+    """Count every round trip made through the given engine"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+
+
+class MetricsRegistry:
+    """Thread-safe process-wide aggregate of stage timings and counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, List[float]] = {}  # stage -> [count, seconds, queries]
+        self._counters: Dict[str, Dict[str, float]] = {}
+        self._gauges: Dict[str, Dict[str, float]] = {}
+
+    def observe(self, stage: str, seconds: float, queries: int) -> None:
+        with self._lock:
+            totals = self._stages.setdefault(stage, [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += queries
+
+    def increment(self, name: str, value: float = 1, labels: Optional[Dict[str, str]] = None) -> None:
+        label_key = _format_labels(labels or {})
+        with self._lock:
+            values = self._counters.setdefault(name, {})
+            values[label_key] = values.get(label_key, 0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        label_key = _format_labels(labels or {})
+        with self._lock:
+            self._gauges.setdefault(name, {})[label_key] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stages": {
+                    stage: {"count": int(count), "seconds": seconds, "queries": int(queries)}
+                    for stage, (count, seconds, queries) in self._stages.items()
+                },
+                "counters": {name: dict(values) for name, values in self._counters.items()},
+                "gauges": {name: dict(values) for name, values in self._gauges.items()},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+
+        stage_seconds = f"{METRIC_PREFIX}_stage_duration_seconds"
+        stage_queries = f"{METRIC_PREFIX}_stage_queries_total"
+        lines.append(f"# HELP {stage_seconds} Time spent in each carrier selection stage")
+        lines.append(f"# TYPE {stage_seconds} summary")
+        for stage, totals in sorted(snapshot["stages"].items()):
+            labels = _format_labels({"stage": stage})
+            lines.append(f"{stage_seconds}_count{labels} {totals['count']}")
+            lines.append(f"{stage_seconds}_sum{labels} {totals['seconds']:.6f}")
+        lines.append(f"# HELP {stage_queries} Database round trips issued in each stage")
+        lines.append(f"# TYPE {stage_queries} counter")
+        for stage, totals in sorted(snapshot["stages"].items()):
+            lines.append(f"{stage_queries}{_format_labels({'stage': stage})} {totals['queries']}")
+
+        for name, values in sorted(snapshot["counters"].items()):
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in sorted(values.items()):
+                lines.append(f"{metric}{labels} {_format_value(value)}")
+
+        for name, values in sorted(snapshot["gauges"].items()):
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            for labels, value in sorted(values.items()):
+                lines.append(f"{metric}{labels} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """
+    Records per-stage durations and query counts
+
+    A timer created with a parent (see ``child``) forwards everything it
+    records to the parent, so a picking timer sums up all of its waybill
+    timers.  Only the root timer reports to the process-wide registry.
+    """
+
+    def __init__(self, parent: Optional["StageTimer"] = None, registry: Optional[MetricsRegistry] = None):
+        self.parent = parent
+        self.registry = registry or metrics_registry
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    def child(self) -> "StageTimer":
+        return StageTimer(parent=self, registry=self.registry)
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        start_queries = query_count()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, query_count() - start_queries)
+
+    def record(self, stage: str, seconds: float, queries: int) -> None:
+        totals = self.stages.get(stage)
+        if totals is None:
+            totals = self.stages[stage] = {"count": 0, "seconds": 0.0, "queries": 0}
+        totals["count"] += 1
+        totals["seconds"] += seconds
+        totals["queries"] += queries
+
+        if self.parent is not None:
+            self.parent.record(stage, seconds, queries)
+        else:
+            self.registry.observe(stage, seconds, queries)
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            stage: {
+                "count": totals["count"],
+                "seconds": round(totals["seconds"], 6),
+                "queries": totals["queries"],
+            }
+            for stage, totals in self.stages.items()
+        }
+
+
+def timed(stage: str):
+    """
+    Decorator recording a service method as a stage on ``self.timer``
+
+    Methods of objects without a ``timer`` attribute run untimed.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            timer = getattr(self, "timer", None)
+            if timer is None:
+                return func(self, *args, **kwargs)
+            with timer.span(stage):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def merge_timings(timings: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Sum several ``StageTimer.as_dict`` results into one"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for stages in timings:
+        for stage, totals in (stages or {}).items():
+            target = merged.setdefault(stage, {"count": 0, "seconds": 0.0, "queries": 0})
+            target["count"] += totals["count"]
+            target["seconds"] = round(target["seconds"] + totals["seconds"], 6)
+            target["queries"] += totals["queries"]
+    return merged
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in sorted(labels.items()):
+        escaped = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return f"{value:.6f}"
+
+
+metrics_registry = MetricsRegistry()
@@ -2,10 +2,13 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.metrics import install_query_counter
+from app.db.pool import POOL_INTERACTIVE, POOL_BATCH, POOL_READ, POOL_NAMES, pool_options, install_pool_metrics
+from app.db.routing import RoutingSession
 import logging
+import threading
 import time
 import sys
-import pyodbc
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +17,8 @@ logging.basicConfig(level=logging.INFO)
 
 def create_database():
     """Create database if it doesn't exist"""
+    import pyodbc
+
     try:
         master_conn_str = (
             f"DRIVER={{ODBC Driver 17 for SQL Server}};"
@@ -65,6 +70,8 @@ def create_database():
 
 def create_user():
     """Create user if it doesn't exist"""
+    import pyodbc
+
     # Skip user creation for sa account
     if settings.SQL_USER.lower() == 'sa':
         logger.info("Using sa account - skipping user creation")
@@ -116,8 +123,14 @@ def create_user():
                 logger.error(f"Error setting up user after {max_retries} attempts: {str(e)}")
                 raise
 
-def create_db_engine(max_retries=3, retry_delay=2):
-    """Create database engine with retry logic"""
+def create_db_engine(max_retries=3, retry_delay=2, pool_name=POOL_INTERACTIVE, url=None, exit_on_failure=True):
+    """
+    Create database engine with retry logic, sized for one of the named pools
+
+    Exits the process when no connection could be made, or raises the last
+    connection error instead if exit_on_failure is False.
+    """
+    url = url or settings.DATABASE_URL
     retries = 0
     last_error = None
     
@@ -129,21 +142,29 @@ def create_db_engine(max_retries=3, retry_delay=2):
             #     create_user()
             
             # Create engine with proper connection pooling and timeouts
-            engine = create_engine(
-                settings.DATABASE_URL,
-                pool_pre_ping=True,
-                pool_size=5,
-                max_overflow=10,
-                pool_timeout=30,
-                connect_args={
-                    "timeout": 30
-                }
-            )
+            if url.startswith("sqlite"):
+                # Local SQLite databases (benchmarks) use SQLAlchemy's default pool
+                engine = create_engine(
+                    url,
+                    connect_args={
+                        "check_same_thread": False
+                    }
+                )
+            else:
+                engine = create_engine(
+                    url,
+                    pool_pre_ping=True,
+                    connect_args={
+                        "timeout": 30
+                    },
+                    **pool_options(pool_name)
+                )
+                install_pool_metrics(engine, pool_name)
             
             # Test the connection
             with engine.connect() as conn:
                 conn.execute(text("SELECT 1"))
-            logger.info(f"Successfully connected to {settings.ENV} database at {settings.SQL_SERVER}")
+            logger.info(f"Successfully connected to {settings.ENV} database at {settings.SQL_SERVER} ({pool_name} pool)")
             return engine
             
         except Exception as e:
@@ -155,21 +176,153 @@ def create_db_engine(max_retries=3, retry_delay=2):
                 time.sleep(retry_delay)
             else:
                 logger.error(f"Failed to connect to database after {max_retries} attempts: {str(last_error)}")
+                if not exit_on_failure:
+                    raise last_error
                 logger.error("Please check your database configuration and ensure the database server is running.")
                 sys.exit(1)
 
 # Create the engine with retry logic
 engine = create_db_engine()
+install_query_counter(engine)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The batch and write pools are only connected when first used
+_engines = {POOL_INTERACTIVE: engine}
+_session_factories = {POOL_INTERACTIVE: SessionLocal}
+_engines_lock = threading.Lock()
+# When the read replica last could not be reached
+_replica_failed_at = None
+
+def get_engine(pool_name=POOL_INTERACTIVE):
+    """
+    Engine of a named connection pool (see app.db.pool)
+
+    SQLite databases share the interactive engine: separate in-memory
+    engines would be separate databases.  The read pool is None without a
+    READ_REPLICA_URL, or while the replica can't be reached.
+
+    The other pools are connected on first use, in a request or worker, so
+    that happens outside the engine lock and without retries; a failure is
+    raised to the caller instead of exiting the process.
+    """
+    if pool_name == POOL_READ:
+        return _get_replica_engine()
+    with _engines_lock:
+        pooled = _engines.get(pool_name)
+    if pooled is not None:
+        return pooled
+    if pool_name not in POOL_NAMES:
+        raise ValueError(f"Unknown connection pool '{pool_name}'")
+
+    if settings.DATABASE_URL.startswith("sqlite"):
+        pooled = engine
+    else:
+        pooled = create_db_engine(max_retries=1, pool_name=pool_name, exit_on_failure=False)
+
+    with _engines_lock:
+        if pool_name in _engines:
+            # Another request connected meanwhile
+            if pooled is not engine:
+                pooled.dispose()
+            return _engines[pool_name]
+        if pooled is not engine:
+            install_query_counter(pooled)
+        _engines[pool_name] = pooled
+    return pooled
+
+def _get_replica_engine():
+    """
+    Engine of the read replica, connected on first use
+
+    Connecting happens outside the engine lock and without retries, as it runs
+    in a request.  If the replica can't be reached reads use the primary, and
+    connecting is only tried again after READ_REPLICA_RETRY_SECONDS.
+    """
+    global _replica_failed_at
+    if not settings.READ_REPLICA_URL:
+        return None
+    with _engines_lock:
+        replica = _engines.get(POOL_READ)
+        failed_at = _replica_failed_at
+    if replica is not None:
+        return replica
+    if failed_at is not None and time.monotonic() - failed_at < settings.READ_REPLICA_RETRY_SECONDS:
+        return None
+
+    try:
+        replica = create_db_engine(max_retries=1, pool_name=POOL_READ, url=settings.READ_REPLICA_URL,
+                                   exit_on_failure=False)
+    except Exception as e:
+        logger.error(f"Read replica unavailable, reading from the primary: {str(e)}")
+        with _engines_lock:
+            _replica_failed_at = time.monotonic()
+        return None
+
+    with _engines_lock:
+        if POOL_READ in _engines:
+            # Another request connected meanwhile
+            replica.dispose()
+            return _engines[POOL_READ]
+        install_query_counter(replica)
+        _engines[POOL_READ] = replica
+        _replica_failed_at = None
+    return replica
+
+def get_session_factory(pool_name=POOL_INTERACTIVE):
+    """Session factory bound to a named connection pool"""
+    if pool_name == POOL_READ:
+        return get_read_session_factory()
+    factory = _session_factories.get(pool_name)
+    if factory is None:
+        bind = get_engine(pool_name)
+        with _engines_lock:
+            factory = _session_factories.setdefault(
+                pool_name, sessionmaker(autocommit=False, autoflush=False, bind=bind)
+            )
+    return factory
+
 # Create base class for declarative models
 Base = declarative_base()
 
 # Dependency
 def get_db():
     db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_session_factory():
+    """
+    Session factory for read-only workloads (see app.db.routing)
+
+    Its sessions read from the replica when READ_REPLICA_URL is set, and are
+    plain primary sessions otherwise.
+    """
+    replica = get_engine(POOL_READ)
+    if replica is None:
+        return SessionLocal
+    factory = _session_factories.get(POOL_READ)
+    if factory is None:
+        with _engines_lock:
+            factory = _session_factories.setdefault(POOL_READ, sessionmaker(
+                class_=RoutingSession, autocommit=False, autoflush=False, bind=engine, replica=replica
+            ))
+    return factory
+
+# Dependency for the picking list and other read-only endpoints
+def get_read_db():
+    db = get_read_session_factory()()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency for carrier selection runs, which use the batch pool
+def get_batch_db():
+    db = get_session_factory(POOL_BATCH)()
     try:
         yield db
     finally:
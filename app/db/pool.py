@@ -0,0 +1,126 @@
+"""
+Named connection pools and their checkout metrics.
+
+Interactive reads (the picking list and UI calls), batch carrier selection
+and write-back (postal code imports, resolver write-back) each get their own
+engine and pool, so a long selection run cannot starve the picking list of
+connections.  Read-only workloads may also go to a replica through the
+``read`` pool.  Pool sizes come from ``Settings``.
+
+Every pool reports, labelled with its name:
+
+- ``db_pool_checkouts_total`` and ``db_pool_checkout_wait_seconds_total``:
+  the mean wait for a connection is their ratio
+- ``db_pool_checkout_timeouts_total``: checkouts that gave up after
+  ``DB_POOL_TIMEOUT``
+- ``db_pool_connections_opened_total``: new database connections
+- ``db_pool_size``, ``db_pool_checked_out`` and ``db_pool_overflow``: current
+  state; ``db_pool_checked_out_max`` and ``db_pool_checkout_wait_max_seconds``
+  are the peaks since startup
+"""
+
+from typing import Any, Dict
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+
+POOL_INTERACTIVE = "interactive"
+POOL_BATCH = "batch"
+POOL_WRITE = "write"
+POOL_READ = "read"  # READ_REPLICA_URL, see app.db.routing
+POOL_NAMES = (POOL_INTERACTIVE, POOL_BATCH, POOL_WRITE, POOL_READ)
+
+
+def pool_options(pool_name: str) -> Dict[str, Any]:
+    """``create_engine`` pool arguments of a named pool"""
+    sizes = {
+        POOL_INTERACTIVE: (settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW),
+        POOL_BATCH: (settings.DB_BATCH_POOL_SIZE, settings.DB_BATCH_MAX_OVERFLOW),
+        POOL_WRITE: (settings.DB_WRITE_POOL_SIZE, settings.DB_WRITE_MAX_OVERFLOW),
+        POOL_READ: (settings.DB_READ_POOL_SIZE, settings.DB_READ_MAX_OVERFLOW),
+    }
+    if pool_name not in sizes:
+        raise ValueError(f"Unknown connection pool '{pool_name}', expected one of {', '.join(POOL_NAMES)}")
+    pool_size, max_overflow = sizes[pool_name]
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a connection
+    (including opening a new one) and publishes its state on every checkout
+    and checkin
+    """
+
+    pool_name = POOL_INTERACTIVE
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._peak_lock = threading.Lock()
+        self._max_wait = 0.0
+        self._max_checked_out = 0
+
+    def _do_get(self):
+        labels = {"pool": self.pool_name}
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            metrics_registry.increment("db_pool_checkout_timeouts_total", labels=labels)
+            raise
+        waited = time.perf_counter() - started
+
+        self.record_state()
+        metrics_registry.increment("db_pool_checkouts_total", labels=labels)
+        metrics_registry.increment("db_pool_checkout_wait_seconds_total", waited, labels=labels)
+        with self._peak_lock:
+            if waited > self._max_wait:
+                self._max_wait = waited
+                metrics_registry.set_gauge("db_pool_checkout_wait_max_seconds", waited, labels)
+        return connection
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self.record_state()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.pool_name = self.pool_name
+        return pool
+
+    def record_state(self) -> None:
+        """Publish the current size, checked out and overflow connections"""
+        labels = {"pool": self.pool_name}
+        checked_out = self.checkedout()
+        metrics_registry.set_gauge("db_pool_size", self.size(), labels)
+        metrics_registry.set_gauge("db_pool_checked_out", checked_out, labels)
+        metrics_registry.set_gauge("db_pool_overflow", max(0, self.overflow()), labels)
+        with self._peak_lock:
+            if checked_out > self._max_checked_out:
+                self._max_checked_out = checked_out
+                metrics_registry.set_gauge("db_pool_checked_out_max", checked_out, labels)
+
+
+def install_pool_metrics(engine: Engine, pool_name: str) -> None:
+    """Name an engine's pool and count the database connections it opens"""
+    if not isinstance(engine.pool, InstrumentedQueuePool):
+        return
+    engine.pool.pool_name = pool_name
+
+    def on_connect(dbapi_connection, connection_record):
+        metrics_registry.increment("db_pool_connections_opened_total", labels={"pool": pool_name})
+
+    event.listen(engine, "connect", on_connect)
+    engine.pool.record_state()
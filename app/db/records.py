@@ -0,0 +1,160 @@
+"""
+Lightweight read-only rows of the master tables.
+
+Carrier selection only reads a handful of columns of the master tables, but
+loading ORM entities fetches every column (about 140 of the product master),
+registers each row in the session's identity map and leaves the DECIMAL
+columns as ``Decimal`` to be converted again on every use.
+
+A ``RecordType`` selects only the columns it names through Core and turns each
+row into a named tuple whose fields carry the same names as the ORM
+attributes, so ``fee.HANMA46009`` reads the same on a record as on an entity.
+DECIMAL columns are converted once, at load: whole numbers (scale 0, such as
+amounts, sizes and YYYYMMDD dates) to ``int``, the others to ``float``.
+Records are immutable and hold no session, so snapshots can share them freely.
+"""
+
+from collections import namedtuple
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+from sqlalchemy import Numeric, select
+from sqlalchemy.orm import Session
+
+from app.models.holiday_calendar_master import HolidayCalendarMaster
+from app.models.product_master import ProductMaster
+from app.models.product_sub_master import ProductSubMaster
+from app.models.special_capacity import SpecialCapacity
+from app.models.special_lead_time_master import SpecialLeadTimeMaster
+from app.models.transportation_capacity import TransportationCapacity
+from app.models.transportation_company_master import TransportationCompanyMaster
+from app.models.transportation_company_sub_master import TransportationCompanySubMaster
+from app.models.transportation_fee import TransportationFee
+
+
+def _converter(column) -> Optional[Callable[[Any], Any]]:
+    if isinstance(column.type, Numeric):
+        return int if column.type.scale == 0 else float
+    return None
+
+
+class RecordType:
+    """
+    Named tuple type of a fixed list of columns, with the reader that loads it
+
+    Args:
+        name: Name of the record class
+        columns: ORM attributes (or table columns) to select
+    """
+
+    def __init__(self, name: str, columns: Sequence[Any]):
+        self.columns = tuple(columns)
+        self.record = namedtuple(name, [column.key for column in self.columns])
+        converters = [_converter(column) for column in self.columns]
+        self._conversions = [(index, convert) for index, convert in enumerate(converters) if convert is not None]
+
+    def make(self, row: Sequence[Any]) -> Any:
+        """Record of a result row holding this type's columns, in order"""
+        values = list(row)
+        for index, convert in self._conversions:
+            value = values[index]
+            if value is not None:
+                values[index] = convert(value)
+        return self.record._make(values)
+
+    def make_all(self, rows: Iterable[Sequence[Any]]) -> List[Any]:
+        return [self.make(row) for row in rows]
+
+    def read(self, db: Session, *criteria: Any, order_by: Sequence[Any] = ()) -> List[Any]:
+        """
+        Load the records matching ``criteria``
+
+        Args:
+            db: Database session
+            criteria: WHERE clauses
+            order_by: ORDER BY clauses
+
+        Returns:
+            List of records
+        """
+        stmt = select(*self.columns)
+        if criteria:
+            stmt = stmt.where(*criteria)
+        if order_by:
+            stmt = stmt.order_by(*order_by)
+        return self.make_all(db.execute(stmt))
+
+
+# Boxes of a set product whose dimensions are read (W, D, H of each box are
+# three of the five columns per box, starting at HANMA33022)
+PRODUCT_BOX_COUNT = 5
+
+
+def product_box_columns(box_num: int) -> List[str]:
+    """Width, depth and height column names of a set product box (1-based)"""
+    first = 22 + (box_num - 1) * 5
+    return [f"HANMA33{number:03d}" for number in (first, first + 1, first + 2)]
+
+
+CARRIER = RecordType("CarrierRecord", [
+    TransportationCompanyMaster.HANMA02001,  # Carrier code
+    TransportationCompanyMaster.HANMA02002,  # Carrier name
+])
+
+CARRIER_LEAD_TIME = RecordType("CarrierLeadTimeRecord", [
+    TransportationCompanySubMaster.HANMA03001,  # Carrier code
+    TransportationCompanySubMaster.HANMA03002,
+    TransportationCompanySubMaster.HANMA03003,
+    TransportationCompanySubMaster.HANMA03004,  # Standard lead time (days)
+])
+
+FEE = RecordType("FeeRecord", [
+    TransportationFee.HANMA46001,  # Fee code
+    TransportationFee.HANMA46002,  # Carrier code
+    TransportationFee.HANMA46003,  # Area code
+    TransportationFee.HANMA46004,  # Max weight
+    TransportationFee.HANMA46005,  # Max volume
+    TransportationFee.HANMA46006,  # Max size
+    TransportationFee.HANMA46007,  # Unit price per volume
+    TransportationFee.HANMA46008,  # Volume threshold
+    TransportationFee.HANMA46009,  # Base fee
+    TransportationFee.HANMA46010,  # Fee type
+])
+
+CAPACITY = RecordType("CapacityRecord", [
+    TransportationCapacity.HANMA47001,  # Carrier code
+    TransportationCapacity.HANMA47002,  # Max volume
+    TransportationCapacity.HANMA47003,  # Max weight
+    TransportationCapacity.HANMA47004,  # Volume to weight ratio
+])
+
+SPECIAL_CAPACITY = RecordType("SpecialCapacityRecord", [
+    SpecialCapacity.HANMA48001,  # Carrier code
+    SpecialCapacity.HANMA48002,  # Date (YYYYMMDD)
+    SpecialCapacity.HANMA48003,  # Max volume
+    SpecialCapacity.HANMA48004,  # Max weight
+])
+
+SPECIAL_LEAD_TIME = RecordType("SpecialLeadTimeRecord", [
+    SpecialLeadTimeMaster.HANMA41001,  # Carrier code
+    SpecialLeadTimeMaster.HANMA41002,  # Prefecture code
+    SpecialLeadTimeMaster.HANMA41003,  # Shipping date (YYYYMMDD)
+    SpecialLeadTimeMaster.HANMA41004,  # Delivery date (YYYYMMDD)
+])
+
+HOLIDAY = RecordType("HolidayRecord", [
+    HolidayCalendarMaster.HANMA04002,  # Date (YYYYMMDD)
+])
+
+# Product master and product sub master, read with one join
+PRODUCT = RecordType("ProductRecord", [
+    ProductMaster.HANM003002,   # Product name
+    ProductMaster.HANM003004,   # Unit
+    ProductMaster.HANM003K007,  # Inner box count
+    ProductMaster.HANM003K008,  # Outer box count
+    ProductMaster.HANM003A005,  # Set parcel count
+    ProductMaster.HANM003A007,  # Packaging weight (g)
+    ProductMaster.HANM003A107,  # Volume
+] + [
+    getattr(ProductSubMaster, name)
+    for box_num in range(1, PRODUCT_BOX_COUNT + 1) for name in product_box_columns(box_num)
+])
@@ -0,0 +1,76 @@
+"""
+Routing of read-only workloads to a readable secondary.
+
+Sessions from ``app.db.base.get_read_session_factory`` (the picking list, the
+master data snapshot) send their SELECTs to ``READ_REPLICA_URL`` and
+everything else to the primary.  Reads that must see our own writes stay on
+the primary:
+
+- once a routing session has flushed or issued DML, all of its later
+  statements use the primary
+- for ``READ_REPLICA_STICKY_SECONDS`` after any session of this process
+  commits a write, new reads use the primary too, so the picking list
+  refreshed after a shipping run does not lag behind on the replica
+
+Without a replica URL read sessions are plain primary sessions.
+"""
+
+from typing import Optional
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+
+_last_write_lock = threading.Lock()
+_last_write: Optional[float] = None
+
+
+def record_write() -> None:
+    """Note that this process just committed a write to the primary"""
+    global _last_write
+    with _last_write_lock:
+        _last_write = time.monotonic()
+
+
+def replica_allowed() -> bool:
+    """False while recent writes of this process may not have reached the replica"""
+    last_write = _last_write
+    return last_write is None or time.monotonic() - last_write >= settings.READ_REPLICA_STICKY_SECONDS
+
+
+class RoutingSession(Session):
+    """Session that reads from the replica until it writes"""
+
+    def __init__(self, replica: Optional[Engine] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.replica = replica
+        self._use_primary = replica is None or not replica_allowed()
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if not self._use_primary and (self._flushing or getattr(clause, "is_dml", False)):
+            self._use_primary = True
+        if self._use_primary:
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        metrics_registry.increment("db_replica_reads_total")
+        return self.replica
+
+
+@event.listens_for(Session, "after_flush")
+def _remember_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _record_committed_write(session):
+    if session.info.pop("wrote", False):
+        record_write()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_write(session):
+    session.info.pop("wrote", None)
@@ -0,0 +1,219 @@
+"""
+Schema management for the mapped tables.
+
+Startup runs ``ensure_schema`` in one of three modes (``SCHEMA_MODE``):
+
+- ``create``: ``Base.metadata.create_all`` as before (the default in Development)
+- ``verify``: compare the mapped tables against a fingerprint cached on disk.
+  When the fingerprint matches, startup issues no DDL or reflection round trips
+  at all; otherwise the database is reflected once, and the fingerprint is
+  written if every mapped table and column exists (the default elsewhere)
+- ``skip``: assume the schema is in place
+
+Missing tables are created explicitly with the migration CLI::
+
+    python -m app.db.schema status
+    python -m app.db.schema migrate
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+import argparse
+import hashlib
+import importlib
+import json
+import logging
+import os
+import pkgutil
+import sys
+
+from sqlalchemy import MetaData, inspect
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_MODES = ("create", "verify", "skip")
+
+
+class SchemaMismatchError(RuntimeError):
+    """The database lacks mapped tables or columns"""
+
+
+def schema_mode() -> str:
+    mode = (settings.SCHEMA_MODE or "").lower()
+    if not mode:
+        return "create" if settings.ENV == "Development" else "verify"
+    if mode not in SCHEMA_MODES:
+        raise ValueError(f"Unknown SCHEMA_MODE '{settings.SCHEMA_MODE}', expected one of {', '.join(SCHEMA_MODES)}")
+    return mode
+
+
+def fingerprint_path() -> str:
+    """Where the verified schema fingerprint is cached"""
+    if settings.SCHEMA_FINGERPRINT_FILE:
+        return settings.SCHEMA_FINGERPRINT_FILE
+    if getattr(sys, 'frozen', False):
+        # Next to the executable; the bundle's own directory is temporary
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.join(base_dir, ".schema_fingerprint.json")
+
+
+def schema_fingerprint(metadata: MetaData, engine: Engine) -> str:
+    """
+    Hash of the mapped tables and columns and the database they live in
+
+    Args:
+        metadata: Metadata of the mapped tables
+        engine: Engine of the target database
+
+    Returns:
+        Hex digest that changes whenever a model or the target database changes
+    """
+    digest = hashlib.sha256(repr(engine.url).encode())
+    for table in sorted(metadata.tables.values(), key=lambda t: t.fullname):
+        digest.update(table.fullname.encode())
+        for column in table.columns:
+            digest.update(f"|{column.name}:{column.type!r}:{column.nullable}:{column.primary_key}".encode())
+    return digest.hexdigest()
+
+
+def read_fingerprint(path: Optional[str] = None) -> Optional[str]:
+    try:
+        with open(path or fingerprint_path(), encoding="utf-8") as f:
+            return json.load(f).get("fingerprint")
+    except (OSError, ValueError):
+        return None
+
+
+def write_fingerprint(fingerprint: str, path: Optional[str] = None) -> None:
+    path = path or fingerprint_path()
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "verified_at": datetime.now().isoformat(timespec="seconds")}, f)
+    except OSError as e:
+        # Not fatal: the next start just verifies again
+        logger.warning(f"Could not write schema fingerprint to {path}: {str(e)}")
+
+
+def find_schema_differences(metadata: MetaData, engine: Engine) -> Dict[str, List[str]]:
+    """
+    Reflect the database and list what the mapped tables need but lack
+
+    Returns:
+        Table name -> missing column names (empty list for a missing table)
+    """
+    inspector = inspect(engine)
+    missing: Dict[str, List[str]] = {}
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name, schema=table.schema):
+            missing[table.fullname] = []
+            continue
+        existing = {column["name"].lower() for column in inspector.get_columns(table.name, schema=table.schema)}
+        columns = [column.name for column in table.columns if column.name.lower() not in existing]
+        if columns:
+            missing[table.fullname] = columns
+    return missing
+
+
+def verify_schema(metadata: MetaData, engine: Engine, force: bool = False) -> bool:
+    """
+    Check the database against the mapped tables, once per fingerprint
+
+    Args:
+        metadata: Metadata of the mapped tables
+        engine: Engine of the target database
+        force: Reflect even if the cached fingerprint matches
+
+    Returns:
+        True if the cached fingerprint matched and nothing was queried
+
+    Raises:
+        SchemaMismatchError: If mapped tables or columns are missing
+    """
+    fingerprint = schema_fingerprint(metadata, engine)
+    if not force and read_fingerprint() == fingerprint:
+        logger.info("Schema fingerprint matches, skipping verification")
+        return True
+
+    missing = find_schema_differences(metadata, engine)
+    if missing:
+        details = "; ".join(
+            f"{table} ({', '.join(columns)})" if columns else f"{table} (table)"
+            for table, columns in missing.items()
+        )
+        raise SchemaMismatchError(f"Database schema is missing {details}. Run 'python -m app.db.schema migrate'.")
+
+    write_fingerprint(fingerprint)
+    logger.info("Schema verified and fingerprint cached")
+    return False
+
+
+def migrate(metadata: MetaData, engine: Engine) -> List[str]:
+    """
+    Create missing tables and record the new fingerprint
+
+    Missing columns of existing tables are reported, not altered.
+
+    Returns:
+        Names of the tables that were created
+    """
+    missing = find_schema_differences(metadata, engine)
+    created = [table for table, columns in missing.items() if not columns]
+    metadata.create_all(bind=engine, tables=[metadata.tables[name] for name in created])
+    for name in created:
+        logger.info(f"Created table {name}")
+    verify_schema(metadata, engine, force=True)
+    return created
+
+
+def ensure_schema(metadata: MetaData, engine: Engine, mode: Optional[str] = None) -> None:
+    """Prepare the schema at startup according to SCHEMA_MODE"""
+    mode = mode or schema_mode()
+    if mode == "create":
+        metadata.create_all(bind=engine)
+        logger.info("Database tables created successfully")
+    elif mode == "verify":
+        verify_schema(metadata, engine)
+    else:
+        logger.info("Schema management skipped")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the database schema of the mapped tables")
+    parser.add_argument("command", choices=["status", "verify", "migrate"],
+                        help="status: list missing tables and columns; verify: check and cache the fingerprint; "
+                             "migrate: create missing tables")
+    args = parser.parse_args(argv)
+
+    from app.db.base import engine, Base
+    import app.models
+    # Register every mapped table, not only the ones app.models re-exports
+    for module in pkgutil.iter_modules(app.models.__path__):
+        importlib.import_module(f"app.models.{module.name}")
+
+    if args.command == "status":
+        missing = find_schema_differences(Base.metadata, engine)
+        for table, columns in missing.items():
+            print(f"{table}: {', '.join(columns) if columns else 'missing table'}")
+        print("Schema is up to date" if not missing else f"{len(missing)} table(s) need migration")
+        return 1 if missing else 0
+
+    try:
+        if args.command == "verify":
+            verify_schema(Base.metadata, engine, force=True)
+        else:
+            created = migrate(Base.metadata, engine)
+            print(f"Created {len(created)} table(s)" + (f": {', '.join(created)}" if created else ""))
+    except SchemaMismatchError as e:
+        print(str(e))
+        return 1
+    print(f"Schema fingerprint written to {fingerprint_path()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+Prebuilt statements for the hot lookups of carrier selection.
+
+Every lookup below is a ``lambda_stmt``: the statement is built and its cache
+key computed once per call site, and the values the lambdas close over become
+bound parameters.  Later calls only extract those values and reuse the
+compiled SQL from the engine's compiled cache, instead of constructing a
+``Query``, walking it for a cache key and converting it into a ``select`` on
+every call.
+
+Master table lookups return the read-only records of ``app.db.records``;
+order and picking lookups return ORM objects, which the services update.
+``benchmarks/bench_statements.py`` measures the per call overhead against
+the equivalent ``Query``.
+
+Values must be computed before they are used in a lambda (``str(area_code)``
+outside, not inside): only plain closure variables become parameters.
+"""
+
+from typing import Any, List, Optional
+
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.orm import Session
+
+from app.db.records import (
+    CAPACITY, CARRIER, CARRIER_LEAD_TIME, FEE, HOLIDAY, PRODUCT, SPECIAL_CAPACITY, SPECIAL_LEAD_TIME
+)
+from app.models.holiday_calendar_master import HolidayCalendarMaster
+from app.models.juhachu import JuHachuHeader
+from app.models.picking import PickingManagement, PickingWork
+from app.models.postal_jis_mapping import PostalJISMapping
+from app.models.product_master import ProductMaster
+from app.models.product_sub_master import ProductSubMaster
+from app.models.special_capacity import SpecialCapacity
+from app.models.special_lead_time_master import SpecialLeadTimeMaster
+from app.models.transportation_area_jis import TransportationAreaJISMapping
+from app.models.transportation_capacity import TransportationCapacity
+from app.models.transportation_company_master import TransportationCompanyMaster
+from app.models.transportation_company_sub_master import TransportationCompanySubMaster
+from app.models.transportation_fee import TransportationFee
+
+# Values per IN list, below SQL Server's limit of 2100 parameters
+IN_BATCH_SIZE = 1000
+
+
+def _first(record_type, result) -> Optional[Any]:
+    row = result.first()
+    return record_type.make(row) if row is not None else None
+
+
+def postal_to_jis(db: Session, postal_code: str) -> Optional[str]:
+    """JIS address code of a postal code"""
+    stmt = lambda_stmt(lambda: select(PostalJISMapping.HANMA45001).where(
+        PostalJISMapping.HANMA45002 == postal_code
+    ).limit(1))
+    return db.execute(stmt).scalar()
+
+
+def area_codes(db: Session, jis_code: str) -> List[Any]:
+    """Transportation area codes of a JIS address code"""
+    stmt = lambda_stmt(lambda: select(TransportationAreaJISMapping.HANMA44001).where(
+        TransportationAreaJISMapping.HANMA44002 == jis_code
+    ))
+    return db.execute(stmt).scalars().all()
+
+
+def carriers(db: Session) -> List[Any]:
+    """All transportation companies, in carrier code order (``CARRIER`` records)"""
+    stmt = lambda_stmt(lambda: select(*CARRIER.columns).order_by(TransportationCompanyMaster.HANMA02001))
+    return CARRIER.make_all(db.execute(stmt))
+
+
+def product_info(db: Session, product_code: str) -> Optional[Any]:
+    """Product master and product sub master columns of a product (a ``PRODUCT`` record)"""
+    stmt = lambda_stmt(lambda: select(*PRODUCT.columns).select_from(ProductMaster).join(
+        ProductSubMaster, ProductMaster.HANM003001 == ProductSubMaster.HANMA33001
+    ).where(
+        ProductMaster.HANM003001 == product_code,
+        ProductSubMaster.HANMA33001 == product_code
+    ).limit(1))
+    return _first(PRODUCT, db.execute(stmt))
+
+
+def fee_records(db: Session, carrier_code: str, area_code: int) -> List[Any]:
+    """Fee records (``FEE``) of a carrier and area, in fee code order"""
+    area = str(area_code)
+    stmt = lambda_stmt(lambda: select(*FEE.columns).where(
+        TransportationFee.HANMA46002 == carrier_code,
+        TransportationFee.HANMA46003 == area
+    ).order_by(TransportationFee.HANMA46001))
+    return FEE.make_all(db.execute(stmt))
+
+
+def capacity(db: Session, carrier_code: str) -> Optional[Any]:
+    """Standard capacity limits (``CAPACITY``) of a carrier"""
+    stmt = lambda_stmt(lambda: select(*CAPACITY.columns).where(
+        TransportationCapacity.HANMA47001 == carrier_code
+    ).limit(1))
+    return _first(CAPACITY, db.execute(stmt))
+
+
+def special_capacity(db: Session, carrier_code: str, date_int: int) -> Optional[Any]:
+    """Special capacity limits (``SPECIAL_CAPACITY``) of a carrier on a date (YYYYMMDD)"""
+    stmt = lambda_stmt(lambda: select(*SPECIAL_CAPACITY.columns).where(
+        SpecialCapacity.HANMA48001 == carrier_code,
+        SpecialCapacity.HANMA48002 == date_int
+    ).limit(1))
+    return _first(SPECIAL_CAPACITY, db.execute(stmt))
+
+
+def holiday(db: Session, date_int: int) -> Optional[Any]:
+    """Holiday calendar entry (``HOLIDAY``) of a date (YYYYMMDD)"""
+    stmt = lambda_stmt(lambda: select(*HOLIDAY.columns).where(
+        HolidayCalendarMaster.HANMA04002 == date_int
+    ).limit(1))
+    return _first(HOLIDAY, db.execute(stmt))
+
+
+def special_lead_time(db: Session, carrier_code: str, prefecture_code: str,
+                      date_int: int) -> Optional[Any]:
+    """Special lead time (``SPECIAL_LEAD_TIME``) of a carrier to a prefecture for a shipping date (YYYYMMDD)"""
+    stmt = lambda_stmt(lambda: select(*SPECIAL_LEAD_TIME.columns).where(
+        SpecialLeadTimeMaster.HANMA41001 == carrier_code,
+        SpecialLeadTimeMaster.HANMA41002 == prefecture_code,
+        SpecialLeadTimeMaster.HANMA41003 == date_int
+    ).limit(1))
+    return _first(SPECIAL_LEAD_TIME, db.execute(stmt))
+
+
+def carrier_sub(db: Session, carrier_code: str) -> Optional[Any]:
+    """Standard lead time (``CARRIER_LEAD_TIME``) of a carrier"""
+    stmt = lambda_stmt(lambda: select(*CARRIER_LEAD_TIME.columns).where(
+        TransportationCompanySubMaster.HANMA03001 == carrier_code
+    ).order_by(
+        TransportationCompanySubMaster.HANMA03002,
+        TransportationCompanySubMaster.HANMA03003
+    ).limit(1))
+    return _first(CARRIER_LEAD_TIME, db.execute(stmt))
+
+
+def picking(db: Session, picking_id: int) -> Optional[PickingManagement]:
+    """Picking management row of a picking"""
+    stmt = lambda_stmt(lambda: select(PickingManagement).where(
+        PickingManagement.HANCA11001 == picking_id
+    ).limit(1))
+    return db.execute(stmt).scalars().first()
+
+
+def picking_works(db: Session, picking_id: int) -> List[PickingWork]:
+    """Picking work rows of a picking"""
+    stmt = lambda_stmt(lambda: select(PickingWork).where(
+        PickingWork.HANW002009 == picking_id
+    ))
+    return db.execute(stmt).scalars().all()
+
+
+def order_header(db: Session, order_id: str, document_type: Optional[str] = None,
+                 carrier_code: Optional[str] = None) -> Optional[JuHachuHeader]:
+    """
+    Order header of an order
+
+    Args:
+        db: Database session
+        order_id: Order number (HANR004005)
+        document_type: Only match this document type when given
+        carrier_code: Only match headers with this carrier assigned when given
+
+    Returns:
+        The first matching header, or None
+    """
+    stmt = lambda_stmt(lambda: select(JuHachuHeader).where(JuHachuHeader.HANR004005 == order_id))
+    # Each optional criterion is its own lambda, so every combination is
+    # cached separately
+    if document_type is not None:
+        stmt += lambda s: s.where(JuHachuHeader.HANR004004 == document_type)
+    if carrier_code is not None:
+        stmt += lambda s: s.where(JuHachuHeader.HANR004A008 == carrier_code)
+    stmt += lambda s: s.limit(1)
+    return db.execute(stmt).scalars().first()
+
+
+def order_header_versions(db: Session, order_ids: List[Any]) -> List[Any]:
+    """
+    Order number, document type, carrier code and update timestamp of the
+    order headers of the given orders, to tell whether any of them changed
+    """
+    rows = []
+    for start in range(0, len(order_ids), IN_BATCH_SIZE):
+        batch = list(order_ids[start:start + IN_BATCH_SIZE])
+        stmt = lambda_stmt(lambda: select(
+            JuHachuHeader.HANR004005, JuHachuHeader.HANR004004, JuHachuHeader.HANR004A008, JuHachuHeader.HANR004UPD
+        ).where(JuHachuHeader.HANR004005.in_(batch)))
+        rows.extend(db.execute(stmt).all())
+    return rows
@@ -1,8 +1,16 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from app.api.api import api_router
 from app.core.config import settings
-from app.db.base import engine, Base
+from app.core.metrics import metrics_registry
+from app.db.base import engine, Base, SessionLocal
+from app.db.schema import ensure_schema
+from app.services.warmup import readiness, warm_up
+from app.services.postal_code_resolver import postal_code_resolver
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,20 +18,39 @@ logger = logging.getLogger(__name__)
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Create database tables
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created successfully")
-    logger.info(f"Connected to database at {settings.DEV_SQL_SERVER if settings.ENV == 'Development' else settings.PROD_SQL_SERVER}")
-except Exception as e:
-    logger.error(f"Error creating database tables: {str(e)}")
-    raise
+
+def prepare_schema():
+    try:
+        ensure_schema(Base.metadata, engine)
+        logger.info(f"Connected to database at {settings.DEV_SQL_SERVER if settings.ENV == 'Development' else settings.PROD_SQL_SERVER}")
+    except Exception as e:
+        logger.error(f"Error preparing database schema: {str(e)}")
+        raise
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create or verify the database tables (see SCHEMA_MODE)
+    prepare_schema()
+
+    # Warm the pool and caches in the background; /ready reports when it is done
+    warmup_task = None
+    if settings.WARMUP_ON_STARTUP:
+        warmup_task = asyncio.create_task(asyncio.to_thread(warm_up, engine, SessionLocal))
+    else:
+        readiness.finish()
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        await warmup_task
+    postal_code_resolver.close()
+
 
 app = FastAPI(
     title=settings.APP_NAME,
     openapi_url=f"{settings.API_PREFIX}/openapi.json",
     docs_url=f"{settings.API_PREFIX}/docs",
     redoc_url=f"{settings.API_PREFIX}/redoc",
+    lifespan=lifespan,
 )
 
 # Set up CORS
@@ -35,6 +62,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses (picking pages, batch results) for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 app.include_router(api_router, prefix=settings.API_PREFIX)
 
 @app.get("/")
@@ -45,6 +75,24 @@ def root():
         "database": settings.DEV_SQL_SERVER if settings.ENV == "Development" else settings.PROD_SQL_SERVER
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Stage timings, query counts and counters in Prometheus text format
+    """
+    return PlainTextResponse(
+        metrics_registry.render_prometheus(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+@app.get("/ready")
+def ready():
+    """
+    Startup warm-up status: 200 once the pool and caches are warm, 503 until then
+    """
+    status = readiness.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 # This block is only used when running app/main.py directly
 # When running from main.py, this block is skipped
 if __name__ == "__main__":
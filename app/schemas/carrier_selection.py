@@ -39,6 +39,7 @@ class CarrierSelectionRequest(BaseModel):
     shipping_date: Optional[date] = None
     delivery_date: Optional[date] = None
     products: Optional[List[ProductInfo]] = None
+    include_timings: bool = False  # Attach per-stage timings to the response
 
 
 class CarrierSelectionDetail(BaseModel):
@@ -60,11 +61,21 @@ class CarrierSelectionResponse(BaseModel):
     selection_details: List[CarrierSelectionDetail]
     success: bool
     message: Optional[str] = None
+    timings: Optional[Dict[str, Any]] = None  # Per-stage durations and query counts
+    dry_run: bool = False  # True when the decisions were only simulated
 
 
 class CarrierSelectionBatchRequest(BaseModel):
     """Request for batch carrier selection"""
     picking_ids: List[int]
+    include_timings: bool = False  # Attach per-stage timings to the response
+
+
+class CarrierOptimizationRequest(BaseModel):
+    """Request for a wave-wide carrier assignment"""
+    picking_ids: List[int]
+    dry_run: bool = True  # Only return the assignment without writing it
+    include_timings: bool = False  # Attach stage timings to the response
 
 
 class CarrierSelectionBatchResponse(BaseModel):
@@ -72,4 +83,8 @@ class CarrierSelectionBatchResponse(BaseModel):
     results: List[CarrierSelectionResponse]
     success: bool
     message: Optional[str] = None
-    failed_pickings: Optional[List[int]] = None 
\ No newline at end of file
+    failed_pickings: Optional[List[int]] = None
+    timings: Optional[Dict[str, Any]] = None  # Stage timings summed over all pickings
+    dry_run: bool = False  # True when the decisions were only simulated
+    optimization: Optional[Dict[str, Any]] = None  # Summary of a wave-wide assignment
+ 
\ No newline at end of file
@@ -6,24 +6,53 @@ Postal Code to JIS Code Converter
 ---------------------------------
 
 This script converts the Japan Post's postal code CSV data to a format suitable
-for importing into the HAN99MA45POSTALJIS table. It extracts postal codes and 
+for importing into the HAN99MA45JYUYUHIMODUKE table. It extracts postal codes and 
 matches them with JIS codes based on prefecture and city information.
 
+The input is streamed in chunks that worker processes convert in parallel.
+With --load the result goes straight into the database: it is bulk inserted
+into a staging table (pyodbc fast_executemany on SQL Server) and then swapped
+into HAN99MA45JYUYUHIMODUKE in one short transaction.
+
+Monthly refreshes only need the changes: --diff compares a full input file
+with the table, and --add/--delete take Japan Post's ADD_YYMM/DEL_YYMM files.
+Either way only the inserts, updates and deletes are applied, in one
+transaction.
+
 Usage:
     python postal_code_converter.py [input_file] [output_file]
+    python -m app.scripts.postal_code_converter [input_file] --load
+    python -m app.scripts.postal_code_converter [input_file] --diff
 
 Example:
     python postal_code_converter.py ken_all.csv postal_jis_mapping.csv
+    python -m app.scripts.postal_code_converter utf_ken_all.csv --load --workers 4
+    python -m app.scripts.postal_code_converter utf_ken_all.csv --diff
+    python -m app.scripts.postal_code_converter --add ADD_2501.CSV --delete DEL_2501.CSV
 
 Downloads:
     Get the latest postal data from: https://www.post.japanpost.jp/zipcode/dl/utf-zip.html
 """
 
+import argparse
 import csv
 import sys
 import re
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+
+DEFAULT_CHUNK_SIZE = 20000  # Input lines per worker task
+INSERT_BATCH_SIZE = 10000  # Rows per executemany call when loading
+STAGING_TABLE = "HAN99MA45JYUYUHIMODUKE_STAGE"
+CSV_HEADER = ['PostalCode', 'JISCode', 'PrefectureName', 'CityName', 'StreetName']
+
+# Patterns used for every row, compiled once
+MAIN_CITY_PATTERN = re.compile(r'(.+?[市区町村])')
+CITY_DISTRICT_PATTERN = re.compile(r'(.+市)(.+区)')
 
 # JIS code mapping for prefectures
 # Format: {prefecture_name: prefecture_code}
@@ -58,6 +87,7 @@ SPECIAL_CITY_CODES = {
     '広島市': '101', '北九州市': '101', '福岡市': '102',  # Fukuoka
 }
 
+@lru_cache(maxsize=None)
 def get_jis_code(prefecture_name, city_name):
     """
     Create a 5-digit JIS code from prefecture and city names.
@@ -72,6 +102,8 @@ def get_jis_code(prefecture_name, city_name):
     
     Returns:
         5-digit JIS code string
+
+    Memoized: the ~120k postal codes share fewer than 2,000 cities.
     """
     # Get prefecture code
     prefecture_code = PREFECTURE_CODES.get(prefecture_name, '00')
@@ -80,7 +112,7 @@ def get_jis_code(prefecture_name, city_name):
     city_code = None
     
     # Extract main city name from city_name (handle districts within cities)
-    main_city_match = re.match(r'(.+?[市区町村])', city_name)
+    main_city_match = MAIN_CITY_PATTERN.match(city_name)
     main_city = main_city_match.group(1) if main_city_match else city_name
     
     # Look for exact matches in our special city code dictionary
@@ -90,7 +122,7 @@ def get_jis_code(prefecture_name, city_name):
         # For other cities/towns/villages, use a pattern based on city type
         if '区' in city_name:
             # District within a designated city
-            district_match = re.match(r'(.+市)(.+区)', city_name)
+            district_match = CITY_DISTRICT_PATTERN.match(city_name)
             if district_match:
                 city = district_match.group(1)
                 district = district_match.group(2)
@@ -121,62 +153,327 @@ def get_jis_code(prefecture_name, city_name):
     
     return f"{prefecture_code}{city_code}"
 
-def convert_postal_code_data(input_file, output_file):
+def convert_rows(rows):
+    """
+    Convert parsed Japan Post CSV rows to mapping records
+
+    Japan Post CSV format:
+    0: 全国地方公共団体コード, 1: 郵便番号(5桁), 2: 郵便番号(7桁)
+    3: 都道府県名カナ, 4: 市区町村名カナ, 5: 町域名カナ
+    6: 都道府県名, 7: 市区町村名, 8: 町域名
+
+    Returns:
+        List of [postal_code, jis_code, prefecture_name, city_name, street_name]
+    """
+    records = []
+    for row in rows:
+        try:
+            postal_code = row[2].strip()  # 7-digit postal code
+            prefecture_name = row[6].strip()
+            city_name = row[7].strip()
+            street_name = row[8].strip()
+        except IndexError as e:
+            print(f"Error processing row: {e}")
+            continue
+
+        # Skip if missing required data
+        if not postal_code or not prefecture_name or not city_name:
+            continue
+
+        records.append([postal_code, get_jis_code(prefecture_name, city_name), prefecture_name, city_name, street_name])
+    return records
+
+def convert_chunk(lines):
+    """Worker entry point: parse and convert one chunk of raw CSV lines"""
+    return convert_rows(csv.reader(lines))
+
+def iter_chunks(input_file, chunk_size=DEFAULT_CHUNK_SIZE, encoding='utf-8'):
+    """Stream the input file as lists of raw lines"""
+    with open(input_file, 'r', encoding=encoding, newline='') as infile:
+        while True:
+            lines = list(islice(infile, chunk_size))
+            if not lines:
+                return
+            yield lines
+
+def iter_postal_records(input_file, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, encoding='utf-8'):
+    """
+    Convert the input file chunk by chunk, across worker processes
+
+    Records come out in input order, and only the first record of each postal
+    code is kept.  At most two chunks per worker are read ahead, so memory
+    stays bounded however large the input is.
+
+    Args:
+        input_file: Path to the Japan Post CSV file
+        workers: Worker processes (1 converts in this process)
+        chunk_size: Input lines per worker task
+        encoding: Input encoding (utf-8 for utf_ken_all.csv, cp932 for KEN_ALL.CSV)
+    """
+    workers = workers or min(4, os.cpu_count() or 1)
+    seen = set()
+    chunks = iter_chunks(input_file, chunk_size, encoding)
+
+    if workers == 1:
+        converted = map(convert_chunk, chunks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        converted = _bounded_map(executor, convert_chunk, chunks, workers * 2)
+    try:
+        for records in converted:
+            for record in records:
+                if record[0] not in seen:
+                    seen.add(record[0])
+                    yield record
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+def _bounded_map(executor, function, items, window):
+    """Like executor.map, in order, but with at most ``window`` tasks submitted at a time"""
+    futures = deque()
+    for item in items:
+        futures.append(executor.submit(function, item))
+        if len(futures) >= window:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+def write_postal_csv(records, output_file):
+    """Write mapping records as CSV; returns the number of records"""
+    count = 0
+    with open(output_file, 'w', encoding='utf-8', newline='') as outfile:
+        writer = csv.writer(outfile)
+        # Write header
+        writer.writerow(CSV_HEADER)
+        for record in records:
+            writer.writerow(record)
+            count += 1
+    return count
+
+def _written(records, writer):
+    """Pass records through, writing each one as a CSV row on the way"""
+    for record in records:
+        writer.writerow(record)
+        yield record
+
+def _staging_table(metadata):
+    from sqlalchemy import Table, Column, CHAR
+
+    return Table(
+        STAGING_TABLE, metadata,
+        Column("HANMA45001", CHAR(5), nullable=False),
+        Column("HANMA45002", CHAR(10), nullable=False),
+    )
+
+def _bulk_insert(connection, table, rows, batch_size=INSERT_BATCH_SIZE):
+    """
+    Insert (jis_code, postal_code) rows; fast_executemany on SQL Server
+
+    Rows are consumed one batch at a time, so a generator is never held in full.
+    """
+    rows = iter(rows)
+    count = 0
+    if connection.dialect.name == "mssql":
+        # Parameter arrays in one round trip per batch instead of one per row
+        cursor = connection.connection.cursor()
+        try:
+            cursor.fast_executemany = True
+            sql = f"INSERT INTO {table.name} (HANMA45001, HANMA45002) VALUES (?, ?)"
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                cursor.executemany(sql, batch)
+                count += len(batch)
+        finally:
+            cursor.close()
+        return count
+
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        connection.execute(table.insert(), [
+            {"HANMA45001": jis_code, "HANMA45002": postal_code} for jis_code, postal_code in batch
+        ])
+        count += len(batch)
+    return count
+
+def load_postal_mapping(engine, records, batch_size=INSERT_BATCH_SIZE):
+    """
+    Replace the contents of HAN99MA45JYUYUHIMODUKE with the given records
+
+    The rows are bulk loaded into a staging table first, while the live table
+    stays untouched and readable.  The swap then runs in one transaction: the
+    live rows are replaced from the staging table with a set-based
+    INSERT ... SELECT, stamped with the next update number (HANMA45999) so
+    cached postal lookups are reloaded.
+
+    Args:
+        engine: Database engine
+        records: Mapping records as produced by iter_postal_records; any
+            iterable, consumed one batch at a time
+        batch_size: Rows per executemany call
+
+    Returns:
+        Number of rows loaded
+    """
+    from sqlalchemy import MetaData, func, select, literal
+    from app.models.postal_jis_mapping import PostalJISMapping
+
+    mapping = PostalJISMapping.__table__
+    staging = _staging_table(MetaData())
+    staging.drop(engine, checkfirst=True)
+    staging.create(engine)
+    try:
+        with engine.begin() as connection:
+            count = _bulk_insert(connection, staging, ((record[1], record[0]) for record in records), batch_size)
+
+        with engine.begin() as connection:
+            update_number = (connection.execute(select(func.max(mapping.c.HANMA45999))).scalar() or 0) + 1
+            connection.execute(mapping.delete())
+            connection.execute(mapping.insert().from_select(
+                ["HANMA45001", "HANMA45002", "HANMA45999"],
+                select(staging.c.HANMA45001, staging.c.HANMA45002, literal(update_number))
+            ))
+    finally:
+        staging.drop(engine, checkfirst=True)
+    return count
+
+def read_postal_mapping(engine, postal_codes=None, batch_size=1000):
+    """
+    Current postal code -> JIS code mapping in the database
+
+    Args:
+        engine: Database engine
+        postal_codes: Only read these postal codes (default: all)
+        batch_size: Postal codes per IN list
+
+    Returns:
+        Dict of postal code -> JIS code
+    """
+    from sqlalchemy import select
+    from app.models.postal_jis_mapping import PostalJISMapping
+
+    mapping = PostalJISMapping.__table__
+    query = select(mapping.c.HANMA45002, mapping.c.HANMA45001)
+    current = {}
+    with engine.connect() as connection:
+        if postal_codes is None:
+            batches = [query]
+        else:
+            postal_codes = list(postal_codes)
+            batches = [query.where(mapping.c.HANMA45002.in_(postal_codes[start:start + batch_size]))
+                       for start in range(0, len(postal_codes), batch_size)]
+        for batch in batches:
+            for postal_code, jis_code in connection.execute(batch):
+                current[postal_code.strip()] = jis_code.strip()
+    return current
+
+def diff_postal_mapping(current, target, keys=None):
+    """
+    Changes that turn the current mapping into the target mapping
+
+    Args:
+        current: Dict of postal code -> JIS code in the database
+        target: Dict of postal code -> JIS code wanted
+        keys: Only compare these postal codes (default: all of both)
+
+    Returns:
+        (inserts, updates, deletes): (jis, postal) pairs to insert, (jis, postal)
+        pairs whose JIS code changes, and postal codes to delete
+    """
+    keys = set(current) | set(target) if keys is None else keys
+    inserts, updates, deletes = [], [], []
+    for postal_code in sorted(keys):
+        old, new = current.get(postal_code), target.get(postal_code)
+        if old == new:
+            continue
+        if new is None:
+            deletes.append(postal_code)
+        elif old is None:
+            inserts.append((new, postal_code))
+        else:
+            updates.append((new, postal_code))
+    return inserts, updates, deletes
+
+def postal_diff_from_files(engine, add_file=None, delete_file=None, encoding='utf-8'):
+    """
+    Diff from Japan Post's monthly ADD_YYMM / DEL_YYMM files
+
+    Only the postal codes named in the files are read from the database.  A
+    postal code in both files is updated; one only in the delete file is
+    removed, so run a full diff against KEN_ALL now and then to catch postal
+    codes that lost only some of their town rows.
+    """
+    added = {record[0]: record[1] for record in iter_postal_records(add_file, 1, encoding=encoding)} if add_file else {}
+    deleted = {record[0] for record in iter_postal_records(delete_file, 1, encoding=encoding)} if delete_file else set()
+    keys = set(added) | deleted
+    current = read_postal_mapping(engine, keys)
+
+    target = {postal_code: jis_code for postal_code, jis_code in current.items() if postal_code not in deleted}
+    target.update(added)
+    return diff_postal_mapping(current, target, keys)
+
+def apply_postal_diff(engine, inserts, updates, deletes, batch_size=1000):
+    """
+    Apply a postal mapping diff in one transaction
+
+    Inserted and updated rows get the next update number (HANMA45999), which
+    lets running backends evict just those postal codes from their caches.
+    Changed JIS codes are updated in place rather than deleted and re-inserted,
+    so the row count only moves for real inserts and deletes; their update
+    time (HANMA45UPD) is stamped as the column's default stamps new rows.
+
+    Returns:
+        Update number stamped on the changed rows
+    """
+    from sqlalchemy import bindparam, func, select
+    from app.models.postal_jis_mapping import PostalJISMapping, current_timestamp_decimal
+
+    mapping = PostalJISMapping.__table__
+    with engine.begin() as connection:
+        update_number = (connection.execute(select(func.max(mapping.c.HANMA45999))).scalar() or 0) + 1
+        if connection.dialect.name == "mssql":
+            updated_at = mapping.c.HANMA45UPD.server_default.arg
+        else:
+            # Same yyyyMMddHHmmss.ffffff value, for databases without SYSDATETIME()
+            updated_at = current_timestamp_decimal()
+
+        for start in range(0, len(deletes), batch_size):
+            connection.execute(mapping.delete().where(mapping.c.HANMA45002.in_(deletes[start:start + batch_size])))
+        if updates:
+            connection.execute(
+                mapping.update()
+                .where(mapping.c.HANMA45002 == bindparam("postal_code"))
+                .values(HANMA45001=bindparam("jis_code"), HANMA45999=update_number, HANMA45UPD=updated_at),
+                [{"jis_code": jis_code, "postal_code": postal_code} for jis_code, postal_code in updates]
+            )
+        for start in range(0, len(inserts), batch_size):
+            connection.execute(mapping.insert(), [
+                {"HANMA45001": jis_code, "HANMA45002": postal_code, "HANMA45999": update_number}
+                for jis_code, postal_code in inserts[start:start + batch_size]
+            ])
+    return update_number
+
+def convert_postal_code_data(input_file, output_file, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, encoding='utf-8'):
     """
     Convert Japan Post postal code data to JIS code mapping format.
     
     Args:
         input_file: Path to the Japan Post CSV file
         output_file: Path to the output CSV file
+        workers: Worker processes converting the input
+        chunk_size: Input lines per worker task
+        encoding: Input file encoding
         
     Returns:
         Number of records processed
     """
-    count = 0
-    records = {}  # Use dict to avoid duplicates
-    
     try:
-        with open(input_file, 'r', encoding='utf-8') as infile:
-            reader = csv.reader(infile)
-            for row in reader:
-                try:
-                    # Japan Post CSV format:
-                    # 0: 全国地方公共団体コード, 1: 郵便番号(5桁), 2: 郵便番号(7桁)
-                    # 3: 都道府県名カナ, 4: 市区町村名カナ, 5: 町域名カナ
-                    # 6: 都道府県名, 7: 市区町村名, 8: 町域名
-                    
-                    # Extract the data we need
-                    postal_code = row[2].strip()  # 7-digit postal code
-                    prefecture_name = row[6].strip()
-                    city_name = row[7].strip()
-                    street_name = row[8].strip()
-                    
-                    # Skip if missing required data
-                    if not postal_code or not prefecture_name or not city_name:
-                        continue
-                    
-                    # Generate JIS code
-                    jis_code = get_jis_code(prefecture_name, city_name)
-                    
-                    # Create a key to avoid duplicates
-                    key = postal_code
-                    if key not in records:
-                        records[key] = [postal_code, jis_code, prefecture_name, city_name, street_name]
-                        count += 1
-                
-                except Exception as e:
-                    print(f"Error processing row: {e}")
-                    continue
-        
-        # Write to output file
-        with open(output_file, 'w', encoding='utf-8', newline='') as outfile:
-            writer = csv.writer(outfile)
-            # Write header
-            writer.writerow(['PostalCode', 'JISCode', 'PrefectureName', 'CityName', 'StreetName'])
-            # Write data
-            for record in records.values():
-                writer.writerow(record)
-        
+        count = write_postal_csv(iter_postal_records(input_file, workers, chunk_size, encoding), output_file)
         print(f"Conversion complete. Processed {count} records.")
         return count
     
@@ -184,22 +481,78 @@ def convert_postal_code_data(input_file, output_file):
         print(f"Error converting postal code data: {e}")
         return 0
 
-def main():
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Convert Japan Post postal code data to the postal -> JIS mapping")
+    parser.add_argument("input_file", nargs="?", help="Japan Post CSV file (utf_ken_all.csv)")
+    parser.add_argument("output_file", nargs="?", help="Output CSV file")
+    parser.add_argument("--load", action="store_true", help="Load the mapping into HAN99MA45JYUYUHIMODUKE")
+    parser.add_argument("--diff", action="store_true",
+                        help="Apply only the differences between the input file and the database")
+    parser.add_argument("--add", dest="add_file", help="Japan Post ADD_YYMM.CSV to apply (instead of a full input file)")
+    parser.add_argument("--delete", dest="delete_file", help="Japan Post DEL_YYMM.CSV to apply")
+    parser.add_argument("--dry-run", action="store_true", help="With --diff/--add/--delete, only report the changes")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: up to 4)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Input lines per worker task")
+    parser.add_argument("--encoding", default="utf-8", help="Input encoding (cp932 for the original KEN_ALL.CSV)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main function to handle script execution."""
-    if len(sys.argv) < 3:
-        print("Usage: python postal_code_converter.py [input_file] [output_file]")
+    args = parse_arguments(argv)
+    incremental = args.diff or args.add_file or args.delete_file
+    if not (args.input_file or args.add_file or args.delete_file) or not (args.output_file or args.load or incremental):
+        print("Usage: python postal_code_converter.py [input_file] [output_file] [--load | --diff]")
+        print("       python postal_code_converter.py --add ADD_YYMM.CSV --delete DEL_YYMM.CSV")
         return
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
+    input_file = args.input_file
+    output_file = args.output_file
     
-    if not os.path.exists(input_file):
-        print(f"Input file not found: {input_file}")
-        return
+    for path in (input_file, args.add_file, args.delete_file):
+        if path and not os.path.exists(path):
+            print(f"Input file not found: {path}")
+            return
     
-    print(f"Converting postal code data from {input_file} to {output_file}...")
     start_time = datetime.now()
-    count = convert_postal_code_data(input_file, output_file)
+    if incremental:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+        from app.db.base import get_engine
+        from app.db.pool import POOL_WRITE
+        engine = get_engine(POOL_WRITE)
+
+        if args.add_file or args.delete_file:
+            inserts, updates, deletes = postal_diff_from_files(engine, args.add_file, args.delete_file, args.encoding)
+        else:
+            target = {record[0]: record[1] for record in iter_postal_records(input_file, args.workers, args.chunk_size, args.encoding)}
+            inserts, updates, deletes = diff_postal_mapping(read_postal_mapping(engine), target)
+        print(f"{len(inserts)} inserts, {len(updates)} updates, {len(deletes)} deletes")
+        if args.dry_run or not (inserts or updates or deletes):
+            return
+        update_number = apply_postal_diff(engine, inserts, updates, deletes)
+        print(f"Applied as update number {update_number} in {(datetime.now() - start_time).total_seconds():.2f} seconds.")
+        return
+
+    if args.load:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+        from app.db.base import get_engine
+        from app.db.pool import POOL_WRITE
+        engine = get_engine(POOL_WRITE)
+
+        records = iter_postal_records(input_file, args.workers, args.chunk_size, args.encoding)
+        print(f"Loading records from {input_file} into HAN99MA45JYUYUHIMODUKE...")
+        if output_file:
+            # The CSV is written while the records stream into the staging table
+            with open(output_file, 'w', encoding='utf-8', newline='') as outfile:
+                writer = csv.writer(outfile)
+                writer.writerow(CSV_HEADER)
+                count = load_postal_mapping(engine, _written(records, writer))
+        else:
+            count = load_postal_mapping(engine, records)
+        print(f"Loaded {count} records in {(datetime.now() - start_time).total_seconds():.2f} seconds.")
+        return
+
+    print(f"Converting postal code data from {input_file} to {output_file}...")
+    count = convert_postal_code_data(input_file, output_file, args.workers, args.chunk_size, args.encoding)
     end_time = datetime.now()
     
     print(f"Processed {count} records in {(end_time - start_time).total_seconds():.2f} seconds.")
@@ -208,7 +561,7 @@ def main():
         print(f"Output saved to: {output_file}")
         print("Next steps:")
         print("1. Review the output file for accuracy")
-        print("2. Import the data into the HAN99MA45POSTALJIS table using SQL BULK INSERT")
+        print("2. Load it with: python -m app.scripts.postal_code_converter [input_file] --load")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,344 @@
+from typing import List, Optional, Dict, Any, Tuple, Hashable
+import math
+import time
+import logging
+
+from app.core.config import settings
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# Capacity resource of one carrier on one shipping date
+ResourceKey = Tuple[str, int]
+
+# Relative gap between the best assignment and the lower bound at which the search stops
+OPTIMALITY_GAP = 0.001
+# Subgradient iterations without a better lower bound before the step size is halved
+STEP_PATIENCE = 5
+# Iterations between two repairs of the relaxed solution into a feasible assignment
+REPAIR_INTERVAL = 5
+
+
+def remaining_capacity(limits: List[Tuple[float, float, float]], used_volume: float = 0.0,
+                       used_weight: float = 0.0) -> Tuple[float, float]:
+    """
+    Volume and weight still available under a carrier's daily capacity limits
+
+    Each (max volume, max weight, volume to weight ratio) limit is linear, so
+    all of them together reduce to one volume and one weight cap.
+    """
+    volume_cap = weight_cap = math.inf
+    for max_volume, max_weight, volume_weight_ratio in limits:
+        if max_volume > 0:
+            volume_cap = min(volume_cap, max_volume)
+        if max_weight > 0:
+            weight_cap = min(weight_cap, max_weight)
+            if volume_weight_ratio > 0:
+                volume_cap = min(volume_cap, max_weight / volume_weight_ratio)
+    return max(volume_cap - used_volume, 0.0), max(weight_cap - used_weight, 0.0)
+
+
+class WaveItem:
+    """
+    One waybill of a wave: its size and the carriers it may be assigned to
+
+    ``options`` holds (carrier code, fee) for every carrier that meets the
+    delivery deadline; capacity is not considered here.
+    """
+
+    __slots__ = ("key", "volume", "weight", "date_int", "options", "previous_carrier")
+
+    def __init__(self, key: Hashable, volume: float, weight: float, date_int: int,
+                 options: List[Tuple[str, float]], previous_carrier: Optional[str] = None):
+        self.key = key
+        self.volume = volume
+        self.weight = weight
+        self.date_int = date_int
+        self.options = options
+        self.previous_carrier = previous_carrier
+
+
+class WaveSolution:
+    """
+    Assignment of a wave with its total fee and how far it can be from the optimum
+
+    ``objective`` and ``lower_bound`` are in optimizer terms: fees with the
+    previous carrier bonus applied plus a penalty per unassigned waybill.
+    """
+
+    __slots__ = ("assignments", "total_cost", "greedy_cost", "objective", "lower_bound", "iterations", "seconds")
+
+    def __init__(self, assignments: List[Optional[str]], total_cost: float, greedy_cost: float,
+                 objective: float, lower_bound: float, iterations: int, seconds: float):
+        self.assignments = assignments
+        self.total_cost = total_cost
+        self.greedy_cost = greedy_cost
+        self.objective = objective
+        self.lower_bound = lower_bound
+        self.iterations = iterations
+        self.seconds = seconds
+
+    @property
+    def unassigned(self) -> int:
+        return sum(1 for carrier_code in self.assignments if carrier_code is None)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "waybill_count": len(self.assignments),
+            "unassigned_count": self.unassigned,
+            "total_cost": round(self.total_cost, 2),
+            "greedy_cost": round(self.greedy_cost, 2),
+            "objective": round(self.objective, 2),
+            "lower_bound": round(self.lower_bound, 2),
+            "iterations": self.iterations,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+class _Problem:
+    """Flattened wave: per item (resource index, adjusted cost, fee) options and capacities"""
+
+    def __init__(self, items: List[WaveItem], capacities: Dict[ResourceKey, Tuple[float, float]],
+                 previous_carrier_bonus: float):
+        self.items = items
+        self.resource_index: Dict[ResourceKey, int] = {}
+        self.volume_caps: List[float] = []
+        self.weight_caps: List[float] = []
+        self.options: List[List[Tuple[str, int, float, float]]] = []
+        self.penalties: List[float] = []
+
+        for item in items:
+            options = []
+            for carrier_code, cost in item.options:
+                resource = -1
+                volume_cap, weight_cap = capacities.get((carrier_code, item.date_int), (math.inf, math.inf))
+                if volume_cap < math.inf or weight_cap < math.inf:
+                    resource = self._resource((carrier_code, item.date_int), volume_cap, weight_cap)
+                adjusted = cost * (1 - previous_carrier_bonus) if carrier_code == item.previous_carrier else cost
+                options.append((carrier_code, resource, adjusted, cost))
+            options.sort(key=lambda option: option[2])
+            self.options.append(options)
+            # Leaving a waybill unassigned must always be worse than any carrier
+            self.penalties.append(2 * max((option[2] for option in options), default=0.0) + 1)
+
+    def _resource(self, key: ResourceKey, volume_cap: float, weight_cap: float) -> int:
+        index = self.resource_index.get(key)
+        if index is None:
+            index = self.resource_index[key] = len(self.volume_caps)
+            self.volume_caps.append(max(volume_cap, 0.0))
+            self.weight_caps.append(max(weight_cap, 0.0))
+        return index
+
+    def objective(self, choice: List[int]) -> float:
+        """Adjusted cost of an assignment (-1 = unassigned)"""
+        total = 0.0
+        for index, option in enumerate(choice):
+            total += self.penalties[index] if option < 0 else self.options[index][option][2]
+        return total
+
+    def fee(self, choice: List[int]) -> float:
+        """Fee of an assignment, unassigned waybills excluded"""
+        return sum(self.options[index][option][3] for index, option in enumerate(choice) if option >= 0)
+
+    def assign(self, order: List[int], ranked_options: List[List[int]]) -> List[int]:
+        """
+        Give each item, in ``order``, the first of its ranked options with capacity left
+        """
+        volume_left = list(self.volume_caps)
+        weight_left = list(self.weight_caps)
+        choice = [-1] * len(self.items)
+        for index in order:
+            item = self.items[index]
+            for option in ranked_options[index]:
+                resource = self.options[index][option][1]
+                if resource < 0:
+                    choice[index] = option
+                    break
+                if item.volume <= volume_left[resource] and item.weight <= weight_left[resource]:
+                    volume_left[resource] -= item.volume
+                    weight_left[resource] -= item.weight
+                    choice[index] = option
+                    break
+        self.improve(choice, volume_left, weight_left)
+        return choice
+
+    def improve(self, choice: List[int], volume_left: List[float], weight_left: List[float]) -> None:
+        """Move items to cheaper options with spare capacity until nothing improves"""
+        improved = True
+        while improved:
+            improved = False
+            for index, item in enumerate(self.items):
+                current = choice[index]
+                current_cost = self.penalties[index] if current < 0 else self.options[index][current][2]
+                for option, (carrier_code, resource, adjusted, cost) in enumerate(self.options[index]):
+                    if adjusted >= current_cost:
+                        break
+                    if resource >= 0 and (item.volume > volume_left[resource] or item.weight > weight_left[resource]):
+                        continue
+                    if current >= 0:
+                        previous = self.options[index][current][1]
+                        if previous >= 0:
+                            volume_left[previous] += item.volume
+                            weight_left[previous] += item.weight
+                    if resource >= 0:
+                        volume_left[resource] -= item.volume
+                        weight_left[resource] -= item.weight
+                    choice[index] = option
+                    improved = True
+                    break
+
+
+def optimize_wave(items: List[WaveItem], capacities: Dict[ResourceKey, Tuple[float, float]],
+                  previous_carrier_bonus: Optional[float] = None, max_iterations: Optional[int] = None,
+                  time_limit: Optional[float] = None) -> WaveSolution:
+    """
+    Assign carriers to all waybills of a wave at minimum total fee
+
+    The assignment is a generalized assignment problem (volume and weight
+    capacity per carrier and shipping date).  It is solved by Lagrangian
+    relaxation of the capacity constraints: with a price on every capacity the
+    waybills decouple and each takes its cheapest priced carrier.  Subgradient
+    steps raise the price of oversubscribed capacities, and each relaxed
+    solution is repaired into a feasible assignment by a regret heuristic
+    (waybills losing most from their second choice go first).  The search
+    stops at a proven optimality gap, after ``max_iterations`` or after
+    ``time_limit`` seconds; the best feasible assignment found is returned.
+
+    Args:
+        items: Waybills of the wave
+        capacities: Remaining (volume, weight) per (carrier code, shipping date);
+            missing resources are unlimited
+        previous_carrier_bonus: Fee fraction the previously used carrier may be
+            more expensive and still be preferred
+        max_iterations: Subgradient iterations
+        time_limit: Seconds after which the best assignment so far is returned
+
+    Returns:
+        The solution, with None for waybills that cannot be assigned
+    """
+    started = time.perf_counter()
+    if previous_carrier_bonus is None:
+        previous_carrier_bonus = settings.BATCH_PREVIOUS_CARRIER_BONUS
+    if max_iterations is None:
+        max_iterations = settings.BATCH_OPTIMIZER_MAX_ITERATIONS
+    if time_limit is None:
+        time_limit = settings.BATCH_OPTIMIZER_TIME_LIMIT
+
+    problem = _Problem(items, capacities, previous_carrier_bonus)
+    count = len(items)
+    resource_count = len(problem.volume_caps)
+
+    # Order-dependent greedy pass, the way waybills are selected one at a time
+    cheapest_first = [list(range(len(options))) for options in problem.options]
+    greedy = problem.assign(list(range(count)), cheapest_first)
+    greedy_cost = problem.fee(greedy)
+    best_choice, best_objective = greedy, problem.objective(greedy)
+
+    volume_prices = [0.0] * resource_count
+    weight_prices = [0.0] * resource_count
+    lower_bound = -math.inf
+    step_scale = 2.0
+    stalled = 0
+    iteration = 0
+
+    while iteration < max_iterations and resource_count:
+        iteration += 1
+
+        # Relaxed problem: every waybill takes its cheapest priced option
+        relaxed_value = 0.0
+        volume_load = [0.0] * resource_count
+        weight_load = [0.0] * resource_count
+        priced_costs: List[List[float]] = []
+        for index, item in enumerate(items):
+            best_option, best_price = -1, problem.penalties[index]
+            costs = []
+            for option, (carrier_code, resource, adjusted, cost) in enumerate(problem.options[index]):
+                price = adjusted
+                if resource >= 0:
+                    price += volume_prices[resource] * item.volume + weight_prices[resource] * item.weight
+                costs.append(price)
+                if price < best_price:
+                    best_option, best_price = option, price
+            priced_costs.append(costs)
+            relaxed_value += best_price
+            resource = problem.options[index][best_option][1] if best_option >= 0 else -1
+            if resource >= 0:
+                volume_load[resource] += item.volume
+                weight_load[resource] += item.weight
+
+        for resource in range(resource_count):
+            if problem.volume_caps[resource] < math.inf:
+                relaxed_value -= volume_prices[resource] * problem.volume_caps[resource]
+            if problem.weight_caps[resource] < math.inf:
+                relaxed_value -= weight_prices[resource] * problem.weight_caps[resource]
+
+        if relaxed_value > lower_bound + 1e-9:
+            lower_bound, stalled = relaxed_value, 0
+        else:
+            stalled += 1
+            if stalled >= STEP_PATIENCE:
+                step_scale, stalled = step_scale / 2, 0
+
+        # Repair: regret order, cheapest priced options first
+        if iteration % REPAIR_INTERVAL == 1 or iteration == max_iterations:
+            regrets = []
+            ranked = []
+            for index, costs in enumerate(priced_costs):
+                order = sorted(range(len(costs)), key=costs.__getitem__)
+                ranked.append(order)
+                if len(order) >= 2:
+                    regrets.append(costs[order[1]] - costs[order[0]])
+                elif order:
+                    regrets.append(problem.penalties[index] - costs[order[0]])
+                else:
+                    regrets.append(0.0)
+            order = sorted(range(count), key=regrets.__getitem__, reverse=True)
+            candidate = problem.assign(order, ranked)
+            candidate_objective = problem.objective(candidate)
+            if candidate_objective < best_objective - 1e-9:
+                best_choice, best_objective = candidate, candidate_objective
+
+        gap = best_objective - lower_bound
+        if gap <= OPTIMALITY_GAP * max(abs(best_objective), 1.0) or step_scale < 1e-4:
+            break
+        if time.perf_counter() - started >= time_limit:
+            logger.info(f"Wave optimization stopped at the time limit after {iteration} iterations")
+            break
+
+        # Subgradient step on the capacity prices
+        volume_excess = [
+            volume_load[r] - problem.volume_caps[r] if problem.volume_caps[r] < math.inf else 0.0
+            for r in range(resource_count)
+        ]
+        weight_excess = [
+            weight_load[r] - problem.weight_caps[r] if problem.weight_caps[r] < math.inf else 0.0
+            for r in range(resource_count)
+        ]
+        norm = sum(excess * excess for excess in volume_excess) + sum(excess * excess for excess in weight_excess)
+        if norm <= 1e-12:
+            break
+        step = step_scale * gap / norm
+        for r in range(resource_count):
+            volume_prices[r] = max(0.0, volume_prices[r] + step * volume_excess[r])
+            weight_prices[r] = max(0.0, weight_prices[r] + step * weight_excess[r])
+
+    if not resource_count:
+        # Without capacity limits every waybill simply takes its cheapest carrier
+        lower_bound = best_objective
+
+    assignments = [
+        problem.options[index][option][0] if option >= 0 else None
+        for index, option in enumerate(best_choice)
+    ]
+    solution = WaveSolution(
+        assignments=assignments,
+        total_cost=problem.fee(best_choice),
+        greedy_cost=greedy_cost,
+        objective=best_objective,
+        lower_bound=max(lower_bound, 0.0),
+        iterations=iteration,
+        seconds=time.perf_counter() - started,
+    )
+    logger.info(f"Optimized wave of {count} waybills in {solution.seconds:.3f}s: fee {solution.total_cost} "
+                f"(greedy {greedy_cost}), {solution.unassigned} unassigned")
+    return solution
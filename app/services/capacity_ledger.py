@@ -0,0 +1,238 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from datetime import date
+from typing import List, Optional, Dict, Tuple
+import threading
+import time
+import logging
+
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.models.carrier_selection_log import CarrierSelectionLog
+from app.models.waybill import Waybill
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# (max volume, max weight, volume to weight ratio); 0 means the limit is undefined
+CapacityLimit = Tuple[float, float, float]
+
+
+def fits_limits(limits: List[CapacityLimit], volume: float, weight: float) -> bool:
+    """
+    Check a total volume and weight against capacity limits
+
+    Same rules as FeeCalculationService.check_carrier_capacity: a limit of 0
+    is not enforced, and the ratio converts volume into weight.
+    """
+    for max_volume, max_weight, volume_weight_ratio in limits:
+        if max_volume > 0 and volume > max_volume:
+            return False
+        if max_weight > 0 and weight > max_weight:
+            return False
+        if volume_weight_ratio > 0 and max_weight > 0 and volume * volume_weight_ratio > max_weight:
+            return False
+    return True
+
+
+class CapacityReservation:
+    """Volume and weight held for one waybill until its selection is committed"""
+
+    __slots__ = ("carrier_code", "date_int", "volume", "weight")
+
+    def __init__(self, carrier_code: str, date_int: int, volume: float, weight: float):
+        self.carrier_code = carrier_code
+        self.date_int = date_int
+        self.volume = volume
+        self.weight = weight
+
+
+class CapacityLedger:
+    """
+    Running volume and weight per (carrier, shipping date)
+
+    Usage is the sum of two parts:
+      - committed: selection logs of waybills shipping on that date, read from
+        the database on first use of a date and again every ``ttl`` seconds so
+        commits of other processes are picked up
+      - pending: reservations of this process whose logs are not written yet
+
+    Checks and reservations are O(1) dictionary operations under one lock, so
+    parallel batch workers cannot oversubscribe a carrier between them.  The
+    committed usage query runs outside the lock; its result is swapped in
+    under it, together with the confirmations logged after the query started,
+    which it may not have seen.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = settings.CAPACITY_LEDGER_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._committed: Dict[int, Dict[str, List[float]]] = {}
+        self._seeded_at: Dict[int, float] = {}
+        # Confirmations per date as (logged_at, carrier code, volume, weight)
+        self._confirmed: Dict[int, List[Tuple[float, str, float, float]]] = {}
+        self._pending: Dict[Tuple[str, int], List[float]] = {}
+
+    def usage(self, db: Session, carrier_code: str, shipping_date: date) -> Tuple[float, float]:
+        """
+        Volume and weight already allocated to a carrier on a shipping date
+        """
+        carrier_code, date_int = self._key(carrier_code, shipping_date)
+        self._seed(db, date_int)
+        with self._lock:
+            return self._usage(carrier_code, date_int)
+
+    def fits(self, db: Session, carrier_code: str, shipping_date: date,
+             volume: float, weight: float, limits: List[CapacityLimit]) -> bool:
+        """
+        Check whether a shipment still fits the carrier's capacity for the day
+
+        Args:
+            db: Session used to read committed usage
+            carrier_code: Transportation company code
+            shipping_date: Shipping date
+            volume: Shipment volume
+            weight: Shipment weight
+            limits: Capacity limits that apply to the carrier on that date
+
+        Returns:
+            True if the shipment fits on top of the current usage
+        """
+        if not limits:
+            return True
+        carrier_code, date_int = self._key(carrier_code, shipping_date)
+        self._seed(db, date_int)
+        with self._lock:
+            used_volume, used_weight = self._usage(carrier_code, date_int)
+        return fits_limits(limits, used_volume + volume, used_weight + weight)
+
+    def try_reserve(self, db: Session, carrier_code: str, shipping_date: date,
+                    volume: float, weight: float, limits: List[CapacityLimit]) -> Optional[CapacityReservation]:
+        """
+        Atomically check and reserve capacity for a shipment
+
+        Returns:
+            The reservation, or None if the shipment no longer fits
+        """
+        carrier_code, date_int = self._key(carrier_code, shipping_date)
+        self._seed(db, date_int)
+        with self._lock:
+            used_volume, used_weight = self._usage(carrier_code, date_int)
+            if not fits_limits(limits, used_volume + volume, used_weight + weight):
+                metrics_registry.increment("capacity_reservation_conflicts_total")
+                logger.warning(f"Carrier '{carrier_code}' is fully booked on {date_int}: "
+                               f"used volume={used_volume}, weight={used_weight}")
+                return None
+            pending = self._pending.setdefault((carrier_code, date_int), [0.0, 0.0])
+            pending[0] += volume
+            pending[1] += weight
+
+        metrics_registry.increment("capacity_reservations_total")
+        return CapacityReservation(carrier_code, date_int, volume, weight)
+
+    def confirm(self, reservation: CapacityReservation, logged_at: Optional[float] = None) -> None:
+        """
+        Turn a reservation into committed usage once its selection log is saved
+
+        Args:
+            reservation: The reservation
+            logged_at: ``time.monotonic()`` taken after the selection log was
+                committed (now by default); a reseed started since then
+                already counts the log
+        """
+        if logged_at is None:
+            logged_at = time.monotonic()
+        with self._lock:
+            self._remove_pending(reservation)
+            seeded_at = self._seeded_at.get(reservation.date_int)
+            if seeded_at is not None and seeded_at >= logged_at:
+                return
+            # Kept until a reseed that started after the log was written
+            self._confirmed.setdefault(reservation.date_int, []).append(
+                (logged_at, reservation.carrier_code, reservation.volume, reservation.weight)
+            )
+            committed = self._committed.get(reservation.date_int)
+            if committed is not None:
+                totals = committed.setdefault(reservation.carrier_code, [0.0, 0.0])
+                totals[0] += reservation.volume
+                totals[1] += reservation.weight
+
+    def release(self, reservation: CapacityReservation) -> None:
+        """
+        Give back a reservation whose selection could not be committed
+        """
+        with self._lock:
+            self._remove_pending(reservation)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._committed.clear()
+            self._seeded_at.clear()
+            self._confirmed.clear()
+            self._pending.clear()
+
+    def _key(self, carrier_code: str, shipping_date: date) -> Tuple[str, int]:
+        return (carrier_code or "").strip(), int(shipping_date.strftime("%Y%m%d"))
+
+    def _usage(self, carrier_code: str, date_int: int) -> Tuple[float, float]:
+        committed = self._committed.get(date_int, {}).get(carrier_code, (0.0, 0.0))
+        pending = self._pending.get((carrier_code, date_int), (0.0, 0.0))
+        return committed[0] + pending[0], committed[1] + pending[1]
+
+    def _remove_pending(self, reservation: CapacityReservation) -> None:
+        key = (reservation.carrier_code, reservation.date_int)
+        pending = self._pending.get(key)
+        if pending is None:
+            return
+        pending[0] -= reservation.volume
+        pending[1] -= reservation.weight
+        if pending[0] <= 1e-9 and pending[1] <= 1e-9:
+            del self._pending[key]
+
+    def _seed(self, db: Session, date_int: int) -> None:
+        """
+        Load the committed usage of a shipping date unless it is fresh
+
+        The query runs without the lock, so a slow reseed does not hold up
+        the other workers; ``_seeded_at`` is the time the query started.
+        Confirmations logged after that are added to its result, as the query
+        may have missed them.
+        """
+        with self._lock:
+            seeded_at = self._seeded_at.get(date_int)
+        if seeded_at is not None and time.monotonic() - seeded_at < self.ttl:
+            return
+
+        started = time.monotonic()
+        rows = db.query(
+            CarrierSelectionLog.HANRA42006,
+            func.sum(CarrierSelectionLog.HANRA42004),
+            func.sum(CarrierSelectionLog.HANRA42005)
+        ).join(
+            Waybill, Waybill.HANRA41001 == CarrierSelectionLog.HANRA42002
+        ).filter(
+            Waybill.HANRA41002 == date_int,
+            CarrierSelectionLog.HANRA42006 != settings.CARRIER_UNASSIGNED_CODE
+        ).group_by(CarrierSelectionLog.HANRA42006).all()
+
+        committed = {
+            (carrier_code or "").strip(): [float(volume or 0), float(weight or 0)]
+            for carrier_code, volume, weight in rows
+        }
+        with self._lock:
+            # A worker whose query started later has swapped in newer usage already
+            if self._seeded_at.get(date_int, float("-inf")) >= started:
+                return
+            confirmed = [entry for entry in self._confirmed.pop(date_int, []) if entry[0] > started]
+            for _, carrier_code, volume, weight in confirmed:
+                totals = committed.setdefault(carrier_code, [0.0, 0.0])
+                totals[0] += volume
+                totals[1] += weight
+            if confirmed:
+                self._confirmed[date_int] = confirmed
+            self._committed[date_int] = committed
+            self._seeded_at[date_int] = started
+        logger.info(f"Seeded capacity ledger for {date_int} with {len(rows)} carriers")
+
+
+capacity_ledger = CapacityLedger()
@@ -4,19 +4,29 @@ from typing import List, Optional, Dict, Any, Tuple
 from datetime import date, datetime
 import time
 import math
-import requests
 import logging
 from decimal import Decimal, InvalidOperation
 
 from app.core.config import settings
+from app.core.metrics import StageTimer, timed, merge_timings, metrics_registry
+from app.db import statements
 
-from app.models.picking import PickingManagement, PickingWork
+from app.models.picking import PickingWork
 from app.models.carrier_selection_log import CarrierSelectionLog
 from app.models.carrier_selection_log_detail import CarrierSelectionLogDetail
 from app.models.juhachu import JuHachuHeader, MeisaiKakucho
 from app.models.waybill import Waybill
 
 from app.services.fee_calculation_service import FeeCalculationService
+from app.services.fee_tiers import ParcelHistogram
+from app.services.master_data_cache import MasterDataCache, master_data_cache
+from app.services.selection_plan_cache import selection_plan_cache, picking_work_fingerprint
+from app.services.waybill_group import BoxDimensions, ProductLine, WaybillGroup, WorkKey, picking_work_key
+from app.services.selection_memo import SelectionMemo, selection_memo
+from app.services.capacity_ledger import CapacityLedger, CapacityReservation, capacity_ledger
+from app.services.batch_optimizer import WaveItem, optimize_wave, remaining_capacity
+from app.services.postal_code_resolver import PostalCodeResolver, postal_code_resolver
+from app.services.picking_list_cache import picking_list_cache
 
 # Setup logger
 logger = logging.getLogger(__name__)
@@ -24,59 +34,49 @@ logger = logging.getLogger(__name__)
 # Constants
 VOLUME_CUBE_SIZE = 30.3  # cm
 VOLUME_TO_WEIGHT_RATIO = 8  # 1 volume (30.3cm cube) = 8kg
-POSTCODE_API_KEY = "__apikey__"  # Replace with actual API key
+MAX_RESERVATION_ATTEMPTS = 3  # Re-evaluations when another worker took the chosen carrier's capacity
 
 class CarrierSelectionService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, master_data: Optional[MasterDataCache] = None,
+                 memo: Optional[SelectionMemo] = None,
+                 capacity_ledger: Optional[CapacityLedger] = None,
+                 postal_resolver: Optional[PostalCodeResolver] = None):
         self.db = db
-        self.fee_calculator = FeeCalculationService(db)
+        self.timer = StageTimer()
+        self.capacity_ledger = capacity_ledger
+        self.fee_calculator = FeeCalculationService(db, timer=self.timer, master_data=master_data, memo=memo,
+                                                    capacity_ledger=capacity_ledger, postal_resolver=postal_resolver)
+
+    def _set_timer(self, timer: StageTimer) -> None:
+        """
+        Route the stage spans of this service and its fee calculator to a timer
+        """
+        self.timer = timer
+        self.fee_calculator.timer = timer
     
     def get_jis_code_from_postal_code(self, postal_code: str) -> Optional[str]:
         """
-        Get JIS address code from postal code using PostcodeJP API
+        Get JIS address code from postal code, asking the PostcodeJP API for
+        postal codes missing from the mapping table
         """
-        try:
-            # Remove any hyphens or spaces
-            postal_code = postal_code
-            
-            # Make API request
-            url = f"https://postcode-jp.com/api/postcode/{postal_code}"
-            headers = {"apikey": POSTCODE_API_KEY}
-            response = requests.get(url, headers=headers)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data and "data" in data and len(data["data"]) > 0:
-                    address = data["data"][0]
-                    # Extract city and prefecture codes
-                    prefecture_code = address.get("prefecture_code", "")
-                    city_code = address.get("city_code", "")
-                    
-                    if prefecture_code and city_code:
-                        # Combine to create 5-digit JIS code
-                        return f"{prefecture_code}{city_code}"
-            
-            logger.warning(f"Could not find JIS code for postal code {postal_code}")
-            return None
-        
-        except Exception as e:
-            logger.error(f"Error fetching JIS code for postal code {postal_code}: {str(e)}")
-            return None
+        resolver = self.fee_calculator.postal_resolver or postal_code_resolver
+        return resolver.resolve(postal_code, self.db)
 
-    def calculate_package_metrics(self, products: List[Dict[str, Any]]) -> Tuple[int, float, float, float, List[Dict[str, Any]]]:
+    def calculate_package_metrics(self, products: List[ProductLine]) -> Tuple[int, float, float, float, ParcelHistogram]:
         """
         Calculate package metrics based on products
         
         Returns:
-            Tuple containing (parcel_count, volume, weight, size, parcels_info)
+            Tuple containing (parcel_count, volume, weight, size, parcel size histogram)
         """
         # Use the fee calculator service to get detailed product metrics
         return self.fee_calculator.calculate_package_metrics(products)
 
+    @timed("log_write")
     def save_carrier_selection_log(self, waybill_id: str, parcel_count: int, 
                                  volume: float, weight: float, size: float,
                                  selected_carrier: str, cheapest_carrier: str, 
-                                 reason: str, products: List[Dict[str, Any]] = None) -> str:
+                                 reason: str, products: List[ProductLine] = None) -> str:
         """
         Save the carrier selection to the log table
         
@@ -121,22 +121,17 @@ class CarrierSelectionService:
                 for product in products:
                     try:
                         # Extract product code and truncate if needed
-                        product_code = product.get("product_code", "")
+                        product_code = product.product_code
                         if isinstance(product_code, str) and len(product_code) > 8:
                             product_code = product_code[:8]
                             logger.warning(f"Product code truncated to 8 chars: {product_code}")
                         
-                        # Calculate size from dimensions
-                        dimensions = product.get("outer_box_dimensions", [{}])[0] if product.get("outer_box_dimensions") else {}
-                        size = self.to_float(
-                            dimensions.get("length", 0) + 
-                            dimensions.get("width", 0) + 
-                            dimensions.get("height", 0)
-                        )
+                        # Calculate size from the dimensions of the first box
+                        size = self.to_float(sum(product.box_dimensions[0])) if product.box_dimensions else 0.0
                         
                         # Calculate box count
-                        outer_box_count = self.to_float(product.get("outer_box_count", 1) or 1)
-                        quantity = self.to_float(product.get("quantity", 0) or 0)
+                        outer_box_count = self.to_float(product.outer_box_count or 1)
+                        quantity = self.to_float(product.quantity or 0)
                         box_count = math.ceil(quantity / outer_box_count)
                         
                         # Create new detail record
@@ -151,7 +146,7 @@ class CarrierSelectionService:
                         self.db.add(detail)
                         
                     except Exception as e:
-                        logger.error(f"Error processing log detail for product {product.get('product_code', 'unknown')}: {str(e)}")
+                        logger.error(f"Error processing log detail for product {product.product_code}: {str(e)}")
                         # Continue with other products
             
             # Commit to save the log
@@ -164,6 +159,7 @@ class CarrierSelectionService:
             logger.error(f"Error saving carrier selection log: {str(e)}")
             return ""
 
+    @timed("waybill_write")
     def update_database(self, shipping_date: str, delivery_deadline: str,
                         customer_code: str, postal_code: str = "",
                         delivery_info1: str = "", delivery_info2: str = "",
@@ -266,7 +262,8 @@ class CarrierSelectionService:
             self.db.rollback()
             return ""
 
-    def update_smilev_database(self, waybill_id: str, carrier_code: str, order_ids: List[str] = None, picking_works: List[PickingWork] = None) -> bool:
+    @timed("smilev_write")
+    def update_smilev_database(self, waybill_id: str, carrier_code: str, order_ids: List[str] = None, work_keys: List[WorkKey] = None) -> bool:
         """
         Update the SmileV database tables with the selected carrier information
         
@@ -274,7 +271,7 @@ class CarrierSelectionService:
             waybill_id: The ID of the waybill
             carrier_code: The code of the selected transportation company
             order_ids: List of order IDs related to this waybill
-            picking_works: List of picking work records related to this waybill
+            work_keys: Primary keys of the picking works related to this waybill
             
         Returns:
             True if successful, False otherwise
@@ -288,9 +285,7 @@ class CarrierSelectionService:
             if order_ids:
                 for order_id in order_ids:
                     # Find the order header
-                    header = self.db.query(JuHachuHeader).filter(
-                        JuHachuHeader.HANR004005 == order_id
-                    ).first()
+                    header = statements.order_header(self.db, order_id)
                     
                     if header:
                         # Check if carrier is already assigned
@@ -332,8 +327,14 @@ class CarrierSelectionService:
                         logger.info(f"Updated order header {order_id} with carrier code {carrier_code}")
             
             # 2. Update PickingWork table (ピッキングワーク)
-            if picking_works:
-                for work in picking_works:
+            if work_keys:
+                for work_key in work_keys:
+                    # Found in the identity map unless the row was released meanwhile
+                    work = self.db.get(PickingWork, work_key)
+                    if work is None:
+                        logger.warning(f"Picking work {'-'.join(str(part) for part in work_key)} not found, skipping")
+                        continue
+                    
                     # Check if carrier is already assigned
                     current_carrier = work.HANW002A003
                     if current_carrier and current_carrier.strip() == carrier_code.strip():
@@ -356,6 +357,8 @@ class CarrierSelectionService:
             # Commit all changes
             if update_count > 0:
                 self.db.commit()
+                # The assigned pickings drop out of the picking list
+                picking_list_cache.invalidate()
                 logger.info(f"Successfully updated {update_count} records in SmileV database for waybill {waybill_id}")
                 return True
             else:
@@ -367,57 +370,56 @@ class CarrierSelectionService:
             self.db.rollback()
             return False
 
-    def get_picking_waybills(self, picking_id: int) -> List[Dict[str, Any]]:
+    def get_picking_waybills(self, picking_id: int, picking_works: Optional[List[PickingWork]] = None) -> List[WaybillGroup]:
         """
         Group picking data into waybills based on the specified grouping criteria
         
         Args:
             picking_id: Picking ID to process
+            picking_works: The picking's work rows, if the caller already loaded them
             
         Returns:
-            List of waybill data dictionaries
+            List of waybill groups
         """
         logger.info(f"Getting waybills for picking ID {picking_id}")
         
-        # Get all picking works and related order data for this picking ID
-        picking_works = self.db.query(PickingWork).filter(
-            PickingWork.HANW002009 == picking_id
-        ).all()
-        
-        if not picking_works:
-            logger.warning(f"No picking works found for picking ID {picking_id}")
-            return []
+        with self.timer.span("header_fetch"):
+            # Get all picking works and related order data for this picking ID
+            if picking_works is None:
+                picking_works = statements.picking_works(self.db, picking_id)
             
-        logger.info(f"Found {len(picking_works)} picking work records for picking ID {picking_id}")
+            if not picking_works:
+                logger.warning(f"No picking works found for picking ID {picking_id}")
+                return []
+                
+            logger.info(f"Found {len(picking_works)} picking work records for picking ID {picking_id}")
+            
+            # Get order headers and grouping data
+            order_headers = {}
+            for work in picking_works:
+                order_id = work.HANW002002
+                document_type = work.HANW002001  # Get the document type from picking work
+                
+                # Only include orders where carrier code is None or empty
+                # Also filter by document type as requested and ensure it matches the picking work's document type
+                # Ensure document types match
+                header = statements.order_header(
+                    self.db, order_id, document_type=document_type,
+                    carrier_code=None if settings.ENV == "Development" else settings.CARRIER_UNASSIGNED_CODE
+                )
+                
+                if header:
+                    # Use a composite key of order_id and document_type to handle cases
+                    # where the same order_id has multiple document types
+                    key = f"{order_id}_{document_type}"
+                    order_headers[key] = header
+                else:
+                    logger.info(f"Order header not found or already has carrier code assigned for order ID {order_id}, document type {document_type}")
         
         # Group by delivery destination, shipping date, delivery date, etc. as specified
-        waybills = {}
-        
-        # Get order headers and grouping data
-        order_headers = {}
-        for work in picking_works:
-            order_id = work.HANW002002
-            document_type = work.HANW002001  # Get the document type from picking work
-            
-            # Only include orders where carrier code is None or empty
-            # Also filter by document type as requested and ensure it matches the picking work's document type
-            query = self.db.query(JuHachuHeader).filter(
-                JuHachuHeader.HANR004005 == order_id,
-                JuHachuHeader.HANR004004 == document_type  # Ensure document types match
-            )
-
-            if not settings.ENV == "Development":
-                query = query.filter(JuHachuHeader.HANR004A008 == settings.CARRIER_UNASSIGNED_CODE)
-
-            header = query.first()
-            
-            if header:
-                # Use a composite key of order_id and document_type to handle cases
-                # where the same order_id has multiple document types
-                key = f"{order_id}_{document_type}"
-                order_headers[key] = header
-            else:
-                logger.info(f"Order header not found or already has carrier code assigned for order ID {order_id}, document type {document_type}")
+        waybills: Dict[str, WaybillGroup] = {}
+        # Product lines of each group by product code
+        product_lines: Dict[Tuple[str, Any], ProductLine] = {}
         
         logger.info(f"Found {len(order_headers)} order headers with no carrier assigned")
         
@@ -426,6 +428,11 @@ class CarrierSelectionService:
             logger.info(f"No orders without assigned carriers found for picking ID {picking_id}")
             return []
         
+        # Resolve all destinations up front; unknown ones are asked of the API concurrently
+        self.fee_calculator.prefetch_postal_codes(sorted({
+            (header.HANR004A037 or "").strip() for header in order_headers.values() if header.HANR004A037
+        }))
+
         # Group picking works into waybills based on the specified criteria
         for work in picking_works:
             order_id = work.HANW002002
@@ -494,32 +501,29 @@ class CarrierSelectionService:
                         logger.warning(f"Could not find JIS code for postal code {dest_postal}")
                 
                 logger.info(f"Creating new waybill group with key: {group_key}")
-                waybills[group_key] = {
-                    "customer_code": customer_code,
-                    "prefecture_code": prefecture_code,
-                    "delivery_info1": delivery_info1,
-                    "delivery_info2": delivery_info2,
-                    "dest_name1": dest_name1,
-                    "dest_name2": dest_name2,
-                    "dest_postal": dest_postal,
-                    "dest_addr1": dest_addr1,
-                    "dest_addr2": dest_addr2,
-                    "dest_addr3": dest_addr3,
-                    "jis_code": jis_code,
-                    "postal_code": dest_postal,
-                    "shipping_date": shipping_date_obj,
-                    "delivery_date": delivery_date_obj,
-                    "products": [],
-                    "order_ids": [],
-                    "picking_works": []  # Store references to the picking works for later update
-                }
+                waybills[group_key] = WaybillGroup(
+                    customer_code=customer_code,
+                    prefecture_code=prefecture_code,
+                    delivery_info1=delivery_info1,
+                    delivery_info2=delivery_info2,
+                    dest_name1=dest_name1,
+                    dest_name2=dest_name2,
+                    dest_postal=dest_postal,
+                    dest_addr1=dest_addr1,
+                    dest_addr2=dest_addr2,
+                    dest_addr3=dest_addr3,
+                    jis_code=jis_code,
+                    shipping_date=shipping_date_obj,
+                    delivery_date=delivery_date_obj
+                )
+            waybill = waybills[group_key]
             
             # Add order ID to the waybill (for database updates)
-            if order_id not in waybills[group_key]["order_ids"]:
-                waybills[group_key]["order_ids"].append(order_id)
+            if order_id not in waybill.order_ids:
+                waybill.order_ids.append(order_id)
             
-            # Add the picking work reference for later update
-            waybills[group_key]["picking_works"].append(work)
+            # Keep the picking work's key for the later update
+            waybill.work_keys.append(picking_work_key(work))
             
             # Add product information from the picking work
             product_code = work.HANW002030  # Product code
@@ -543,37 +547,34 @@ class CarrierSelectionService:
             quantity_float = self.to_float(quantity)
             
             # Check if product with same code already exists in the waybill
-            existing_product = next((p for p in waybills[group_key]["products"] if p["product_code"] == product_code), None)
+            existing_product = product_lines.get((group_key, product_code))
             
             if existing_product:
-                existing_product["quantity"] += quantity_float
-                logger.info(f"Increased quantity of existing product '{product_code}' by {quantity_float}, new total: {existing_product['quantity']}")
-            elif product_info:
-                waybills[group_key]["products"].append({
-                    "product_code": product_code,
-                    "quantity": quantity_float,
-                    "set_parcel_count": self.to_int(product_info.get("set_parcel_count", 1)),
-                    "outer_box_count": self.to_int(product_info.get("outer_box_count", 1)),
-                    "weight_per_unit": self.to_float(product_info.get("weight_per_unit", 0)),
-                    "volume_per_unit": self.to_float(product_info.get("volume_per_unit", 0)),
-                    "outer_box_dimensions": self._convert_dimensions_to_float(product_info.get("outer_box_dimensions", []))
-                })
+                existing_product.quantity += quantity_float
+                logger.info(f"Increased quantity of existing product '{product_code}' by {quantity_float}, new total: {existing_product.quantity}")
+                continue
+            
+            if product_info:
+                product_line = ProductLine(
+                    product_code=product_code,
+                    quantity=quantity_float,
+                    set_parcel_count=self.to_int(product_info.get("set_parcel_count", 1)),
+                    outer_box_count=self.to_int(product_info.get("outer_box_count", 1)),
+                    weight_per_unit=self.to_float(product_info.get("weight_per_unit", 0)),
+                    volume_per_unit=self.to_float(product_info.get("volume_per_unit", 0)),
+                    box_dimensions=self._convert_dimensions_to_float(product_info.get("outer_box_dimensions", []))
+                )
             else:
                 logger.warning(f"Product info not found for code '{product_code}', using default values")
-                waybills[group_key]["products"].append({
-                    "product_code": product_code,
-                    "quantity": quantity_float,
-                    "set_parcel_count": 1,
-                    "outer_box_count": 1,
-                    "weight_per_unit": 1.0,
-                    "volume_per_unit": 0.0,
-                    "outer_box_dimensions": []
-                })
+                product_line = ProductLine(product_code=product_code, quantity=quantity_float)
+            product_lines[(group_key, product_code)] = product_line
+            waybill.products.append(product_line)
                 
         logger.info(f"Created {len(waybills)} waybill groups from {len(picking_works)} picking works")
         return list(waybills.values())
 
-    def find_previous_carrier_for_waybill(self, waybill: Dict[str, Any]) -> Optional[str]:
+    @timed("previous_carrier_lookup")
+    def find_previous_carrier_for_waybill(self, waybill: WaybillGroup) -> Optional[str]:
         """
         Find the previously used carrier for a waybill with the same destinations
         
@@ -584,17 +585,17 @@ class CarrierSelectionService:
             The carrier code, or None if not found
         """
         try:
-            customer_code = waybill.get("customer_code", "")
-            shipping_date = waybill.get("shipping_date", "")
-            delivery_date = waybill.get("delivery_date", "")
+            customer_code = waybill.customer_code
+            shipping_date = waybill.shipping_date
+            delivery_date = waybill.delivery_date
             shipping_date_str = shipping_date.strftime("%Y%m%d") if shipping_date else ""
             delivery_date_str = delivery_date.strftime("%Y%m%d") if delivery_date else ""
-            dest_name1 = waybill.get("dest_name1", "")
-            dest_name2 = waybill.get("dest_name2", "")
-            dest_postal = waybill.get("dest_postal", "")
-            dest_addr1 = waybill.get("dest_addr1", "")
-            dest_addr2 = waybill.get("dest_addr2", "")
-            dest_addr3 = waybill.get("dest_addr3", "")
+            dest_name1 = waybill.dest_name1
+            dest_name2 = waybill.dest_name2
+            dest_postal = waybill.dest_postal
+            dest_addr1 = waybill.dest_addr1
+            dest_addr2 = waybill.dest_addr2
+            dest_addr3 = waybill.dest_addr3
             
             filters = [
                 Waybill.HANRA41004 == customer_code,
@@ -608,14 +609,14 @@ class CarrierSelectionService:
                 Waybill.HANRA41012 == dest_addr3,
             ]
 
-            delivery_info1 = waybill.get("delivery_info1")
+            delivery_info1 = waybill.delivery_info1
             if delivery_info1 not in [None, ""]:
                 try:
                     filters.append(Waybill.HANRA41005 == Decimal(delivery_info1))
                 except (InvalidOperation, ValueError, TypeError):
                     pass
 
-            delivery_info2 = waybill.get("delivery_info2")
+            delivery_info2 = waybill.delivery_info2
             if delivery_info2 not in [None, ""]:
                 try:
                     filters.append(Waybill.HANRA41006 == Decimal(delivery_info2))
@@ -646,26 +647,130 @@ class CarrierSelectionService:
         return None
 
 
-    def select_carriers_for_picking(self, picking_id: int) -> Dict[str, Any]:
+    def select_carriers_for_picking(self, picking_id: int, include_timings: bool = False,
+                                    dry_run: bool = False) -> Dict[str, Any]:
         """
         Select optimal carriers for all waybills in a picking
         
         Args:
             picking_id: The ID of the picking
+            include_timings: Attach per-stage durations and query counts
+                for the picking and each of its waybills to the result
+            dry_run: Only evaluate the decisions - no waybill, log or SmileV writes.
+                The waybill grouping is kept so a later commit can reuse it
             
         Returns:
             Dictionary with selection results
         """
-        logger.info(f"Starting carrier selection for picking ID {picking_id}")
+        root_timer = self.timer
+        picking_timer = root_timer.child()
+        waybill_timers: List[StageTimer] = []
+
+        self._set_timer(picking_timer)
+        try:
+            with picking_timer.span("picking_total"):
+                result = self._select_carriers_for_picking(picking_id, waybill_timers, dry_run=dry_run)
+        finally:
+            self._set_timer(root_timer)
+
+        metrics_registry.increment("pickings_processed_total")
+        metrics_registry.increment("waybills_processed_total", len(waybill_timers))
+
+        if include_timings:
+            result["timings"] = {
+                "stages": picking_timer.as_dict(),
+                "waybills": [
+                    {"waybill_index": index, "stages": timer.as_dict()}
+                    for index, timer in enumerate(waybill_timers, 1)
+                ]
+            }
+        return result
+
+    def _select_carriers_for_picking(self, picking_id: int, waybill_timers: List[StageTimer],
+                                     dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Carrier selection for one picking, recording a child timer per waybill
+        """
+        logger.info(f"Starting carrier selection for picking ID {picking_id}" + (" (dry run)" if dry_run else ""))
+        
+        waybills, failure = self._load_picking_waybills(picking_id, dry_run)
+        if failure is not None:
+            return failure
+            
+        logger.info(f"Processing {len(waybills)} waybills for picking ID {picking_id}")
+        
+        selection_details = []
+        successful_selections = 0
+        failed_selections = 0
+        
+        picking_timer = self.timer
+        for waybill_index, waybill in enumerate(waybills, 1):
+            waybill_timer = picking_timer.child()
+            waybill_timers.append(waybill_timer)
+            self._set_timer(waybill_timer)
+
+            customer_code = waybill.customer_code
+            try:
+                evaluation = self._evaluate_waybill(waybill, waybill_index, len(waybills))
+                if evaluation is None:
+                    failed_selections += 1
+                    continue
+
+                if dry_run:
+                    detail = self._selection_detail(evaluation, waybill_id=None)
+                else:
+                    evaluation, reservation = self._reserve_capacity(waybill, evaluation, waybill_index, len(waybills))
+                    if evaluation is None:
+                        failed_selections += 1
+                        continue
+                    detail = self._commit_waybill(waybill, evaluation, waybill_index, reservation)
+
+                if detail is None:
+                    failed_selections += 1
+                    continue
+
+                selection_details.append(detail)
+                successful_selections += 1
+                logger.info(f"Waybill {waybill_index} processed successfully")
+                
+            except Exception as e:
+                logger.error(f"Error processing waybill {waybill_index} for customer '{customer_code}': {str(e)}")
+                failed_selections += 1
+                continue
+        
+        self._set_timer(picking_timer)
+        if not dry_run:
+            # The picking works changed, any planned grouping is obsolete now
+            selection_plan_cache.discard(picking_id)
+        logger.info(f"Carrier selection completed for picking ID {picking_id}: {successful_selections} successful, {failed_selections} failed")
         
+        result = {
+            "picking_id": picking_id,
+            "waybill_count": len(waybills),
+            "selection_details": selection_details,
+            "success": successful_selections > 0,
+            "message": f"Carrier selection {'simulated' if dry_run else 'completed'} for {len(selection_details)} waybills"
+        }
+        if dry_run:
+            result["dry_run"] = True
+        return result
+
+    def _load_picking_waybills(self, picking_id: int,
+                               dry_run: bool = False) -> Tuple[List[WaybillGroup], Optional[Dict[str, Any]]]:
+        """
+        Load the waybill groups of a picking, reusing a planned grouping while it is valid
+
+        Returns:
+            Tuple of (waybills, failure); failure is the picking result to return
+            when there is nothing to select carriers for
+        """
         # Check if picking exists
-        picking = self.db.query(PickingManagement).filter(
-            PickingManagement.HANCA11001 == picking_id
-        ).first()
+        with self.timer.span("header_fetch"):
+            picking = statements.picking(self.db, picking_id)
         
         if not picking:
             logger.warning(f"Picking ID {picking_id} not found in database")
-            return {
+            return [], {
                 "picking_id": picking_id,
                 "waybill_count": 0,
                 "selection_details": [],
@@ -674,13 +779,12 @@ class CarrierSelectionService:
             }
             
         # Check if the picking has any associated orders before trying to get waybills
-        picking_work_count = self.db.query(PickingWork).filter(
-            PickingWork.HANW002009 == picking_id
-        ).count()
+        with self.timer.span("header_fetch"):
+            picking_works = statements.picking_works(self.db, picking_id)
         
-        if picking_work_count == 0:
+        if not picking_works:
             logger.warning(f"No picking works found for picking ID {picking_id}")
-            return {
+            return [], {
                 "picking_id": picking_id,
                 "waybill_count": 0,
                 "selection_details": [],
@@ -688,313 +792,339 @@ class CarrierSelectionService:
                 "message": f"No orders found for picking ID {picking_id}"
             }
         
-        waybills = self.get_picking_waybills(picking_id)
+        # Reuse the grouping of an earlier dry run while the picking works and
+        # their order headers are unchanged
+        with self.timer.span("header_fetch"):
+            headers = statements.order_header_versions(
+                self.db, sorted({work.HANW002002 for work in picking_works})
+            )
+        fingerprint = picking_work_fingerprint(picking_works, headers)
+        waybills = selection_plan_cache.restore(picking_id, fingerprint, picking_works)
+        if waybills is not None:
+            logger.info(f"Reusing planned waybill grouping for picking ID {picking_id}")
+            metrics_registry.increment("selection_plans_reused_total")
+        else:
+            waybills = self.get_picking_waybills(picking_id, picking_works=picking_works)
+            if dry_run and waybills:
+                selection_plan_cache.store(picking_id, fingerprint, waybills)
         
         if not waybills:
             # No orders have carriers assigned, but there might be other issues
             logger.warning(f"No waybills could be created from orders in picking ID {picking_id}")
-            return {
+            return [], {
                 "picking_id": picking_id,
                 "waybill_count": 0,
                 "selection_details": [],
                 "success": False,
                 "message": f"No waybills could be created from orders in picking ID {picking_id}. Check for missing product info or delivery details."
             }
-            
-        logger.info(f"Processing {len(waybills)} waybills for picking ID {picking_id}")
+
+        return waybills, None
+
+    def _evaluate_waybill(self, waybill: WaybillGroup, waybill_index: int, waybill_count: int) -> Optional[Dict[str, Any]]:
+        """
+        Decide the carrier for one waybill without writing anything
+
+        Args:
+            waybill: Waybill data from get_picking_waybills
+            waybill_index: 1-based position of the waybill in the picking
+            waybill_count: Number of waybills in the picking
+
+        Returns:
+            The evaluation (metrics, carrier selection, carrier to assign and reason),
+            or None if no carrier decision could be made for the waybill
+        """
+        # Skip waybills with no products
+        if not waybill.products:
+            logger.warning(f"Skipping waybill {waybill_index}/{waybill_count} - no products found")
+            return None
         
-        selection_details = []
-        successful_selections = 0
-        failed_selections = 0
+        customer_code = waybill.customer_code
+        logger.info(f"Processing waybill {waybill_index}/{waybill_count}, customer: '{customer_code}'")
         
-        for waybill_index, waybill in enumerate(waybills, 1):
-            # Skip waybills with no products
-            if not waybill.get("products") or len(waybill.get("products", [])) == 0:
-                logger.warning(f"Skipping waybill {waybill_index}/{len(waybills)} - no products found")
-                failed_selections += 1
-                continue
+        # Find previously used carrier for this waybill's destination for consistency
+        previous_carrier = self.find_previous_carrier_for_waybill(waybill)
+        if previous_carrier:
+            logger.info(f"Found previously used carrier '{previous_carrier}' for waybill destination")
+        else:
+            logger.info(f"No previous carrier found for waybill destination, checking customer history")
             
-            customer_code = waybill.get("customer_code", "")
-            logger.info(f"Processing waybill {waybill_index}/{len(waybills)}, customer: '{customer_code}'")
-            
-            # Find previously used carrier for this waybill's destination for consistency
-            previous_carrier = self.find_previous_carrier_for_waybill(waybill)
-            if previous_carrier:
-                logger.info(f"Found previously used carrier '{previous_carrier}' for waybill destination")
+        # Get area code from JIS code or postal code
+        jis_code = waybill.jis_code
+
+        if not jis_code and waybill.postal_code:
+            logger.info(f"Attempting to find JIS code from postal code '{waybill.postal_code}'")
+            jis_code = self.fee_calculator.get_postal_to_jis_mapping(waybill.postal_code)
+            if jis_code:
+                logger.info(f"Found JIS code '{jis_code}' for postal code '{waybill.postal_code}'")
+                waybill.jis_code = jis_code
             else:
-                logger.info(f"No previous carrier found for waybill destination, checking customer history")
-                
-            # Get area code from JIS code or postal code
-            jis_code = waybill.get("jis_code")
-
-            if not jis_code and waybill.get("postal_code"):
-                logger.info(f"Attempting to find JIS code from postal code '{waybill['postal_code']}'")
-                jis_code = self.fee_calculator.get_postal_to_jis_mapping(waybill["postal_code"])
-                if jis_code:
-                    logger.info(f"Found JIS code '{jis_code}' for postal code '{waybill['postal_code']}'")
-                    waybill["jis_code"] = jis_code
-                else:
-                    logger.warning(f"Failed to find JIS code for postal code '{waybill['postal_code']}'")
+                logger.warning(f"Failed to find JIS code for postal code '{waybill.postal_code}'")
+        
+        if not jis_code:
+            logger.warning(f"Could not determine JIS code for waybill {waybill_index}, customer: '{customer_code}'")
+            return None
             
-            if not jis_code:
-                logger.warning(f"Could not determine JIS code for waybill {waybill_index}, customer: '{customer_code}'")
-                failed_selections += 1
-                continue
-                
-            prefecture_code = jis_code[:2] if jis_code and len(jis_code) >= 2 else None
-            if not prefecture_code:
-                logger.warning(f"Could not extract prefecture code from JIS code '{jis_code}'")
-                failed_selections += 1
-                continue
-                
-            logger.info(f"Using prefecture code '{prefecture_code}' from JIS code '{jis_code}'")
+        prefecture_code = jis_code[:2] if jis_code and len(jis_code) >= 2 else None
+        if not prefecture_code:
+            logger.warning(f"Could not extract prefecture code from JIS code '{jis_code}'")
+            return None
             
-            try:
-                # Calculate package metrics using fee calculator service
-                logger.info(f"Calculating package metrics for waybill {waybill_index} with {len(waybill['products'])} products")
-                parcels, volume, weight, max_size, parcels_info = self.calculate_package_metrics(waybill["products"])
-                
-                # Skip if no valid parcels were calculated
-                if parcels == 0 or volume == 0 or weight == 0:
-                    logger.warning(f"Skipping waybill {waybill_index} - invalid package metrics: parcels={parcels}, volume={volume}, weight={weight}")
-                    failed_selections += 1
-                    continue
-                
-                # Convert values to float to avoid Decimal type issues
-                volume = self.to_float(volume)
-                weight = self.to_float(weight)
-                max_size = self.to_float(max_size)
-                
-                logger.info(f"Package metrics for waybill {waybill_index}: parcels={parcels}, volume={volume}, weight={weight}, size={max_size}")
-                
-                # Select optimal carrier using fee calculator service
-                logger.info(f"Selecting optimal carrier for waybill {waybill_index}")
-                carrier_selection = self.fee_calculator.select_optimal_carrier(
-                    jis_code=jis_code,
-                    parcels=parcels_info,
-                    volume=volume,
-                    weight=weight,
-                    size=max_size,
-                    shipping_date=waybill["shipping_date"],
-                    delivery_deadline=waybill["delivery_date"],
-                    previous_carrier=previous_carrier
-                )
-                
-                # Always check for the cheapest carrier, even if selection failed
-                cheapest_carrier = carrier_selection.get("cheapest_carrier")
-                
-                if not carrier_selection["success"]:
-                    logger.warning(f"Carrier selection failed for waybill {waybill_index}, customer: '{customer_code}', reason: {carrier_selection['message']}")
-                    
-                    # If we have a cheapest carrier but it doesn't meet our constraints,
-                    # we'll still create a waybill with the unassigned carrier code
-                    if cheapest_carrier:
-                        logger.info(f"Using fallback: Found cheapest carrier {cheapest_carrier['carrier_code']} but it doesn't meet constraints")
-                        
-                        # Create a waybill with unassigned carrier and log the selection
-                        # waybill_id = self.update_database(
-                        #     shipping_date=waybill["shipping_date"],
-                        #     delivery_deadline=waybill["delivery_date"],
-                        #     customer_code=customer_code,
-                        #     postal_code=waybill.get("dest_postal", ""),
-                        #     delivery_info1=waybill.get("delivery_info1", ""),
-                        #     delivery_info2=waybill.get("delivery_info2", ""),
-                        #     delivery_name1=waybill.get("dest_name1", ""),
-                        #     delivery_name2=waybill.get("dest_name2", ""),
-                        #     delivery_address1=waybill.get("dest_addr1", ""),
-                        #     delivery_address2=waybill.get("dest_addr2", ""),
-                        #     delivery_address3=waybill.get("dest_addr3", "")
-                        # )
-                        waybill_id = -1
-                        
-                        if not waybill_id:
-                            logger.warning(f"Failed to create waybill record for waybill {waybill_index}")
-                            failed_selections += 1
-                            continue
-                        
-                        # Build detailed reason message for logging
-                        reason_message = f"条件を満たす運送会社なし: 最安値 {cheapest_carrier['carrier_code']} (¥{cheapest_carrier['cost']}) が使用できません" 
-                        
-                        # Save selection to log with cheapest carrier information
-                        log_id = self.save_carrier_selection_log(
-                            waybill_id=waybill_id,
-                            parcel_count=int(parcels),
-                            volume=volume,
-                            weight=weight,
-                            size=max_size,
-                            selected_carrier=settings.CARRIER_UNASSIGNED_CODE,
-                            cheapest_carrier=cheapest_carrier['carrier_code'],
-                            reason=reason_message,
-                            products=waybill["products"]
-                        )
-                        
-                        if not log_id:
-                            logger.warning(f"Failed to save carrier selection log for waybill {waybill_index}")
-                            failed_selections += 1
-                            continue
-                        
-                        # Update SmileV database tables with unassigned carrier code
-                        smilev_update_success = self.update_smilev_database(
-                            waybill_id=waybill_id,
-                            carrier_code=settings.CARRIER_UNASSIGNED_CODE,
-                            order_ids=waybill["order_ids"],
-                            picking_works=waybill["picking_works"]
-                        )
-                        
-                        if not smilev_update_success:
-                            logger.warning(f"Failed to update SmileV database for waybill {waybill_index}")
-                            failed_selections += 1
-                            continue
-                        
-                        # Add to results
-                        selection_details.append({
-                            "waybill_id": waybill_id,
-                            "parcel_count": int(parcels),
-                            "volume": volume,
-                            "weight": weight,
-                            "size": max_size,
-                            "carrier_estimates": self._format_carrier_estimates(carrier_selection["carriers"]),
-                            "selected_carrier_code": settings.CARRIER_UNASSIGNED_CODE,
-                            "cheapest_carrier_code": cheapest_carrier['carrier_code'],
-                            "selection_reason": reason_message,
-                            "selected_carrier_name": "未割当",
-                            "is_unassigned": True
-                        })
-                        
-                        successful_selections += 1
-                        logger.info(f"Waybill {waybill_index} processed with unassigned carrier and cheapest carrier logged")
-                        continue
-                    else:
-                        failed_selections += 1
-                        continue
-                    
-                logger.info(f"Carrier selection successful for waybill {waybill_index}")
-                
-                # Find the absolute cheapest carrier regardless of capacity/lead time
-                absolute_cheapest_carrier = None
-                for carrier in carrier_selection["carriers"]:
-                    if absolute_cheapest_carrier is None or carrier["cost"] < absolute_cheapest_carrier["cost"]:
-                        absolute_cheapest_carrier = carrier
-                
-                # Selected carrier (one that meets all constraints)
-                selected_carrier = carrier_selection["selected_carrier"]
-                final_carrier_code = selected_carrier["carrier_code"]
-                
-                # Get cheapest carrier that meets capacity constraints
-                viable_cheapest_carrier = None
-                for carrier in carrier_selection["carriers"]:
-                    if carrier["is_capacity_available"]:
-                        if viable_cheapest_carrier is None or carrier["cost"] < viable_cheapest_carrier["cost"]:
-                            viable_cheapest_carrier = carrier
-                
-                # Initialize reason_message with default value
-                reason_message = f"{selected_carrier['carrier_name']}が最適な運送会社として選択されました"
-                
-                if not [c for c in carrier_selection["carriers"] if c.get("is_capacity_available", False)]:
-                    logger.info(f"No carriers with sufficient capacity/lead time, using unassigned code")
-                    final_carrier_code = settings.CARRIER_UNASSIGNED_CODE
-                
-                # Log the decision
-                logger.info(f"Final carrier selection: '{final_carrier_code}', reason: {reason_message}")
-                
-                # Set carrier code for database updates (must define before using below)
-                carrier_code_to_use = final_carrier_code
-                
-                # Create waybill record
-                logger.info(f"Creating waybill record for waybill group {waybill_index}")
-                waybill_id = self.update_database(
-                    shipping_date=waybill["shipping_date"],
-                    delivery_deadline=waybill["delivery_date"],
-                    customer_code=customer_code,
-                    postal_code=waybill["postal_code"],
-                    delivery_info1=waybill.get("delivery_info1", ""),
-                    delivery_info2=waybill.get("delivery_info2", ""),
-                    delivery_name1=waybill.get("delivery_name1", ""),
-                    delivery_name2=waybill.get("delivery_name2", ""),
-                    delivery_address1=waybill.get("delivery_address1", ""),
-                    delivery_address2=waybill.get("delivery_address2", ""),
-                    delivery_address3=waybill.get("delivery_address3", "")
-                )
-                
-                # Check if waybill creation failed
-                if not waybill_id:
-                    logger.warning(f"Failed to create waybill record for waybill {waybill_index}")
-                    failed_selections += 1
-                    continue
-                
-                # Save selection to log - always save the absolute cheapest carrier for reference
-                logger.info(f"Saving carrier selection log for waybill {waybill_index}")
-                log_id = self.save_carrier_selection_log(
-                    waybill_id=waybill_id,
-                    parcel_count=int(parcels),
-                    volume=volume,
-                    weight=weight,
-                    size=max_size,
-                    selected_carrier=carrier_code_to_use,
-                    cheapest_carrier=viable_cheapest_carrier["carrier_code"] if viable_cheapest_carrier else "",
-                    reason=reason_message,  # Use the detailed reason message
-                    products=waybill["products"]
-                )
-                
-                if not log_id:
-                    logger.warning(f"Failed to save carrier selection log for waybill {waybill_index}")
-                    failed_selections += 1
-                    continue
-                
-                # Update SmileV database tables with carrier selection - use the carrier_code_to_use
-                logger.info(f"Updating SmileV database tables for waybill {waybill_index}")
-                smilev_update_success = self.update_smilev_database(
-                    waybill_id=waybill_id,
-                    carrier_code=carrier_code_to_use,  # Use either selected or unassigned code
-                    order_ids=waybill["order_ids"],
-                    picking_works=waybill["picking_works"]
-                )
-                
-                if not smilev_update_success:
-                    logger.warning(f"Failed to update SmileV database for waybill {waybill_index}")
-                    failed_selections += 1
-                    continue
-                
-                # Add to results with both selected and cheapest carrier information
-                selection_details.append({
-                    "waybill_id": waybill_id,
-                    "parcel_count": int(parcels),
-                    "volume": volume,
-                    "weight": weight,
-                    "size": max_size,
-                    "carrier_estimates": self._format_carrier_estimates(carrier_selection["carriers"]),
-                    "selected_carrier_code": carrier_code_to_use,
-                    "cheapest_carrier_code": viable_cheapest_carrier["carrier_code"] if viable_cheapest_carrier else "",
-                    "selection_reason": reason_message,
-                    # Get the carrier name corresponding to the final_carrier_code
-                    "selected_carrier_name": "未割当" if carrier_code_to_use == settings.CARRIER_UNASSIGNED_CODE else 
-                        next((c["carrier_name"] for c in carrier_selection["carriers"] if c["carrier_code"] == carrier_code_to_use), "不明")
-                })
-                
-                successful_selections += 1
-                logger.info(f"Waybill {waybill_index} processed successfully")
-                
-            except Exception as e:
-                logger.error(f"Error processing waybill {waybill_index} for customer '{customer_code}': {str(e)}")
-                failed_selections += 1
-                continue
+        logger.info(f"Using prefecture code '{prefecture_code}' from JIS code '{jis_code}'")
         
-        logger.info(f"Carrier selection completed for picking ID {picking_id}: {successful_selections} successful, {failed_selections} failed")
+        # Calculate package metrics using fee calculator service
+        logger.info(f"Calculating package metrics for waybill {waybill_index} with {len(waybill.products)} products")
+        parcels, volume, weight, max_size, parcels_info = self.calculate_package_metrics(waybill.products)
         
-        return {
-            "picking_id": picking_id,
-            "waybill_count": len(waybills),
-            "selection_details": selection_details,
-            "success": successful_selections > 0,
-            "message": f"Carrier selection completed for {len(selection_details)} waybills"
+        # Skip if no valid parcels were calculated
+        if parcels == 0 or volume == 0 or weight == 0:
+            logger.warning(f"Skipping waybill {waybill_index} - invalid package metrics: parcels={parcels}, volume={volume}, weight={weight}")
+            return None
+        
+        # Convert values to float to avoid Decimal type issues
+        volume = self.to_float(volume)
+        weight = self.to_float(weight)
+        max_size = self.to_float(max_size)
+        
+        logger.info(f"Package metrics for waybill {waybill_index}: parcels={parcels}, volume={volume}, weight={weight}, size={max_size}")
+        
+        # Select optimal carrier using fee calculator service
+        logger.info(f"Selecting optimal carrier for waybill {waybill_index}")
+        carrier_selection = self.fee_calculator.select_optimal_carrier(
+            jis_code=jis_code,
+            parcels=parcels_info,
+            volume=volume,
+            weight=weight,
+            size=max_size,
+            shipping_date=waybill.shipping_date,
+            delivery_deadline=waybill.delivery_date,
+            previous_carrier=previous_carrier
+        )
+
+        evaluation = {
+            "parcel_count": int(parcels),
+            "volume": volume,
+            "weight": weight,
+            "size": max_size,
+            "carrier_selection": carrier_selection,
+            "previous_carrier": previous_carrier,
+            "is_unassigned": False
+        }
+        
+        # Always check for the cheapest carrier, even if selection failed
+        cheapest_carrier = carrier_selection.get("cheapest_carrier")
+        
+        if not carrier_selection["success"]:
+            logger.warning(f"Carrier selection failed for waybill {waybill_index}, customer: '{customer_code}', reason: {carrier_selection['message']}")
+            
+            # If we have a cheapest carrier but it doesn't meet our constraints,
+            # we'll still create a waybill with the unassigned carrier code
+            if not cheapest_carrier:
+                return None
+
+            logger.info(f"Using fallback: Found cheapest carrier {cheapest_carrier['carrier_code']} but it doesn't meet constraints")
+            evaluation.update({
+                "carrier_code": settings.CARRIER_UNASSIGNED_CODE,
+                "carrier_name": "未割当",
+                "cheapest_carrier_code": cheapest_carrier['carrier_code'],
+                # Build detailed reason message for logging
+                "reason": f"条件を満たす運送会社なし: 最安値 {cheapest_carrier['carrier_code']} (¥{cheapest_carrier['cost']}) が使用できません",
+                "is_unassigned": True
+            })
+            return evaluation
+            
+        logger.info(f"Carrier selection successful for waybill {waybill_index}")
+        
+        # Selected carrier (one that meets all constraints)
+        selected_carrier = carrier_selection["selected_carrier"]
+        final_carrier_code = selected_carrier["carrier_code"]
+        
+        # Get cheapest carrier that meets capacity constraints
+        viable_cheapest_carrier = None
+        for carrier in carrier_selection["carriers"]:
+            if carrier["is_capacity_available"]:
+                if viable_cheapest_carrier is None or carrier["cost"] < viable_cheapest_carrier["cost"]:
+                    viable_cheapest_carrier = carrier
+        
+        # Initialize reason_message with default value
+        reason_message = f"{selected_carrier['carrier_name']}が最適な運送会社として選択されました"
+        
+        if not [c for c in carrier_selection["carriers"] if c.get("is_capacity_available", False)]:
+            logger.info(f"No carriers with sufficient capacity/lead time, using unassigned code")
+            final_carrier_code = settings.CARRIER_UNASSIGNED_CODE
+        
+        # Log the decision
+        logger.info(f"Final carrier selection: '{final_carrier_code}', reason: {reason_message}")
+
+        evaluation.update({
+            "carrier_code": final_carrier_code,
+            # Get the carrier name corresponding to the final_carrier_code
+            "carrier_name": "未割当" if final_carrier_code == settings.CARRIER_UNASSIGNED_CODE else
+                next((c["carrier_name"] for c in carrier_selection["carriers"] if c["carrier_code"] == final_carrier_code), "不明"),
+            "cheapest_carrier_code": viable_cheapest_carrier["carrier_code"] if viable_cheapest_carrier else "",
+            "reason": reason_message
+        })
+        return evaluation
+
+    def _reserve_capacity(self, waybill: WaybillGroup, evaluation: Dict[str, Any], waybill_index: int,
+                          waybill_count: int) -> Tuple[Optional[Dict[str, Any]], Optional[CapacityReservation]]:
+        """
+        Reserve the selected carrier's capacity on the shipping date before committing
+
+        If another worker booked the remaining capacity since the evaluation, the
+        waybill is evaluated again, which then sees that usage.
+
+        Returns:
+            Tuple of (evaluation, reservation); the evaluation is None if no decision
+            could be made and the reservation is None if nothing had to be reserved
+        """
+        if self.capacity_ledger is None:
+            return evaluation, None
+
+        for attempt in range(MAX_RESERVATION_ATTEMPTS):
+            if evaluation is None or evaluation["carrier_code"] == settings.CARRIER_UNASSIGNED_CODE:
+                return evaluation, None
+
+            carrier_code = evaluation["carrier_code"]
+            reservation = self.capacity_ledger.try_reserve(
+                self.db, carrier_code, waybill.shipping_date, evaluation["volume"], evaluation["weight"],
+                self.fee_calculator.get_capacity_limits(carrier_code, waybill.shipping_date)
+            )
+            if reservation is not None:
+                return evaluation, reservation
+
+            logger.info(f"Capacity of carrier '{carrier_code}' was booked meanwhile, re-evaluating waybill {waybill_index}")
+            evaluation = self._evaluate_waybill(waybill, waybill_index, waybill_count)
+
+        logger.warning(f"Could not reserve carrier capacity for waybill {waybill_index} after {MAX_RESERVATION_ATTEMPTS} attempts")
+        return None, None
+
+    def _commit_waybill(self, waybill: WaybillGroup, evaluation: Dict[str, Any],
+                        waybill_index: int, reservation: Optional[CapacityReservation] = None) -> Optional[Dict[str, Any]]:
+        """
+        Write an evaluated carrier decision: waybill record, selection log and SmileV updates
+
+        A capacity reservation is confirmed once the selection log is saved, and
+        released if the waybill or its log could not be written.
+
+        Returns:
+            The selection detail, or None if one of the writes failed
+        """
+        try:
+            waybill_id, log_id = self._write_waybill_and_log(waybill, evaluation, waybill_index)
+            # The log is committed; usage seeded from now on includes it
+            logged_at = time.monotonic()
+        except Exception:
+            if reservation is not None:
+                self.capacity_ledger.release(reservation)
+            raise
+
+        if reservation is not None:
+            if log_id:
+                self.capacity_ledger.confirm(reservation, logged_at)
+            else:
+                self.capacity_ledger.release(reservation)
+
+        if not log_id:
+            return None
+        
+        # Update SmileV database tables with carrier selection - use the carrier_code_to_use
+        logger.info(f"Updating SmileV database tables for waybill {waybill_index}")
+        smilev_update_success = self.update_smilev_database(
+            waybill_id=waybill_id,
+            carrier_code=evaluation["carrier_code"],  # Use either selected or unassigned code
+            order_ids=waybill.order_ids,
+            work_keys=waybill.work_keys
+        )
+        
+        if not smilev_update_success:
+            logger.warning(f"Failed to update SmileV database for waybill {waybill_index}")
+            return None
+
+        return self._selection_detail(evaluation, waybill_id)
+
+    def _write_waybill_and_log(self, waybill: WaybillGroup, evaluation: Dict[str, Any],
+                               waybill_index: int) -> Tuple[Any, str]:
+        """
+        Create the waybill record and save the selection log
+
+        Returns:
+            Tuple of (waybill ID, log ID); the log ID is empty if one of the writes failed
+        """
+        carrier_code_to_use = evaluation["carrier_code"]
+
+        if evaluation["is_unassigned"]:
+            # Unassigned waybills don't get a waybill record of their own
+            waybill_id = -1
+        else:
+            # Create waybill record
+            logger.info(f"Creating waybill record for waybill group {waybill_index}")
+            waybill_id = self.update_database(
+                shipping_date=waybill.shipping_date,
+                delivery_deadline=waybill.delivery_date,
+                customer_code=waybill.customer_code,
+                postal_code=waybill.postal_code,
+                delivery_info1=waybill.delivery_info1,
+                delivery_info2=waybill.delivery_info2,
+                delivery_name1=waybill.dest_name1,
+                delivery_name2=waybill.dest_name2,
+                delivery_address1=waybill.dest_addr1,
+                delivery_address2=waybill.dest_addr2,
+                delivery_address3=waybill.dest_addr3
+            )
+        
+        # Check if waybill creation failed
+        if not waybill_id:
+            logger.warning(f"Failed to create waybill record for waybill {waybill_index}")
+            return waybill_id, ""
+        
+        # Save selection to log - always save the cheapest carrier for reference
+        logger.info(f"Saving carrier selection log for waybill {waybill_index}")
+        log_id = self.save_carrier_selection_log(
+            waybill_id=waybill_id,
+            parcel_count=evaluation["parcel_count"],
+            volume=evaluation["volume"],
+            weight=evaluation["weight"],
+            size=evaluation["size"],
+            selected_carrier=carrier_code_to_use,
+            cheapest_carrier=evaluation["cheapest_carrier_code"],
+            reason=evaluation["reason"],
+            products=waybill.products
+        )
+        
+        if not log_id:
+            logger.warning(f"Failed to save carrier selection log for waybill {waybill_index}")
+        return waybill_id, log_id
+
+    def _selection_detail(self, evaluation: Dict[str, Any], waybill_id: Optional[Any]) -> Dict[str, Any]:
+        """
+        Build the selection detail returned to the caller for an evaluated waybill
+        """
+        detail = {
+            "waybill_id": waybill_id,
+            "parcel_count": evaluation["parcel_count"],
+            "volume": evaluation["volume"],
+            "weight": evaluation["weight"],
+            "size": evaluation["size"],
+            "carrier_estimates": self._format_carrier_estimates(evaluation["carrier_selection"]["carriers"]),
+            "selected_carrier_code": evaluation["carrier_code"],
+            "cheapest_carrier_code": evaluation["cheapest_carrier_code"],
+            "selection_reason": evaluation["reason"],
+            "selected_carrier_name": evaluation["carrier_name"]
         }
+        if evaluation["is_unassigned"]:
+            detail["is_unassigned"] = True
+        return detail
 
-    def batch_select_carriers(self, picking_ids: List[int]) -> Dict[str, Any]:
+    def batch_select_carriers(self, picking_ids: List[int], include_timings: bool = False,
+                              dry_run: bool = False) -> Dict[str, Any]:
         """
         Process multiple pickings in batch
         
         Args:
             picking_ids: List of picking IDs
+            include_timings: Attach per-picking and aggregated stage timings
+            dry_run: Only evaluate the decisions, see select_carriers_for_picking
             
         Returns:
             Batch selection results
@@ -1004,7 +1134,7 @@ class CarrierSelectionService:
         failed_pickings = []
         
         for picking_id in picking_ids:
-            result = self.select_carriers_for_picking(picking_id)
+            result = self.select_carriers_for_picking(picking_id, include_timings=include_timings, dry_run=dry_run)
             results.append(result)
             
             if result["success"]:
@@ -1012,13 +1142,168 @@ class CarrierSelectionService:
             else:
                 failed_pickings.append(picking_id)
         
-        return {
+        response = {
             "results": results,
             "success": success_count > 0,
             "message": f"Processed {len(picking_ids)} pickings, {success_count} successful, {len(failed_pickings)} failed",
             "failed_pickings": failed_pickings
         }
 
+        if dry_run:
+            response["dry_run"] = True
+        if include_timings:
+            response["timings"] = merge_timings([result["timings"]["stages"] for result in results])
+
+        return response
+
+    def optimize_carriers(self, picking_ids: List[int], include_timings: bool = False,
+                          dry_run: bool = True) -> Dict[str, Any]:
+        """
+        Assign carriers to all waybills of a set of pickings at once
+        
+        Unlike batch_select_carriers, which picks the best carrier one waybill at
+        a time, the assignment minimizes the total fee of the whole wave subject
+        to the carriers' daily capacity, the delivery deadlines and a preference
+        for previously used carriers (see batch_optimizer.optimize_wave).
+        
+        Args:
+            picking_ids: List of picking IDs
+            include_timings: Attach stage timings for the whole wave
+            dry_run: Only return the assignment - no waybill, log or SmileV writes
+            
+        Returns:
+            Batch selection results with an "optimization" summary
+        """
+        results = []
+        wave = []
+        
+        # Evaluate every waybill of the wave (fees, lead times, previous carrier)
+        for picking_id in picking_ids:
+            waybills, failure = self._load_picking_waybills(picking_id, dry_run)
+            if failure is not None:
+                results.append(failure)
+                continue
+            
+            result = {
+                "picking_id": picking_id,
+                "waybill_count": len(waybills),
+                "selection_details": [],
+                "success": False
+            }
+            results.append(result)
+            for waybill_index, waybill in enumerate(waybills, 1):
+                try:
+                    evaluation = self._evaluate_waybill(waybill, waybill_index, len(waybills))
+                except Exception as e:
+                    logger.error(f"Error evaluating waybill {waybill_index} of picking ID {picking_id}: {str(e)}")
+                    evaluation = None
+                if evaluation is not None:
+                    wave.append((result, waybill, waybill_index, evaluation))
+        
+        # Solve the assignment over all evaluated waybills
+        with self.timer.span("optimization"):
+            items = []
+            capacities = {}
+            for result, waybill, waybill_index, evaluation in wave:
+                shipping_date = waybill.shipping_date
+                date_int = int(shipping_date.strftime("%Y%m%d"))
+                options = [
+                    (carrier["carrier_code"], self.to_float(carrier["cost"]))
+                    for carrier in evaluation["carrier_selection"].get("carriers", [])
+                    if carrier["meets_deadline"]
+                ]
+                for carrier_code, cost in options:
+                    if (carrier_code, date_int) not in capacities:
+                        used_volume, used_weight = (0.0, 0.0) if self.capacity_ledger is None else \
+                            self.capacity_ledger.usage(self.db, carrier_code, shipping_date)
+                        capacities[(carrier_code, date_int)] = remaining_capacity(
+                            self.fee_calculator.get_capacity_limits(carrier_code, shipping_date),
+                            used_volume, used_weight
+                        )
+                items.append(WaveItem(
+                    key=(result["picking_id"], waybill_index),
+                    volume=evaluation["volume"],
+                    weight=evaluation["weight"],
+                    date_int=date_int,
+                    options=options,
+                    previous_carrier=evaluation["previous_carrier"]
+                ))
+            solution = optimize_wave(items, capacities)
+        
+        # Apply (or only report) the assignment
+        for (result, waybill, waybill_index, evaluation), carrier_code in zip(wave, solution.assignments):
+            self._apply_wave_assignment(evaluation, carrier_code)
+            try:
+                if dry_run:
+                    detail = self._selection_detail(evaluation, waybill_id=None)
+                else:
+                    evaluation, reservation = self._reserve_capacity(waybill, evaluation, waybill_index, result["waybill_count"])
+                    detail = None if evaluation is None else \
+                        self._commit_waybill(waybill, evaluation, waybill_index, reservation)
+            except Exception as e:
+                logger.error(f"Error committing waybill {waybill_index} of picking ID {result['picking_id']}: {str(e)}")
+                detail = None
+            if detail is not None:
+                result["selection_details"].append(detail)
+        
+        success_count = 0
+        failed_pickings = []
+        for result in results:
+            if "message" not in result:
+                result["success"] = len(result["selection_details"]) > 0
+                result["message"] = f"Carrier assignment {'optimized' if dry_run else 'committed'} for {len(result['selection_details'])} waybills"
+                if dry_run:
+                    result["dry_run"] = True
+                else:
+                    selection_plan_cache.discard(result["picking_id"])
+            if result["success"]:
+                success_count += 1
+            else:
+                failed_pickings.append(result["picking_id"])
+        
+        metrics_registry.increment("pickings_processed_total", len(picking_ids))
+        metrics_registry.increment("waybills_processed_total", len(wave))
+        
+        response = {
+            "results": results,
+            "success": success_count > 0,
+            "message": f"Optimized {len(wave)} waybills of {len(picking_ids)} pickings, {success_count} successful, {len(failed_pickings)} failed",
+            "failed_pickings": failed_pickings,
+            "optimization": solution.as_dict()
+        }
+        if dry_run:
+            response["dry_run"] = True
+        if include_timings:
+            response["timings"] = self.timer.as_dict()
+        return response
+
+    def _apply_wave_assignment(self, evaluation: Dict[str, Any], carrier_code: Optional[str]) -> None:
+        """
+        Replace the per-waybill decision of an evaluation with the wave assignment
+        """
+        carriers = evaluation["carrier_selection"].get("carriers", [])
+        viable = [carrier for carrier in carriers if carrier["meets_deadline"]]
+        cheapest = min(viable or carriers, key=lambda carrier: carrier["cost"], default=None)
+        
+        if carrier_code is None:
+            evaluation.update({
+                "carrier_code": settings.CARRIER_UNASSIGNED_CODE,
+                "carrier_name": "未割当",
+                "cheapest_carrier_code": cheapest["carrier_code"] if cheapest else "",
+                "reason": "一括最適化: 条件を満たす運送会社なし",
+                "is_unassigned": True
+            })
+            return
+        
+        carrier = next(carrier for carrier in carriers if carrier["carrier_code"] == carrier_code)
+        evaluation.update({
+            "carrier_code": carrier_code,
+            "carrier_name": carrier["carrier_name"],
+            "cheapest_carrier_code": cheapest["carrier_code"] if cheapest else "",
+            "reason": f"{carrier['carrier_name']}が一括最適化で選択されました",
+            "is_unassigned": False
+        })
+
     def to_float(self, value: Any) -> float:
         """
         Safely convert any numeric value (including Decimal) to float
@@ -1059,7 +1344,7 @@ class CarrierSelectionService:
             logger.warning(f"Failed to convert value '{value}' to integer, using 0 instead")
             return 0
 
-    def _convert_dimensions_to_float(self, dimensions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _convert_dimensions_to_float(self, dimensions: List[Dict[str, Any]]) -> Tuple[BoxDimensions, ...]:
         """
         Convert dimensions from Decimal to float
         
@@ -1067,13 +1352,12 @@ class CarrierSelectionService:
             dimensions: List of dimension dictionaries
             
         Returns:
-            Converted list of dimension dictionaries
+            Tuple of (length, width, height) per box
         """
-        converted_dimensions = []
-        for dim in dimensions:
-            converted_dim = {k: self.to_float(v) for k, v in dim.items()}
-            converted_dimensions.append(converted_dim)
-        return converted_dimensions
+        return tuple(
+            (self.to_float(dim.get("length", 0)), self.to_float(dim.get("width", 0)), self.to_float(dim.get("height", 0)))
+            for dim in dimensions
+        )
 
     def _format_carrier_estimates(self, carriers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -1087,14 +1371,7 @@ class CarrierSelectionService:
         """
         formatted_carriers = []
         for carrier in carriers:
-            # Calculate parcel_count if parcels is a list of dictionaries
-            parcel_count = 0
-            if "parcels" in carrier and isinstance(carrier["parcels"], list):
-                for parcel in carrier["parcels"]:
-                    if isinstance(parcel, dict) and "count" in parcel:
-                        parcel_count += self.to_int(parcel["count"])
-            elif "parcel_count" in carrier:
-                parcel_count = self.to_int(carrier["parcel_count"])
+            parcel_count = self.to_int(carrier.get("parcel_count", 0))
             
             # For is_capacity_available, consider both general capacity and special capacity if available
             is_capacity_available = carrier.get("is_capacity_available", False)
@@ -1115,31 +1392,74 @@ class CarrierSelectionService:
         return formatted_carriers
 
 
-def select_carriers_for_picking(db: Session, picking_id: int) -> Dict[str, Any]:
+def select_carriers_for_picking(db: Session, picking_id: int, include_timings: bool = False) -> Dict[str, Any]:
     """
     Select optimal carriers for all waybills in a picking
     
     Args:
         db: Database session
         picking_id: Picking ID
+        include_timings: Attach per-stage timings to the result
         
     Returns:
         Selection results
     """
-    service = CarrierSelectionService(db)
-    return service.select_carriers_for_picking(picking_id)
+    service = CarrierSelectionService(db, master_data=master_data_cache, memo=selection_memo,
+                                      capacity_ledger=capacity_ledger, postal_resolver=postal_code_resolver)
+    return service.select_carriers_for_picking(picking_id, include_timings=include_timings)
 
 
-def batch_select_carriers(db: Session, picking_ids: List[int]) -> Dict[str, Any]:
+def batch_select_carriers(db: Session, picking_ids: List[int], include_timings: bool = False) -> Dict[str, Any]:
     """
     Process multiple pickings in batch
     
     Args:
         db: Database session
         picking_ids: List of picking IDs
+        include_timings: Attach per-stage timings to the results
         
     Returns:
         Batch selection results
     """
-    service = CarrierSelectionService(db)
-    return service.batch_select_carriers(picking_ids) 
\ No newline at end of file
+    service = CarrierSelectionService(db, master_data=master_data_cache, memo=selection_memo,
+                                      capacity_ledger=capacity_ledger, postal_resolver=postal_code_resolver)
+    return service.batch_select_carriers(picking_ids, include_timings=include_timings)
+
+
+def simulate_carrier_selection(db: Session, picking_ids: List[int], include_timings: bool = False) -> Dict[str, Any]:
+    """
+    Preview carrier selection for multiple pickings without writing anything
+
+    Master data is served from the shared cache, and the waybill groupings are
+    kept so that committing the same pickings afterwards reuses them.
+    
+    Args:
+        db: Database session
+        picking_ids: List of picking IDs
+        include_timings: Attach per-stage timings to the results
+        
+    Returns:
+        Batch selection results with the decisions that would be made
+    """
+    service = CarrierSelectionService(db, master_data=master_data_cache, memo=selection_memo,
+                                      capacity_ledger=capacity_ledger, postal_resolver=postal_code_resolver)
+    return service.batch_select_carriers(picking_ids, include_timings=include_timings, dry_run=True)
+
+
+def optimize_carrier_selection(db: Session, picking_ids: List[int], include_timings: bool = False,
+                               dry_run: bool = True) -> Dict[str, Any]:
+    """
+    Assign carriers to all waybills of a set of pickings at minimum total fee
+    
+    Args:
+        db: Database session
+        picking_ids: List of picking IDs
+        include_timings: Attach stage timings for the whole wave
+        dry_run: Only return the assignment without writing it
+        
+    Returns:
+        Batch selection results with an "optimization" summary
+    """
+    service = CarrierSelectionService(db, master_data=master_data_cache, memo=selection_memo,
+                                      capacity_ledger=capacity_ledger, postal_resolver=postal_code_resolver)
+    return service.optimize_carriers(picking_ids, include_timings=include_timings, dry_run=dry_run)
@@ -5,17 +5,15 @@ import math
 import logging
 from decimal import Decimal
 
-from app.models.product_master import ProductMaster
-from app.models.product_sub_master import ProductSubMaster
-from app.models.holiday_calendar_master import HolidayCalendarMaster
-from app.models.special_lead_time_master import SpecialLeadTimeMaster
-from app.models.transportation_company_master import TransportationCompanyMaster
-from app.models.transportation_company_sub_master import TransportationCompanySubMaster
-from app.models.transportation_area_jis import TransportationAreaJISMapping
-from app.models.transportation_fee import TransportationFee
-from app.models.transportation_capacity import TransportationCapacity
-from app.models.postal_jis_mapping import PostalJISMapping
-from app.models.special_capacity import SpecialCapacity
+from app.core.metrics import StageTimer, timed
+from app.db import statements
+from app.db.records import PRODUCT_BOX_COUNT, product_box_columns
+from app.services.master_data_cache import MasterDataCache, MasterDataSnapshot
+from app.services.selection_memo import SelectionMemo, shipment_fingerprint
+from app.services.capacity_ledger import CapacityLedger, CapacityLimit
+from app.services.postal_code_resolver import PostalCodeResolver, normalize_postal_code
+from app.services.fee_tiers import PER_PARCEL_FEE_TYPE, ParcelHistogram, Parcels, SizeTierTable, parcel_size_histogram
+from app.services.waybill_group import ProductLine
 
 # Setup logger
 logger = logging.getLogger(__name__)
@@ -23,34 +21,76 @@ logger = logging.getLogger(__name__)
 # Constants
 VOLUME_CUBE_SIZE = 30.3  # cm (1 volume unit = 30.3cm cube)
 VOLUME_TO_WEIGHT_RATIO = 8  # 1 volume (30.3cm cube) = 8kg
-MAX_SET_PARCEL_COUNT = 5  # Maximum supported set parcel count
+MAX_SET_PARCEL_COUNT = PRODUCT_BOX_COUNT  # Maximum supported set parcel count
 
 
 class FeeCalculationService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, timer: Optional[StageTimer] = None,
+                 master_data: Optional[MasterDataCache] = None,
+                 memo: Optional[SelectionMemo] = None,
+                 capacity_ledger: Optional[CapacityLedger] = None,
+                 postal_resolver: Optional[PostalCodeResolver] = None):
         self.db = db
+        self.timer = timer or StageTimer()
+        # When set, master table lookups are served from the cached snapshot
+        self.master_data = master_data
+        # Carrier evaluations shared between identical shipments (needs master_data)
+        self.memo = memo
+        # When set, capacity is checked against the day's cumulative usage
+        self.capacity_ledger = capacity_ledger
+        # When set, postal codes missing from the mapping table are asked of the postal code API
+        self.postal_resolver = postal_resolver
+
+    def _master_snapshot(self) -> Optional[MasterDataSnapshot]:
+        if self.master_data is None:
+            return None
+        return self.master_data.snapshot(self.db)
     
+    @timed("postal_lookup")
     def get_postal_to_jis_mapping(self, postal_code: str) -> Optional[str]:
         """
         Get JIS code from postal code
         """
         if not postal_code:
             return None
-            
+
+        snapshot = self._master_snapshot()
+        if snapshot is not None:
+            # Unresolved postal codes may be a failed lookup, so they are asked again
+            return snapshot.lookup("postal_jis", postal_code, lambda: self._resolve_postal_to_jis(postal_code),
+                                   remember_misses=False)
+        return self._resolve_postal_to_jis(postal_code)
+
+    def prefetch_postal_codes(self, postal_codes: List[str]) -> None:
+        """
+        Resolve a picking's postal codes together, so that the ones missing
+        from the mapping table are asked of the API concurrently
+        """
+        if self.postal_resolver is None or not postal_codes:
+            return
+        resolved = self.postal_resolver.resolve_many(postal_codes, self.db)
+        snapshot = self._master_snapshot()
+        if snapshot is not None:
+            # Failed lookups are left to get_postal_to_jis_mapping to retry
+            snapshot.preload("postal_jis", [
+                (postal_code, resolved[normalize_postal_code(postal_code)]) for postal_code in postal_codes
+                if resolved.get(normalize_postal_code(postal_code)) is not None
+            ])
+
+    def _resolve_postal_to_jis(self, postal_code: str) -> Optional[str]:
+        if self.postal_resolver is not None:
+            return self.postal_resolver.resolve(postal_code, self.db)
+        return self._query_postal_to_jis(postal_code)
+
+    def _query_postal_to_jis(self, postal_code: str) -> Optional[str]:
         try:
-            mapping = self.db.query(PostalJISMapping).filter(
-                PostalJISMapping.HANMA45002 == postal_code
-            ).first()
-            
-            if mapping:
-                return mapping.HANMA45001
-            
-            return None
+            return statements.postal_to_jis(self.db, postal_code)
             
         except Exception as e:
             logger.error(f"Error fetching JIS code for postal code {postal_code}: {str(e)}")
             return None
 
+    @timed("area_lookup")
     def get_area_codes_from_jis(self, jis_code: str) -> List[int]:
         """
         Get all transportation area codes associated with a JIS address code
@@ -69,17 +109,21 @@ class FeeCalculationService:
             return []
             
         try:
-            # Query all mappings for this JIS code
-            mappings = self.db.query(TransportationAreaJISMapping).filter(
-                TransportationAreaJISMapping.HANMA44002 == jis_code
-            ).all()
+            snapshot = self._master_snapshot()
+            if snapshot is not None:
+                # Served from the in-memory JIS -> area index
+                area_codes = list(snapshot.get_area_codes(jis_code))
+                if not area_codes:
+                    logger.warning(f"Could not find transportation areas for JIS code {jis_code}")
+                return area_codes
+            else:
+                # Query all mappings for this JIS code
+                area_codes = statements.area_codes(self.db, jis_code)
             
-            if not mappings:
+            if not area_codes:
                 logger.warning(f"Could not find transportation areas for JIS code {jis_code}")
                 return []
             
-            # Extract all area codes
-            area_codes = [mapping.HANMA44001 for mapping in mappings]
             logger.info(f"Found {len(area_codes)} area codes for JIS code {jis_code}: {area_codes}")
             return area_codes
             
@@ -101,6 +145,7 @@ class FeeCalculationService:
             return value.strip()
         return value
 
+    @timed("product_lookup")
     def get_product_info(self, product_code: int) -> Optional[Dict[str, Any]]:
         """
         Get product information from product master and product sub master tables
@@ -118,38 +163,35 @@ class FeeCalculationService:
             product_code = product_code.strip()
             if product_code != original_product_code:
                 logger.info(f"Trimmed product code from '{original_product_code}' to '{product_code}'")
-            
+
+        snapshot = self._master_snapshot()
+        if snapshot is not None:
+            return snapshot.lookup("products", product_code, lambda: self._query_product_info(product_code))
+        return self._query_product_info(product_code)
+
+    def _query_product_info(self, product_code: Any) -> Optional[Dict[str, Any]]:
         # Query both product master and product sub master
-        product = self.db.query(
-            ProductMaster, ProductSubMaster
-        ).join(
-            ProductSubMaster, 
-            ProductMaster.HANM003001 == ProductSubMaster.HANMA33001
-        ).filter(
-            ProductMaster.HANM003001 == product_code,
-            ProductSubMaster.HANMA33001 == product_code
-        ).first()
+        product = statements.product_info(self.db, product_code)
         
         if not product:
             logger.warning(f"Product with code '{product_code}' not found in database")
             return None
         
-        product_master, product_sub = product
         # Extract product information based on the requirements
         result = {
             "product_code": self.trim_string(product_code),
-            "product_name": self.trim_string(product_master.HANM003002 or ""),
-            "unit": self.trim_string(product_master.HANM003004 or ""),
+            "product_name": self.trim_string(product.HANM003002 or ""),
+            "unit": self.trim_string(product.HANM003004 or ""),
             # 入数（外箱）- Outer box capacity
-            "outer_box_count": int(product_master.HANM003K008 or 1),
+            "outer_box_count": int(product.HANM003K008 or 1),
             # 入数（内箱）- Inner box capacity 
-            "inner_box_count": int(product_master.HANM003K007 or 1),
+            "inner_box_count": int(product.HANM003K007 or 1),
             # セット個口数量 - Set parcel count
-            "set_parcel_count": int(product_master.HANM003A005 or 1),
+            "set_parcel_count": int(product.HANM003A005 or 1),
             # 梱包重量(g) - Packaging weight in grams
-            "weight_per_unit": float(product_master.HANM003A007 or 0) / 1000.0,  # Convert g to kg
+            "weight_per_unit": (product.HANM003A007 or 0) / 1000.0,  # Convert g to kg
             # 才数 - Volume in units
-            "volume_per_unit": float(product_master.HANM003A107 or 0),
+            "volume_per_unit": float(product.HANM003A107 or 0),
             # Outer box dimensions
             "outer_box_dimensions": []
         }
@@ -164,20 +206,13 @@ class FeeCalculationService:
         
         # Get dimensions for all box sets
         for box_num in range(1, max_boxes + 1):
-            # Get base attribute names for this box
-            width_attr = f"HANMA330{21 + (box_num - 1) * 4}"
-            depth_attr = f"HANMA330{22 + (box_num - 1) * 4}"
-            height_attr = f"HANMA330{23 + (box_num - 1) * 4}"
-            
-            # Get values if attributes exist
-            width = getattr(product_sub, width_attr, 0) if hasattr(product_sub, width_attr) else 0
-            depth = getattr(product_sub, depth_attr, 0) if hasattr(product_sub, depth_attr) else 0
-            height = getattr(product_sub, height_attr, 0) if hasattr(product_sub, height_attr) else 0
+            # Each box has W, D, H, gross weight and packing form (5 columns from HANMA33022)
+            width_attr, depth_attr, height_attr = product_box_columns(box_num)
             
             # Convert from mm to cm by dividing by 10
-            width = float(width or 0) / 10
-            depth = float(depth or 0) / 10
-            height = float(height or 0) / 10
+            width = (getattr(product, width_attr) or 0) / 10
+            depth = (getattr(product, depth_attr) or 0) / 10
+            height = (getattr(product, height_attr) or 0) / 10
             
             # Add dimensions for this box
             result["outer_box_dimensions"].append({
@@ -213,19 +248,20 @@ class FeeCalculationService:
         
         return volume_units
 
-    def calculate_package_metrics(self, products: List[Dict[str, Any]]) -> Tuple[int, float, float, float, List[Dict[str, Any]]]:
+    @timed("package_metrics")
+    def calculate_package_metrics(self, products: List[ProductLine]) -> Tuple[int, float, float, float, ParcelHistogram]:
         """
         Calculate package metrics based on products using the new requirements
         
         Args:
-            products: List of products to ship, containing product_code and quantity
+            products: Product lines to ship; only their product_code and quantity are used
             
         Returns:
-            Tuple containing (parcel_count, volume, weight, max_size, parcels_info)
+            Tuple containing (parcel_count, volume, weight, max_size, parcel size histogram)
         """
         if not products:
             logger.warning("Empty products list provided to calculate_package_metrics")
-            return 0, 0.0, 0.0, 0.0, []
+            return 0, 0.0, 0.0, 0.0, ()
             
         logger.info(f"Starting package metrics calculation for {len(products)} products")
         
@@ -233,12 +269,12 @@ class FeeCalculationService:
         total_volume = 0.0
         total_weight = 0.0
         max_size = 0.0
-        parcels_info = []
+        parcel_counts: Dict[float, int] = {}
         
-        for product_info in products:
-            product_code = product_info["product_code"]
+        for product_line in products:
+            product_code = product_line.product_code
             # Ensure quantity is a float to avoid Decimal multiplication issues
-            quantity = self.to_float(product_info["quantity"])
+            quantity = self.to_float(product_line.quantity)
             
             # Ensure product code is trimmed
             if isinstance(product_code, str):
@@ -368,10 +404,7 @@ class FeeCalculationService:
                 
             max_size = max(max_size, max_product_size)
             
-            parcels_info.append({
-                "size": max_product_size,
-                "count": product_parcels
-            })
+            parcel_counts[max_product_size] = parcel_counts.get(max_product_size, 0) + product_parcels
             
             logger.info(f"Product '{product_code}' size: {max_product_size} cm")
         
@@ -384,20 +417,23 @@ class FeeCalculationService:
         logger.info(f"Final package metrics: parcels={total_parcels}, volume={total_volume}, "
                    f"weight={total_weight}, max_size={max_size}")
                    
-        return total_parcels, total_volume, total_weight, max_size, parcels_info
+        return total_parcels, total_volume, total_weight, max_size, tuple(sorted(parcel_counts.items()))
 
+    @timed("fee_evaluation")
     def calculate_shipping_fee(self, carrier_code: str, area_code: int, 
-                             parcels: List[Dict], volume: float, weight: float, size: float = 0) -> Optional[float]:
+                             parcels: Parcels, volume: float, weight: float, size: float = 0,
+                             histogram: Optional[ParcelHistogram] = None) -> Optional[float]:
         """
         Calculate shipping fee based on carrier, area, and package metrics
         
         Args:
             carrier_code: Transportation company code
             area_code: Transportation area code
-            parcels: List of parcels with size and count
+            parcels: Parcels with size and count, or their size histogram
             volume: Total volume in volume units
             weight: Total weight in kg
             size: Maximum size (sum of three sides) in cm
+            histogram: Parcel size histogram of ``parcels``, if already computed
             
         Returns:
             Total shipping fee or None if not applicable
@@ -411,10 +447,11 @@ class FeeCalculationService:
                    f"parcels={len(parcels)}, volume={volume}, weight={weight}, size={size}")
                    
         # Get transportation fee records for this carrier and area
-        fee_records = self.db.query(TransportationFee).filter(
-            TransportationFee.HANMA46002 == carrier_code,
-            TransportationFee.HANMA46003 == str(area_code)
-        ).all()
+        snapshot = self._master_snapshot()
+        if snapshot is not None:
+            fee_records = snapshot.get_fee_records(carrier_code, area_code)
+        else:
+            fee_records = statements.fee_records(self.db, carrier_code, area_code)
 
         if not fee_records:
             logger.warning(f"No transportation fee records found for carrier '{carrier_code}' and area {area_code}")
@@ -482,23 +519,20 @@ class FeeCalculationService:
                 total_fee = base_fee
                 logger.info(f"Fee type 2 (Volume-based, no unit price): {total_fee}")
         
-        elif fee_type == 3:
-            # Type 3: Per parcel - calculate separately for each individual parcel
-            # Group parcels by size for individual fee calculation
-            parcels_by_size = {}
-            for parcel in parcels:
-                parcel_size = self.to_float(parcel.get("size", size))
-                parcel_count = self.to_int(parcel.get("count", 1))
-                
-                if parcel_size not in parcels_by_size:
-                    parcels_by_size[parcel_size] = 0
-                parcels_by_size[parcel_size] += parcel_count
+        elif fee_type == PER_PARCEL_FEE_TYPE:
+            # Type 3: Per parcel - each parcel is charged at its own size tier
+            if snapshot is not None:
+                tiers = snapshot.get_fee_tiers(carrier_code, area_code)
+            else:
+                tiers = SizeTierTable(fee_records)
+            if histogram is None:
+                histogram = parcel_size_histogram(parcels, size)
             
-            # Calculate fee for each parcel size
-            for parcel_size, total_count in parcels_by_size.items():
-                parcel_fee = base_fee * total_count
-                total_fee += parcel_fee
-                logger.info(f"Fee type 3 (Per parcel): size={parcel_size}, count={total_count}, fee={parcel_fee}")
+            tier_fee = tiers.price(histogram, volume, weight)
+            if tier_fee is None:
+                return None
+            total_fee = tier_fee
+            logger.info(f"Fee type 3 (Per parcel): parcels by size={histogram}, total={total_fee}")
         
         else:
             # Unknown fee type, use base fee
@@ -512,6 +546,7 @@ class FeeCalculationService:
         logger.info(f"Final shipping fee: {total_fee}")
         return total_fee
 
+    @timed("capacity_check")
     def check_carrier_capacity(self, carrier_code: str, volume: float, weight: float) -> bool:
         """
         Check if carrier has sufficient capacity for the shipment
@@ -531,9 +566,11 @@ class FeeCalculationService:
         logger.info(f"Checking carrier capacity: carrier='{carrier_code}', volume={volume}, weight={weight}")
         
         # Query capacity constraints for this carrier
-        capacity = self.db.query(TransportationCapacity).filter(
-            TransportationCapacity.HANMA47001 == carrier_code
-        ).first()
+        snapshot = self._master_snapshot()
+        if snapshot is not None:
+            capacity = snapshot.get_capacity(carrier_code)
+        else:
+            capacity = statements.capacity(self.db, carrier_code)
         
         # If no capacity constraints found, assume UNLIMITED capacity
         if not capacity:
@@ -571,6 +608,7 @@ class FeeCalculationService:
         logger.info(f"Carrier '{carrier_code}' has sufficient capacity for volume={volume}, weight={weight}")
         return True
 
+    @timed("capacity_check")
     def check_special_capacity(self, carrier_code: str, shipping_date: date, volume: float, weight: float) -> bool:
         """
         Check if carrier has special capacity limitations for the shipping date
@@ -594,10 +632,11 @@ class FeeCalculationService:
         logger.info(f"Checking special capacity: carrier='{carrier_code}', date={shipping_date_int}, volume={volume}, weight={weight}")
         
         # Query special capacity record
-        special_capacity = self.db.query(SpecialCapacity).filter(
-            SpecialCapacity.HANMA48001 == carrier_code,
-            SpecialCapacity.HANMA48002 == shipping_date_int
-        ).first()
+        snapshot = self._master_snapshot()
+        if snapshot is not None:
+            special_capacity = snapshot.get_special_capacity(carrier_code, shipping_date_int)
+        else:
+            special_capacity = statements.special_capacity(self.db, carrier_code, shipping_date_int)
         
         # If no special capacity record exists, assume UNLIMITED capacity
         if not special_capacity:
@@ -626,6 +665,43 @@ class FeeCalculationService:
         logger.info(f"Carrier '{carrier_code}' has sufficient special capacity for volume={volume}, weight={weight}")
         return True
 
+    def get_capacity_limits(self, carrier_code: str, shipping_date: date) -> List[CapacityLimit]:
+        """
+        Daily capacity limits of a carrier (HAN99MA47UNSOCAPA and HAN99MA48UNSOTOKUCAPA)
+        
+        Args:
+            carrier_code: Transportation company code
+            shipping_date: Shipping date
+            
+        Returns:
+            List of (max volume, max weight, volume to weight ratio); empty if unlimited
+        """
+        shipping_date_int = int(shipping_date.strftime('%Y%m%d'))
+        
+        snapshot = self._master_snapshot()
+        if snapshot is not None:
+            capacity = snapshot.get_capacity(carrier_code)
+            special_capacity = snapshot.get_special_capacity(carrier_code, shipping_date_int)
+        else:
+            capacity = statements.capacity(self.db, carrier_code)
+            special_capacity = statements.special_capacity(self.db, carrier_code, shipping_date_int)
+        
+        limits = []
+        if capacity:
+            limits.append((
+                self.to_float(capacity.HANMA47002),
+                self.to_float(capacity.HANMA47003),
+                self.to_float(capacity.HANMA47004)
+            ))
+        if special_capacity:
+            limits.append((
+                self.to_float(special_capacity.HANMA48003),
+                self.to_float(special_capacity.HANMA48004),
+                0.0
+            ))
+        # Limits with neither volume nor weight defined are unlimited
+        return [limit for limit in limits if limit[0] > 0 or limit[1] > 0]
+
     def is_holiday(self, check_date: date) -> bool:
         """
         Check if a date is a holiday
@@ -639,11 +715,13 @@ class FeeCalculationService:
         try:
             # Format the date as expected by the database (YYYYMMDD)
             date_int = int(check_date.strftime("%Y%m%d"))
+
+            snapshot = self._master_snapshot()
+            if snapshot is not None:
+                return snapshot.is_holiday(date_int)
             
             # Check if the date exists in the holiday calendar
-            holiday = self.db.query(HolidayCalendarMaster).filter(
-                HolidayCalendarMaster.HANMA04002 == date_int
-            ).first()
+            holiday = statements.holiday(self.db, date_int)
             
             return holiday is not None
         except Exception as e:
@@ -695,11 +773,11 @@ class FeeCalculationService:
         
         # 2. Check for special lead time
         shipping_date_int = int(shipping_date.strftime('%Y%m%d'))
-        special_lead_time = self.db.query(SpecialLeadTimeMaster).filter(
-            SpecialLeadTimeMaster.HANMA41001 == carrier_code,
-            SpecialLeadTimeMaster.HANMA41002 == prefecture_code,
-            SpecialLeadTimeMaster.HANMA41003 == shipping_date_int
-        ).first()
+        snapshot = self._master_snapshot()
+        if snapshot is not None:
+            special_lead_time = snapshot.get_special_lead_time(carrier_code, prefecture_code, shipping_date_int)
+        else:
+            special_lead_time = statements.special_lead_time(self.db, carrier_code, prefecture_code, shipping_date_int)
         
         if special_lead_time:
             # Get delivery date from special lead time record
@@ -715,9 +793,10 @@ class FeeCalculationService:
         
         # 3. Calculate standard lead time
         # Get the carrier's standard lead time from the sub master
-        carrier_sub = self.db.query(TransportationCompanySubMaster).filter(
-            TransportationCompanySubMaster.HANMA03001 == carrier_code
-        ).first()
+        if snapshot is not None:
+            carrier_sub = snapshot.get_lead_time(carrier_code)
+        else:
+            carrier_sub = statements.carrier_sub(self.db, carrier_code)
         
         if not carrier_sub:
             logger.warning(f"Carrier sub master record not found for carrier {carrier_code}")
@@ -759,9 +838,10 @@ class FeeCalculationService:
         estimated_delivery = shipping_date + timedelta(days=lead_time)
         return estimated_delivery <= deadline_date
     
+    @timed("carrier_selection")
     def select_optimal_carrier(self, 
                               jis_code: str,
-                              parcels: List[Dict], 
+                              parcels: Parcels, 
                               volume: float, 
                               weight: float, 
                               size: float,
@@ -773,7 +853,7 @@ class FeeCalculationService:
         
         Args:
             jis_code: The JIS code for the delivery area
-            parcels: List of parcel information containing count, size, and other metrics
+            parcels: Parcels with size and count, or their size histogram
             volume: The total volume
             weight: The total weight
             size: The max size (sum of dimensions)
@@ -785,270 +865,314 @@ class FeeCalculationService:
             Selection results containing carrier, fee, and reason
         """
         try:
-            # Get all available carriers
-            carriers = self.get_available_carriers()
-            
-            if not carriers:
-                return {
-                    "success": False,
-                    "message": "利用可能な運送会社がありません",
-                    "carriers": []
-                }
-            
-            # Get area codes from JIS code (multiple area codes may be associated with one JIS code)
-            area_codes = self.get_area_codes_from_jis(jis_code)
-            if not area_codes:
-                return {
-                    "success": False,
-                    "message": f"JISコード {jis_code} に対応する配送エリアが見つかりません",
-                    "carriers": []
-                }
-            
-            # Calculate metrics for each carrier
-            carrier_results = []
-            
-            # Track lowest cost carrier regardless of capacity or lead time
-            lowest_cost_carrier = None
-            lowest_cost = float('inf')
+            snapshot = self._master_snapshot()
+            if self.memo is not None and snapshot is not None:
+                # Shipments with the same fingerprint get the same evaluation
+                key = shipment_fingerprint(jis_code, parcels, volume, weight, size, shipping_date, delivery_deadline)
+                evaluation = self.memo.get_or_compute(snapshot, key, lambda: self.evaluate_carriers(
+                    jis_code, parcels, volume, weight, size, shipping_date, delivery_deadline
+                ))
+            else:
+                evaluation = self.evaluate_carriers(
+                    jis_code, parcels, volume, weight, size, shipping_date, delivery_deadline
+                )
+            if self.capacity_ledger is not None:
+                evaluation = self.apply_capacity_usage(evaluation, shipping_date, delivery_deadline, volume, weight)
+            return self.choose_carrier(evaluation, previous_carrier)
+        except Exception as e:
+            logger.error(f"Error selecting optimal carrier: {str(e)}")
+            return {
+                "success": False,
+                "message": f"運送会社選定中にエラーが発生しました: {str(e)}",
+                "carriers": []
+            }
+
+    def evaluate_carriers(self,
+                          jis_code: str,
+                          parcels: Parcels,
+                          volume: float,
+                          weight: float,
+                          size: float,
+                          shipping_date: date,
+                          delivery_deadline: date) -> Dict[str, Any]:
+        """
+        Evaluate fee, lead time and capacity of every carrier for a shipment
+
+        The evaluation only depends on the shipment and the master data, not on
+        the destination's carrier history, so it can be shared between waybills.
+        
+        Args:
+            jis_code: The JIS code for the delivery area
+            parcels: Parcels with size and count, or their size histogram
+            volume: The total volume
+            weight: The total weight
+            size: The max size (sum of dimensions)
+            shipping_date: The shipping date
+            delivery_deadline: The delivery deadline
             
-            for carrier in carriers:
-                carrier_code = carrier.HANMA02001
-                carrier_name = carrier.HANMA02002
-                
-                # For each carrier, try all area codes and find the best shipping fee
-                lowest_fee = float('inf')
-                best_result = None
-                
-                for area_code in area_codes:
-                    # Calculate shipping fee for this area code
-                    shipping_fee = self.calculate_shipping_fee(
-                        carrier_code=carrier_code,
-                        area_code=area_code,
-                        parcels=parcels,
-                        volume=volume,
-                        weight=weight,
-                        size=size
-                    )
-                    
-                    if shipping_fee is None:
-                        # Skip this area code if fee calculation fails
-                        continue
-                        
-                    # Calculate delivery date
-                    est_delivery_date, lead_time = self.calculate_delivery_date(
-                        carrier_code=carrier_code,
-                        area_code=area_code,
-                        jis_code=jis_code,
-                        shipping_date=shipping_date
-                    )
-                    
-                    if est_delivery_date is None:
-                        # Skip this area code if delivery date calculation fails
-                        continue
-                    
-                    # Keep track of the lowest shipping fee for this carrier
-                    if shipping_fee < lowest_fee:
-                        lowest_fee = shipping_fee
-                        
-                        has_capacity = self.check_carrier_capacity(carrier_code, volume, weight)
-                        has_special_capacity = self.check_special_capacity(carrier_code, shipping_date, volume, weight)
-                        meets_deadline = est_delivery_date <= delivery_deadline
-                        is_available = has_capacity and has_special_capacity and meets_deadline
-                        
-                        # Save the best result for this carrier
-                        best_result = {
-                            "carrier_code": carrier_code,
-                            "carrier_name": carrier_name,
-                            "area_code": area_code,
-                            "parcels": parcels,
-                            "volume": volume,
-                            "weight": weight,
-                            "size": size,
-                            "cost": shipping_fee,
-                            "lead_time": lead_time,
-                            "estimated_delivery_date": est_delivery_date.isoformat(),
-                            "meets_deadline": meets_deadline,
-                            "is_capacity_available": has_capacity and has_special_capacity,
-                            "unavailable_reason": "" if is_available else self._get_unavailability_reason(
-                                has_capacity, has_special_capacity, True, "", 
-                                meets_deadline, est_delivery_date, delivery_deadline
-                            )
-                        }
+        Returns:
+            Dictionary with the per-carrier results ("carriers"), the cheapest
+            carrier ("lowest_cost_carrier") and an error message if no carrier
+            could be evaluated
+        """
+        # Get all available carriers
+        carriers = self.get_available_carriers()
+        
+        if not carriers:
+            return {"message": "利用可能な運送会社がありません", "carriers": [], "lowest_cost_carrier": None}
+        
+        # Get area codes from JIS code (multiple area codes may be associated with one JIS code)
+        area_codes = self.get_area_codes_from_jis(jis_code)
+        if not area_codes:
+            return {
+                "message": f"JISコード {jis_code} に対応する配送エリアが見つかりません",
+                "carriers": [],
+                "lowest_cost_carrier": None
+            }
+
+        # Prune carriers without rate rows for any of the destination's areas
+        snapshot = self._master_snapshot()
+        if snapshot is not None:
+            rated_carriers = snapshot.get_rated_carriers(jis_code)
+            carriers = [carrier for carrier in carriers if self.trim_string(carrier.HANMA02001) in rated_carriers]
+        
+        # Parcels grouped by size once, shared by the per-parcel fee tiers of all carriers
+        histogram = parcel_size_histogram(parcels, size)
+        parcel_count = sum(count for _, count in histogram)
+        
+        # Calculate metrics for each carrier
+        carrier_results = []
+        
+        # Track lowest cost carrier regardless of capacity or lead time
+        lowest_cost_carrier = None
+        lowest_cost = float('inf')
+        
+        for carrier in carriers:
+            carrier_code = carrier.HANMA02001
+            carrier_name = carrier.HANMA02002
+            
+            # For each carrier, try all area codes and find the best shipping fee
+            lowest_fee = float('inf')
+            best_result = None
+            carrier_area_codes = area_codes if snapshot is None else snapshot.get_rated_area_codes(carrier_code, area_codes)
+            
+            for area_code in carrier_area_codes:
+                # Calculate shipping fee for this area code
+                shipping_fee = self.calculate_shipping_fee(
+                    carrier_code=carrier_code,
+                    area_code=area_code,
+                    parcels=parcels,
+                    volume=volume,
+                    weight=weight,
+                    size=size,
+                    histogram=histogram
+                )
                 
-                # Add the best result for this carrier to the carrier_results list
-                if best_result:
-                    carrier_results.append(best_result)
+                if shipping_fee is None:
+                    # Skip this area code if fee calculation fails
+                    continue
                     
-                    # Track the lowest cost carrier overall
-                    if best_result["cost"] < lowest_cost:
-                        lowest_cost = best_result["cost"]
-                        lowest_cost_carrier = {
-                            "carrier_code": carrier_code,
-                            "carrier_name": carrier_name,
-                            "cost": best_result["cost"]
-                        }
-            
-            # Sort carriers by cost (only those that meet all requirements)
-            sorted_carriers = sorted(
-                [c for c in carrier_results if c["is_capacity_available"] and c["meets_deadline"]],
-                key=lambda x: x["cost"]
-            )
-            
-            # Fix 3: Log cheapest carrier even when excluded
-            if lowest_cost_carrier:
-                logger.info(f"Lowest cost carrier: {lowest_cost_carrier['carrier_code']} - {lowest_cost_carrier['carrier_name']} (¥{lowest_cost_carrier['cost']})")
-            
-            # If no available carriers but we tracked the cheapest
-            if not sorted_carriers and lowest_cost_carrier:
-                # Add cheapest carrier to results with availability flag
-                cheapest_in_results = False
-                for c in carrier_results:
-                    if c["carrier_code"] == lowest_cost_carrier["carrier_code"]:
-                        cheapest_in_results = True
-                        break
+                # Calculate delivery date
+                est_delivery_date, lead_time = self.calculate_delivery_date(
+                    carrier_code=carrier_code,
+                    area_code=area_code,
+                    jis_code=jis_code,
+                    shipping_date=shipping_date
+                )
                 
-                if not cheapest_in_results:
-                    # Find carrier details
-                    for carrier in carriers:
-                        if carrier.HANMA02001 == lowest_cost_carrier["carrier_code"]:
-                            # Try to find the best area code for this carrier
-                            best_area_code = None
-                            best_shipping_fee = float('inf')
-                            best_est_delivery_date = None
-                            best_lead_time = None
-                            
-                            for area_code in area_codes:
-                                shipping_fee = self.calculate_shipping_fee(
-                                    carrier_code=carrier.HANMA02001,
-                                    area_code=area_code,
-                                    parcels=parcels,
-                                    volume=volume,
-                                    weight=weight,
-                                    size=size
-                                )
-                                
-                                if shipping_fee is not None and shipping_fee < best_shipping_fee:
-                                    best_shipping_fee = shipping_fee
-                                    best_area_code = area_code
-                                    
-                                    # Get delivery date for this area code
-                                    est_delivery_date, lead_time = self.calculate_delivery_date(
-                                        carrier_code=carrier.HANMA02001,
-                                        area_code=area_code,
-                                        jis_code=jis_code,
-                                        shipping_date=shipping_date
-                                    )
-                                    
-                                    if est_delivery_date:
-                                        best_est_delivery_date = est_delivery_date
-                                        best_lead_time = lead_time
-                            
-                            # Use default values if no valid area code found
-                            est_delivery_date = best_est_delivery_date or None
-                            lead_time = best_lead_time or 0
-                            
-                            has_capacity = self.check_carrier_capacity(carrier.HANMA02001, volume, weight)
-                            has_special_capacity = self.check_special_capacity(carrier.HANMA02001, shipping_date, volume, weight)
-                            meets_deadline = False
-                            if est_delivery_date:
-                                meets_deadline = est_delivery_date <= delivery_deadline
-                            
-                            carrier_results.append({
-                                "carrier_code": carrier.HANMA02001,
-                                "carrier_name": carrier.HANMA02002,
-                                "area_code": best_area_code,
-                                "parcels": parcels,
-                                "volume": volume,
-                                "weight": weight,
-                                "size": size,
-                                "cost": lowest_cost_carrier["cost"],
-                                "lead_time": lead_time if lead_time else 0,
-                                "estimated_delivery_date": est_delivery_date.isoformat() if est_delivery_date else None,
-                                "meets_deadline": meets_deadline,
-                                "is_capacity_available": has_capacity and has_special_capacity,
-                                "is_cheapest": True,
-                                "unavailable_reason": "最安値ですが条件を満たしていません"
-                            })
+                if est_delivery_date is None:
+                    # Skip this area code if delivery date calculation fails
+                    continue
                 
-                return {
-                    "success": False,
-                    "message": "利用可能な運送会社がありません",
-                    "cheapest_carrier": lowest_cost_carrier,
-                    "carriers": carrier_results,
-                    "selection_flags": {
-                        "cheapest_carrier_logged": True,
-                        "no_carriers_with_capacity": True,
-                        "cannot_meet_delivery_date": True
+                # Keep track of the lowest shipping fee for this carrier
+                if shipping_fee < lowest_fee:
+                    lowest_fee = shipping_fee
+                    
+                    has_capacity = self.check_carrier_capacity(carrier_code, volume, weight)
+                    has_special_capacity = self.check_special_capacity(carrier_code, shipping_date, volume, weight)
+                    meets_deadline = est_delivery_date <= delivery_deadline
+                    is_available = has_capacity and has_special_capacity and meets_deadline
+                    
+                    # Save the best result for this carrier
+                    best_result = {
+                        "carrier_code": carrier_code,
+                        "carrier_name": carrier_name,
+                        "area_code": area_code,
+                        "parcel_count": parcel_count,
+                        "volume": volume,
+                        "weight": weight,
+                        "size": size,
+                        "cost": shipping_fee,
+                        "lead_time": lead_time,
+                        "estimated_delivery_date": est_delivery_date.isoformat(),
+                        "meets_deadline": meets_deadline,
+                        "is_capacity_available": has_capacity and has_special_capacity,
+                        "unavailable_reason": "" if is_available else self._get_unavailability_reason(
+                            has_capacity, has_special_capacity, True, "", 
+                            meets_deadline, est_delivery_date, delivery_deadline
+                        )
                     }
-                }
             
-            if not sorted_carriers:
-                return {
-                    "success": False,
-                    "message": "条件を満たす運送会社がありません",
-                    "cheapest_carrier": lowest_cost_carrier,  # Always include the cheapest carrier
-                    "carriers": carrier_results,
-                    "selection_flags": {
-                        "no_carriers_with_capacity": not any(c["is_capacity_available"] for c in carrier_results),
-                        "cannot_meet_delivery_date": not any(c["meets_deadline"] for c in carrier_results),
-                        "cheapest_carrier_logged": lowest_cost_carrier is not None
+            # Add the best result for this carrier to the carrier_results list
+            if best_result:
+                carrier_results.append(best_result)
+                
+                # Track the lowest cost carrier overall
+                if best_result["cost"] < lowest_cost:
+                    lowest_cost = best_result["cost"]
+                    lowest_cost_carrier = {
+                        "carrier_code": carrier_code,
+                        "carrier_name": carrier_name,
+                        "cost": best_result["cost"]
                     }
-                }
+
+        return {"message": None, "carriers": carrier_results, "lowest_cost_carrier": lowest_cost_carrier}
+
+    def apply_capacity_usage(self, evaluation: Dict[str, Any], shipping_date: date, delivery_deadline: date,
+                             volume: float, weight: float) -> Dict[str, Any]:
+        """
+        Recheck the capacity flags of an evaluation against the day's cumulative usage
+        
+        The evaluation only compares the shipment itself with the limits, so it
+        can be memoized; this adds what is already booked on the shipping date.
+        
+        Args:
+            evaluation: Result of evaluate_carriers (shared, never modified)
+            shipping_date: The shipping date
+            delivery_deadline: The delivery deadline
+            volume: The total volume
+            weight: The total weight
             
-            # Select the optimal carrier
-            selected_carrier = None
-            selection_reason = ""
-            
-            # Check if there's a preferred carrier specified
-            if previous_carrier:
-                # Look for the previous carrier in the sorted list
-                for carrier in sorted_carriers:
-                    if carrier["carrier_code"] == previous_carrier:
-                        selected_carrier = carrier
-                        selection_reason = "前回使用した運送会社"
-                        break
-            
-            # If no preferred carrier or preferred carrier not found, use the cheapest carrier
-            if not selected_carrier:
-                selected_carrier = sorted_carriers[0]
-                selection_reason = "最安値の運送会社"
-            
-            # Apply any special logic for carrier selection
-            # For example, prefer carriers that can deliver faster if cost difference is small
-            if len(sorted_carriers) > 1:
-                cheapest_carrier = sorted_carriers[0]
-                fastest_carrier = min(sorted_carriers, key=lambda x: x["lead_time"])
-                
-                # If the fastest carrier is different from the cheapest, and the cost difference is < 10%
-                if fastest_carrier != cheapest_carrier and fastest_carrier["lead_time"] < cheapest_carrier["lead_time"]:
-                    cost_diff_percent = (fastest_carrier["cost"] - cheapest_carrier["cost"]) / cheapest_carrier["cost"] * 100
-                    
-                    if cost_diff_percent < 10:
-                        selected_carrier = fastest_carrier
-                        selection_reason = f"最速の運送会社（最安値との差額: {cost_diff_percent:.1f}%）"
+        Returns:
+            Copy of the evaluation with updated capacity flags and reasons
+        """
+        if evaluation["message"]:
+            return evaluation
+        
+        carrier_results = []
+        for carrier in evaluation["carriers"]:
+            carrier = dict(carrier)
+            has_capacity = self.capacity_ledger.fits(
+                self.db, carrier["carrier_code"], shipping_date, volume, weight,
+                self.get_capacity_limits(carrier["carrier_code"], shipping_date)
+            )
+            if has_capacity != carrier["is_capacity_available"]:
+                carrier["is_capacity_available"] = has_capacity
+                est_delivery_date = date.fromisoformat(carrier["estimated_delivery_date"])
+                is_available = has_capacity and carrier["meets_deadline"]
+                carrier["unavailable_reason"] = "" if is_available else self._get_unavailability_reason(
+                    has_capacity, True, True, "",
+                    carrier["meets_deadline"], est_delivery_date, delivery_deadline
+                )
+            carrier_results.append(carrier)
+        
+        return dict(evaluation, carriers=carrier_results)
+
+    def choose_carrier(self, evaluation: Dict[str, Any], previous_carrier: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Pick the carrier from an evaluation, preferring the previously used carrier
+        
+        Args:
+            evaluation: Result of evaluate_carriers (shared, never modified)
+            previous_carrier: The previously used carrier code (optional)
             
+        Returns:
+            Selection results containing carrier, fee, and reason
+        """
+        if evaluation["message"]:
+            return {
+                "success": False,
+                "message": evaluation["message"],
+                "carriers": []
+            }
+
+        carrier_results = [dict(carrier) for carrier in evaluation["carriers"]]
+        lowest_cost_carrier = dict(evaluation["lowest_cost_carrier"]) if evaluation["lowest_cost_carrier"] else None
+        
+        # Sort carriers by cost (only those that meet all requirements)
+        sorted_carriers = sorted(
+            [c for c in carrier_results if c["is_capacity_available"] and c["meets_deadline"]],
+            key=lambda x: x["cost"]
+        )
+        
+        # Fix 3: Log cheapest carrier even when excluded
+        if lowest_cost_carrier:
+            logger.info(f"Lowest cost carrier: {lowest_cost_carrier['carrier_code']} - {lowest_cost_carrier['carrier_name']} (¥{lowest_cost_carrier['cost']})")
+        
+        # If no available carriers but we tracked the cheapest
+        if not sorted_carriers and lowest_cost_carrier:
             return {
-                "success": True,
-                "selected_carrier": selected_carrier,
-                "cheapest_carrier": lowest_cost_carrier or sorted_carriers[0],
+                "success": False,
+                "message": "利用可能な運送会社がありません",
+                "cheapest_carrier": lowest_cost_carrier,
                 "carriers": carrier_results,
-                "selection_reason": selection_reason,
                 "selection_flags": {
-                    "preferred_carrier_available": previous_carrier and selected_carrier["carrier_code"] == previous_carrier,
-                    "preferred_carrier_unavailable": previous_carrier and selected_carrier["carrier_code"] != previous_carrier,
-                    "no_preferred_carrier": not previous_carrier,
-                    "fastest_carrier_selected": selection_reason.startswith("最速"),
-                    "cheapest_carrier_selected": selection_reason == "最安値の運送会社",
-                    "cheapest_carrier_logged": lowest_cost_carrier is not None
+                    "cheapest_carrier_logged": True,
+                    "no_carriers_with_capacity": True,
+                    "cannot_meet_delivery_date": True
                 }
             }
-        except Exception as e:
-            logger.error(f"Error selecting optimal carrier: {str(e)}")
+        
+        if not sorted_carriers:
             return {
                 "success": False,
-                "message": f"運送会社選定中にエラーが発生しました: {str(e)}",
-                "carriers": []
+                "message": "条件を満たす運送会社がありません",
+                "cheapest_carrier": lowest_cost_carrier,  # Always include the cheapest carrier
+                "carriers": carrier_results,
+                "selection_flags": {
+                    "no_carriers_with_capacity": not any(c["is_capacity_available"] for c in carrier_results),
+                    "cannot_meet_delivery_date": not any(c["meets_deadline"] for c in carrier_results),
+                    "cheapest_carrier_logged": lowest_cost_carrier is not None
+                }
             }
+        
+        # Select the optimal carrier
+        selected_carrier = None
+        selection_reason = ""
+        
+        # Check if there's a preferred carrier specified
+        if previous_carrier:
+            # Look for the previous carrier in the sorted list
+            for carrier in sorted_carriers:
+                if carrier["carrier_code"] == previous_carrier:
+                    selected_carrier = carrier
+                    selection_reason = "前回使用した運送会社"
+                    break
+        
+        # If no preferred carrier or preferred carrier not found, use the cheapest carrier
+        if not selected_carrier:
+            selected_carrier = sorted_carriers[0]
+            selection_reason = "最安値の運送会社"
+        
+        # Apply any special logic for carrier selection
+        # For example, prefer carriers that can deliver faster if cost difference is small
+        if len(sorted_carriers) > 1:
+            cheapest_carrier = sorted_carriers[0]
+            fastest_carrier = min(sorted_carriers, key=lambda x: x["lead_time"])
+            
+            # If the fastest carrier is different from the cheapest, and the cost difference is < 10%
+            if fastest_carrier != cheapest_carrier and fastest_carrier["lead_time"] < cheapest_carrier["lead_time"]:
+                cost_diff_percent = (fastest_carrier["cost"] - cheapest_carrier["cost"]) / cheapest_carrier["cost"] * 100
+                
+                if cost_diff_percent < 10:
+                    selected_carrier = fastest_carrier
+                    selection_reason = f"最速の運送会社（最安値との差額: {cost_diff_percent:.1f}%）"
+        
+        return {
+            "success": True,
+            "selected_carrier": selected_carrier,
+            "cheapest_carrier": lowest_cost_carrier or sorted_carriers[0],
+            "carriers": carrier_results,
+            "selection_reason": selection_reason,
+            "selection_flags": {
+                "preferred_carrier_available": previous_carrier and selected_carrier["carrier_code"] == previous_carrier,
+                "preferred_carrier_unavailable": previous_carrier and selected_carrier["carrier_code"] != previous_carrier,
+                "no_preferred_carrier": not previous_carrier,
+                "fastest_carrier_selected": selection_reason.startswith("最速"),
+                "cheapest_carrier_selected": selection_reason == "最安値の運送会社",
+                "cheapest_carrier_logged": lowest_cost_carrier is not None
+            }
+        }
 
     def _get_unavailability_reason(self, has_capacity, has_special_capacity, 
                                  available_on_shipping_date, shipping_date_reason,
@@ -1131,21 +1255,26 @@ class FeeCalculationService:
             logger.warning(f"Failed to convert value '{value}' to integer, using 0 instead")
             return 0 
 
+    @timed("carrier_lookup")
     def get_available_carriers(self) -> List[Any]:
         """
         Get all available transportation companies
         
         Returns:
-            List of TransportationCompanyMaster objects
+            List of carrier records (code HANMA02001, name HANMA02002)
         """
         try:
-            carriers = self.db.query(TransportationCompanyMaster).all()
+            snapshot = self._master_snapshot()
+            if snapshot is not None:
+                return list(snapshot.carriers)
+            carriers = statements.carriers(self.db)
             logger.info(f"Retrieved {len(carriers)} available carriers")
             return carriers
         except Exception as e:
             logger.error(f"Error fetching available carriers: {str(e)}")
             return []
             
+    @timed("lead_time")
     def calculate_delivery_date(self, carrier_code: str, area_code: int, jis_code: str, 
                              shipping_date: date) -> Tuple[Optional[date], Optional[int]]:
         """
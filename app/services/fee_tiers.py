@@ -0,0 +1,114 @@
+from bisect import bisect_left
+from decimal import Decimal
+from typing import List, Optional, Dict, Any, Iterable, Tuple, Union
+import math
+import logging
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# Fee type of per-parcel pricing by size (HANMA46010)
+PER_PARCEL_FEE_TYPE = 3
+
+# Parcel size histogram: ((size, count), ...) sorted by size
+ParcelHistogram = Tuple[Tuple[float, int], ...]
+# Parcels as a list of {"size", "count"} dicts or already as a histogram
+Parcels = Union[Iterable[Dict[str, Any]], ParcelHistogram]
+
+
+def _to_float(value: Any) -> float:
+    if value is None:
+        return 0.0
+    if isinstance(value, Decimal):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parcel_size_histogram(parcels: Parcels, default_size: float = 0) -> ParcelHistogram:
+    """
+    Count parcels per size (sum of three sides in cm)
+
+    Args:
+        parcels: Parcels with "size" and "count"; a histogram is returned as is
+        default_size: Size of parcels that don't state their own
+
+    Returns:
+        Tuple of (size, count) pairs sorted by size
+    """
+    if isinstance(parcels, tuple):
+        return parcels
+    counts: Dict[float, int] = {}
+    for parcel in parcels:
+        size = _to_float(parcel.get("size", default_size))
+        counts[size] = counts.get(size, 0) + int(_to_float(parcel.get("count", 1)))
+    return tuple(sorted(counts.items()))
+
+
+class SizeTierTable:
+    """
+    Per-parcel fee tiers of one carrier and area, sorted by max size
+
+    Built from the fee type 3 rows of HAN99MA46SORYO (e.g. 60/80/100/120 cm).
+    A parcel is charged the base fee of the smallest tier whose max size fits
+    it; a max size of 0 means the tier takes parcels of any size.  Max weight
+    and volume apply to the whole shipment, as for the other fee types.
+    """
+
+    __slots__ = ("max_sizes", "fees", "max_weights", "max_volumes")
+
+    def __init__(self, records: Iterable[Any]):
+        tiers = []
+        for record in records:
+            if int(_to_float(record.HANMA46010)) != PER_PARCEL_FEE_TYPE:
+                continue
+            max_size = _to_float(record.HANMA46006)
+            tiers.append((
+                max_size if max_size > 0 else math.inf,
+                _to_float(record.HANMA46009),
+                _to_float(record.HANMA46004),
+                _to_float(record.HANMA46005),
+            ))
+        # Stable sort: rows with the same max size keep their code order
+        tiers.sort(key=lambda tier: tier[0])
+        self.max_sizes: List[float] = [tier[0] for tier in tiers]
+        self.fees: List[float] = [tier[1] for tier in tiers]
+        self.max_weights: List[float] = [tier[2] for tier in tiers]
+        self.max_volumes: List[float] = [tier[3] for tier in tiers]
+
+    def __len__(self) -> int:
+        return len(self.max_sizes)
+
+    def price(self, histogram: ParcelHistogram, volume: float = 0, weight: float = 0) -> Optional[float]:
+        """
+        Price every parcel at its size tier
+
+        Each histogram bucket costs one binary search over the tiers.
+
+        Args:
+            histogram: Parcel size histogram of the shipment
+            volume: Total volume of the shipment
+            weight: Total weight of the shipment
+
+        Returns:
+            Total fee, or None if a parcel fits no tier
+        """
+        total = 0.0
+        tier_count = len(self.max_sizes)
+        for size, count in histogram:
+            index = bisect_left(self.max_sizes, size)
+            # Skip tiers whose shipment limits are exceeded (rare, tiers usually share them)
+            while index < tier_count and not self._accepts(index, volume, weight):
+                index += 1
+            if index == tier_count:
+                logger.warning(f"No fee tier for parcel size {size} (volume={volume}, weight={weight})")
+                return None
+            total += self.fees[index] * count
+        return total
+
+    def _accepts(self, index: int, volume: float, weight: float) -> bool:
+        max_weight = self.max_weights[index]
+        max_volume = self.max_volumes[index]
+        return (max_weight == 0 or weight <= max_weight) and (max_volume == 0 or volume <= max_volume)
@@ -0,0 +1,303 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import List, Optional, Dict, Any, Callable, Tuple, Set, Iterable
+import threading
+import time
+import logging
+
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.db.records import CAPACITY, CARRIER, CARRIER_LEAD_TIME, FEE, HOLIDAY, SPECIAL_CAPACITY, SPECIAL_LEAD_TIME
+from app.services.fee_tiers import SizeTierTable
+from app.services.postal_code_resolver import postal_code_resolver
+
+from app.models.holiday_calendar_master import HolidayCalendarMaster
+from app.models.special_lead_time_master import SpecialLeadTimeMaster
+from app.models.transportation_company_master import TransportationCompanyMaster
+from app.models.transportation_company_sub_master import TransportationCompanySubMaster
+from app.models.transportation_area_jis import TransportationAreaJISMapping
+from app.models.transportation_fee import TransportationFee
+from app.models.transportation_capacity import TransportationCapacity
+from app.models.special_capacity import SpecialCapacity
+from app.models.postal_jis_mapping import PostalJISMapping
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+
+# Update number columns of the cached tables; any change there reloads the snapshot
+VERSIONED_COLUMNS = [
+    TransportationCompanyMaster.HANMA02999,
+    TransportationCompanySubMaster.HANMA03999,
+    HolidayCalendarMaster.HANMA04999,
+    SpecialLeadTimeMaster.HANMA41999,
+    TransportationAreaJISMapping.HANMA44999,
+    PostalJISMapping.HANMA45999,
+    TransportationFee.HANMA46999,
+    TransportationCapacity.HANMA47999,
+    SpecialCapacity.HANMA48999,
+]
+_POSTAL_INDEX = next(i for i, column in enumerate(VERSIONED_COLUMNS) if column is PostalJISMapping.HANMA45999)
+# Positions of the postal table's MAX(update number) and COUNT(*) in a version
+POSTAL_VERSION_SLOTS = (2 * _POSTAL_INDEX, 2 * _POSTAL_INDEX + 1)
+
+_MISSING = object()
+
+
+def _key(value: Any) -> str:
+    """Normalize CHAR codes - SQL Server compares them ignoring trailing blanks"""
+    return str(value).strip() if value is not None else ""
+
+
+def master_data_version(db: Session) -> Tuple:
+    """
+    Cheap fingerprint of the cached master tables
+
+    One round trip returning MAX(update number) and COUNT(*) per table, which
+    changes on every insert, update (the update number is incremented) and delete.
+    """
+    probes = []
+    for column in VERSIONED_COLUMNS:
+        probes.append(db.query(func.max(column)).scalar_subquery())
+        probes.append(db.query(func.count()).select_from(column.table).scalar_subquery())
+    return tuple(db.query(*probes).one())
+
+
+def _only_postal_codes_changed(old: Tuple, new: Tuple) -> bool:
+    return all(before == after for slot, (before, after) in enumerate(zip(old, new))
+               if slot not in POSTAL_VERSION_SLOTS)
+
+
+class MasterDataSnapshot:
+    """
+    In-memory copy of the master tables used by carrier selection
+
+    The small tables (carriers, area/JIS mappings, fees, capacities, lead times
+    and the holiday calendar) are loaded in full, as the read-only records of
+    ``app.db.records``.  Postal codes and products are large, so they are
+    memoized per key on first use via ``lookup``.
+    """
+
+    def __init__(self, db: Session):
+        self.loaded_at = time.monotonic()
+        self.checked_at = self.loaded_at
+        self.version = master_data_version(db)
+
+        self.carriers = CARRIER.read(db, order_by=[TransportationCompanyMaster.HANMA02001])
+
+        # JIS code <-> area code multimaps
+        self.area_codes_by_jis: Dict[str, List[Any]] = {}
+        self.jis_codes_by_area: Dict[str, List[str]] = {}
+        for jis_code, area_code in db.query(
+            TransportationAreaJISMapping.HANMA44002, TransportationAreaJISMapping.HANMA44001
+        ).all():
+            self.area_codes_by_jis.setdefault(_key(jis_code), []).append(area_code)
+            self.jis_codes_by_area.setdefault(_key(area_code), []).append(_key(jis_code))
+
+        # Fee tables, and the carriers that have rates for each area
+        self.fees: Dict[Tuple[str, str], List[Any]] = {}
+        self.carriers_by_area: Dict[str, Set[str]] = {}
+        for fee in FEE.read(db, order_by=[TransportationFee.HANMA46001]):
+            carrier_code, area_code = _key(fee.HANMA46002), _key(fee.HANMA46003)
+            self.fees.setdefault((carrier_code, area_code), []).append(fee)
+            self.carriers_by_area.setdefault(area_code, set()).add(carrier_code)
+        self.fee_tiers: Dict[Tuple[str, str], SizeTierTable] = {
+            key: SizeTierTable(records) for key, records in self.fees.items()
+        }
+
+        self.capacities: Dict[str, Any] = {}
+        for capacity in CAPACITY.read(db):
+            self.capacities.setdefault(_key(capacity.HANMA47001), capacity)
+
+        self.special_capacities: Dict[Tuple[str, int], Any] = {}
+        for special in SPECIAL_CAPACITY.read(db):
+            self.special_capacities.setdefault((_key(special.HANMA48001), special.HANMA48002), special)
+
+        self.holidays = {holiday.HANMA04002 for holiday in HOLIDAY.read(db)}
+
+        self.lead_times: Dict[str, Any] = {}
+        for sub in CARRIER_LEAD_TIME.read(db, order_by=[
+            TransportationCompanySubMaster.HANMA03001,
+            TransportationCompanySubMaster.HANMA03002,
+            TransportationCompanySubMaster.HANMA03003
+        ]):
+            self.lead_times.setdefault(_key(sub.HANMA03001), sub)
+
+        self.special_lead_times: Dict[Tuple[str, str, int], Any] = {}
+        for special in SPECIAL_LEAD_TIME.read(db):
+            key = (_key(special.HANMA41001), _key(special.HANMA41002), special.HANMA41003)
+            self.special_lead_times.setdefault(key, special)
+
+        self._memos: Dict[str, Dict[str, Any]] = {}
+
+    def get_area_codes(self, jis_code: str) -> List[Any]:
+        return self.area_codes_by_jis.get(_key(jis_code), [])
+
+    def get_jis_codes(self, area_code: Any) -> List[str]:
+        return self.jis_codes_by_area.get(_key(area_code), [])
+
+    def get_rated_carriers(self, jis_code: str) -> Set[str]:
+        """Carriers with fee rows for at least one of the JIS code's areas"""
+        carriers: Set[str] = set()
+        for area_code in self.get_area_codes(jis_code):
+            carriers |= self.carriers_by_area.get(_key(area_code), set())
+        return carriers
+
+    def get_rated_area_codes(self, carrier_code: str, area_codes: List[Any]) -> List[Any]:
+        """The given area codes for which the carrier has fee rows"""
+        carrier_code = _key(carrier_code)
+        return [area_code for area_code in area_codes if (carrier_code, _key(area_code)) in self.fees]
+
+    def get_fee_records(self, carrier_code: str, area_code: Any) -> List[Any]:
+        return self.fees.get((_key(carrier_code), _key(area_code)), [])
+
+    def get_fee_tiers(self, carrier_code: str, area_code: Any) -> SizeTierTable:
+        tiers = self.fee_tiers.get((_key(carrier_code), _key(area_code)))
+        return tiers if tiers is not None else SizeTierTable([])
+
+    def get_capacity(self, carrier_code: str) -> Optional[Any]:
+        return self.capacities.get(_key(carrier_code))
+
+    def get_special_capacity(self, carrier_code: str, date_int: int) -> Optional[Any]:
+        return self.special_capacities.get((_key(carrier_code), date_int))
+
+    def is_holiday(self, date_int: int) -> bool:
+        return date_int in self.holidays
+
+    def get_lead_time(self, carrier_code: str) -> Optional[Any]:
+        return self.lead_times.get(_key(carrier_code))
+
+    def get_special_lead_time(self, carrier_code: str, prefecture_code: str, date_int: int) -> Optional[Any]:
+        return self.special_lead_times.get((_key(carrier_code), _key(prefecture_code), date_int))
+
+    def lookup(self, table: str, key: Any, loader: Callable[[], Any], remember_misses: bool = True) -> Any:
+        """
+        Memoized per-key lookup for tables that are too large to load in full
+
+        Misses (None) are remembered as well, unless remember_misses is False.
+        """
+        memo = self._memos.setdefault(table, {})
+        normalized = _key(key)
+        if normalized in memo:
+            return memo[normalized]
+        value = loader()
+        if value is not None or remember_misses:
+            memo[normalized] = value
+        return value
+
+    def preload(self, table: str, items: Iterable[Tuple[Any, Any]]) -> int:
+        """
+        Fill a lookup memo in bulk with (key, value) pairs
+
+        Returns:
+            Number of entries in the memo
+        """
+        memo = self._memos.setdefault(table, {})
+        for key, value in items:
+            memo.setdefault(_key(key), value)
+        return len(memo)
+
+    def refresh_postal_codes(self, db: Session, version: Tuple) -> int:
+        """
+        Catch up with a postal table change without reloading the snapshot
+
+        Rows inserted or updated since this snapshot carry a higher update
+        number, so only those postal codes are dropped from the memo.  Deleted
+        rows leave no trace, so when the row count leaves room for deletions the
+        memoized keys are checked against the table's postal codes as well.
+
+        Args:
+            db: Database session
+            version: New version from ``master_data_version``
+
+        Returns:
+            Number of memo entries dropped
+        """
+        max_slot, count_slot = POSTAL_VERSION_SLOTS
+        changed = [postal_code for postal_code, in db.query(PostalJISMapping.HANMA45002)
+                   .filter(PostalJISMapping.HANMA45999 > (self.version[max_slot] or 0)).all()]
+        keys = {_key(postal_code) for postal_code in changed}
+
+        memo = self._memos.get("postal_jis", {})
+        if (self.version[count_slot] or 0) + len(changed) > (version[count_slot] or 0) and memo:
+            existing = {_key(postal_code) for postal_code, in db.query(PostalJISMapping.HANMA45002).all()}
+            keys.update(key for key in list(memo) if key not in existing)
+
+        dropped = sum(1 for key in keys if memo.pop(key, _MISSING) is not _MISSING)
+        # The resolver's own cache would hand the old answers back to the memo
+        postal_code_resolver.evict(keys)
+        self.version = version
+        return dropped
+
+
+class MasterDataCache:
+    """
+    Process-wide holder of the current master data snapshot
+
+    The snapshot is loaded through its own short-lived session so the cached
+    rows stay readable after the requesting session commits or closes.  It is
+    reloaded once ``ttl`` seconds have passed, after ``invalidate``, or when
+    the version probe (run at most every ``check_interval`` seconds) sees a
+    change in the update numbers or row counts of the cached tables.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, check_interval: Optional[float] = None):
+        self.ttl = settings.MASTER_DATA_CACHE_TTL if ttl is None else ttl
+        self.check_interval = settings.MASTER_DATA_VERSION_CHECK_INTERVAL if check_interval is None else check_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[MasterDataSnapshot] = None
+
+    def snapshot(self, db: Session) -> MasterDataSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and not self._stale(snapshot):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or self._expired(snapshot):
+                snapshot = self._snapshot = self._load(db)
+            elif self._stale(snapshot):
+                snapshot.checked_at = time.monotonic()
+                version = master_data_version(db)
+                if version != snapshot.version and _only_postal_codes_changed(snapshot.version, version):
+                    # Postal code imports only evict the postal codes they touched
+                    dropped = snapshot.refresh_postal_codes(db, version)
+                    metrics_registry.increment("postal_code_refreshes_total")
+                    logger.info(f"Postal codes changed, dropped {dropped} cached lookups")
+                elif version != snapshot.version:
+                    logger.info("Master data changed, reloading snapshot")
+                    snapshot = self._snapshot = self._load(db)
+        return snapshot
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+
+    def _expired(self, snapshot: MasterDataSnapshot) -> bool:
+        return time.monotonic() - snapshot.loaded_at >= self.ttl
+
+    def _stale(self, snapshot: MasterDataSnapshot) -> bool:
+        return self._expired(snapshot) or time.monotonic() - snapshot.checked_at >= self.check_interval
+
+    @staticmethod
+    def _read_session(db: Session) -> Session:
+        """The snapshot is read-only: load it from the read replica when there is one"""
+        if settings.READ_REPLICA_URL:
+            from app.db.base import get_read_session_factory
+            return get_read_session_factory()()
+        return Session(bind=db.get_bind())
+
+    def _load(self, db: Session) -> MasterDataSnapshot:
+        started = time.perf_counter()
+        session = self._read_session(db)
+        try:
+            snapshot = MasterDataSnapshot(session)
+        finally:
+            session.close()
+        metrics_registry.increment("master_data_reloads_total")
+        logger.info(f"Loaded master data snapshot: {len(snapshot.carriers)} carriers, "
+                    f"{len(snapshot.area_codes_by_jis)} JIS codes, {len(snapshot.fees)} fee tables "
+                    f"in {time.perf_counter() - started:.3f}s")
+        return snapshot
+
+
+master_data_cache = MasterDataCache()
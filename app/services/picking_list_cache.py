@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import hashlib
+import json
+import threading
+import time
+import logging
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.models.picking import PickingManagement, PickingWork
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+PageKey = Tuple[Tuple, int, int]  # (sorted filter items, skip, limit)
+
+
+def picking_list_version(db: Session) -> Tuple:
+    """
+    Cheap change probe of the picking list
+
+    One round trip returning MAX(registration time), MAX(update time) and
+    COUNT(*) of HAN99CA11PICKING, which changes whenever SmileV adds, updates
+    or removes a picking, and MAX(update time) of the picking works, which
+    changes when carrier selection (of any process) assigns their carriers.
+    """
+    works_updated = select(func.max(PickingWork.HANW002UPD)).scalar_subquery()
+    return tuple(db.query(
+        func.max(PickingManagement.HANCA11INS),
+        func.max(PickingManagement.HANCA11UPD),
+        func.count(),
+        works_updated,
+    ).select_from(PickingManagement).one())
+
+
+def page_etag(page: Dict[str, Any]) -> str:
+    """Strong ETag of a response payload"""
+    body = json.dumps(page, sort_keys=True, default=str, ensure_ascii=False)
+    return '"' + hashlib.sha1(body.encode("utf-8")).hexdigest() + '"'
+
+
+class PickingListCache:
+    """
+    Short-lived cache of picking list pages, keyed by (filters, skip, limit)
+
+    Pages are dropped after ``ttl`` seconds, after ``invalidate`` (called when
+    carrier selection commits), and when the change probe (run at most every
+    ``check_interval`` seconds) sees a different picking table version.  Each
+    page keeps the ETag of its payload, so clients re-opening the same page
+    are answered with 304 Not Modified.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_size: Optional[int] = None,
+                 check_interval: Optional[float] = None):
+        self.ttl = settings.PICKING_LIST_CACHE_TTL if ttl is None else ttl
+        self.max_size = settings.PICKING_LIST_CACHE_SIZE if max_size is None else max_size
+        self.check_interval = (settings.PICKING_LIST_CHECK_INTERVAL if check_interval is None
+                               else check_interval)
+        self._lock = threading.Lock()
+        self._pages: "OrderedDict[PageKey, Tuple[Dict[str, Any], str, float]]" = OrderedDict()
+        self._generation = 0  # Bumped on every invalidation
+        self._version: Optional[Tuple] = None
+        self._checked_at: Optional[float] = None
+
+    def get(self, db: Session, key: PageKey, loader: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], str]:
+        """
+        Cached page for ``key``, loading it with ``loader`` on a miss
+
+        Returns:
+            (page, etag)
+        """
+        self._check_version(db)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None and now - entry[2] < self.ttl:
+                self._pages.move_to_end(key)
+                metrics_registry.increment("picking_list_cache_hits_total")
+                return entry[0], entry[1]
+            generation = self._generation
+
+        metrics_registry.increment("picking_list_cache_misses_total")
+        page = loader()
+        etag = page_etag(page)
+        with self._lock:
+            if generation != self._generation:
+                # Invalidated while loading; the page may predate the change
+                return page, etag
+            self._pages[key] = (page, etag, now)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_size:
+                self._pages.popitem(last=False)
+        return page, etag
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._pages.clear()
+
+    def _check_version(self, db: Session) -> None:
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        try:
+            version = picking_list_version(db)
+        except Exception as e:
+            # Without a probe the TTL still bounds how stale a page can be
+            logger.warning(f"Picking list change probe failed: {str(e)}")
+            return
+        with self._lock:
+            self._checked_at = now
+            if version != self._version:
+                if self._version is not None:
+                    logger.info("Pickings changed, dropping cached picking list pages")
+                self._version = version
+                self._generation += 1
+                self._pages.clear()
+
+
+picking_list_cache = PickingListCache()
@@ -1,9 +1,10 @@
 import os
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, desc, func
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 from app.core.config import settings
+from app.services.picking_list_cache import picking_list_cache
 
 from app.models.picking import PickingManagement, PickingDetail, PickingWork
 from app.models.customer import Customer
@@ -128,3 +129,39 @@ def get_pickings(
         "pickings": pickings,
         "total": total
     }
+
+
+def get_picking_page(
+    db: Session,
+    skip: int = 0,
+    limit: int = 50,
+    filters: Optional[Dict[str, Any]] = None
+) -> Tuple[Dict[str, Any], str]:
+    """
+    One page of the picking list as returned by GET /pickings
+
+    Pages are served from the picking list cache while the pickings are
+    unchanged.
+
+    Args:
+        db: Database session
+        skip: Number of records to skip (pagination)
+        limit: Number of records to return
+        filters: Optional filters to apply to the query
+
+    Returns:
+        Tuple of the page (pickings, total, page, size) and its ETag
+    """
+    filters = filters or {}
+
+    def load() -> Dict[str, Any]:
+        result = get_pickings(db, skip=skip, limit=limit, filters=filters)
+        return {
+            "pickings": result["pickings"],
+            "total": result["total"],
+            "page": skip // limit + 1 if limit > 0 else 1,
+            "size": limit
+        }
+
+    key = (tuple(sorted(filters.items())), skip, limit)
+    return picking_list_cache.get(db, key, load)
@@ -0,0 +1,344 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Callable, Tuple
+import asyncio
+import re
+import threading
+import time
+import logging
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.db.pool import POOL_INTERACTIVE, POOL_WRITE
+from app.models.postal_jis_mapping import PostalJISMapping
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+DB_BATCH_SIZE = 500  # Postal codes per IN list
+_NOT_FOUND = object()  # The API answered, but knows no such postal code
+_FULL_WIDTH_DIGITS = str.maketrans("０１２３４５６７８９", "0123456789")
+
+
+def normalize_postal_code(postal_code: Optional[str]) -> str:
+    """Digits only: '100-0001', ' 1000001 ' and '１００－０００１' all become '1000001'"""
+    if not postal_code:
+        return ""
+    return re.sub(r"\D", "", str(postal_code).translate(_FULL_WIDTH_DIGITS))
+
+
+class PostalCodeResolver:
+    """
+    Postal code -> JIS code lookups through three tiers
+
+    1. An in-memory LRU of recent answers, kept for ``ttl`` seconds so that
+       postal code imports show up; postal codes the API does not know are
+       remembered for ``negative_ttl`` seconds
+    2. The mapping table (HAN99MA45JYUYUHIMODUKE), one IN query per batch
+    3. The postcode-jp.com API, for postal codes newer than the last import.
+       Requests share one pooled async client, run at most ``concurrency`` at a
+       time, time out after ``timeout`` seconds, and their answers are written
+       back to the mapping table so the API is asked only once per postal code.
+
+    The async client lives on a private event loop thread, so synchronous
+    callers (request handlers, the carrier selection) can resolve a whole
+    picking's postal codes concurrently.  API and mapping table failures are
+    not cached: the postal code resolves to None and is asked again next time.
+    """
+
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None,
+                 base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 timeout: Optional[float] = None, concurrency: Optional[int] = None,
+                 cache_size: Optional[int] = None, ttl: Optional[float] = None,
+                 negative_ttl: Optional[float] = None):
+        self._session_factory = session_factory
+        self.base_url = (base_url if base_url is not None else settings.POSTCODE_API_URL).rstrip("/")
+        self.api_key = api_key if api_key is not None else settings.POSTCODE_API_KEY
+        self.timeout = settings.POSTCODE_API_TIMEOUT if timeout is None else timeout
+        self.concurrency = settings.POSTCODE_API_CONCURRENCY if concurrency is None else concurrency
+        self.cache_size = settings.POSTCODE_CACHE_SIZE if cache_size is None else cache_size
+        self.ttl = settings.POSTCODE_CACHE_TTL if ttl is None else ttl
+        self.negative_ttl = settings.POSTCODE_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+
+        self._lock = threading.Lock()
+        # Postal code -> (JIS code or None, expiry)
+        self._cache: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._client = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def api_enabled(self) -> bool:
+        return bool(self.api_key and self.base_url)
+
+    def resolve(self, postal_code: str, db: Optional[Session] = None) -> Optional[str]:
+        """
+        JIS code of one postal code
+
+        Args:
+            postal_code: Postal code in any common notation
+            db: Session for the mapping table lookup (a new one by default)
+
+        Returns:
+            5-digit JIS code, or None if unknown
+        """
+        normalized = normalize_postal_code(postal_code)
+        return self.resolve_many([normalized], db).get(normalized)
+
+    def resolve_many(self, postal_codes: Iterable[str], db: Optional[Session] = None) -> Dict[str, Optional[str]]:
+        """
+        JIS codes of many postal codes, asking each tier only for what the
+        previous one missed
+
+        Args:
+            postal_codes: Postal codes in any common notation
+            db: Session for the mapping table lookup (a new one by default)
+
+        Returns:
+            Dict of normalized postal code -> JIS code or None
+        """
+        codes = list(dict.fromkeys(code for code in map(normalize_postal_code, postal_codes) if code))
+        results: Dict[str, Optional[str]] = {}
+        missing = []
+        for code in codes:
+            cached = self._cached(code)
+            if cached is _NOT_FOUND:
+                results[code] = None
+            elif cached is not None:
+                results[code] = cached
+            else:
+                missing.append(code)
+        metrics_registry.increment("postal_resolver_memory_hits_total", len(codes) - len(missing))
+        if not missing:
+            return results
+
+        found = self._query_mapping(missing, db)
+        if found is None:
+            # Not remembered, the next lookup asks the mapping table again
+            results.update({code: None for code in missing})
+            return results
+        metrics_registry.increment("postal_resolver_db_hits_total", len(found))
+        for code, jis_code in found.items():
+            self._remember(code, jis_code, self.ttl)
+        results.update(found)
+        missing = [code for code in missing if code not in found]
+
+        if not missing:
+            return results
+        if not self.api_enabled:
+            # The mapping table is the final answer until the next import
+            for code in missing:
+                self._remember(code, None, self.ttl)
+                results[code] = None
+            return results
+
+        # Malformed postal codes are not worth a request
+        requested = [code for code in missing if len(code) == 7]
+        fetched = self._run(self._fetch_many(requested)) if requested else {}
+        fetched.update({code: _NOT_FOUND for code in missing if len(code) != 7})
+        new_codes = {code: answer for code, answer in fetched.items() if isinstance(answer, str)}
+        if new_codes:
+            self._write_back(new_codes)
+
+        for code in missing:
+            answer = fetched.get(code)
+            if answer is _NOT_FOUND:
+                self._remember(code, None, self.negative_ttl)
+            elif answer is not None:
+                self._remember(code, answer, self.ttl)
+            # API failures are not remembered, the next lookup asks again
+            results[code] = answer if isinstance(answer, str) else None
+        return results
+
+    def evict(self, postal_codes: Iterable[str]) -> None:
+        """Forget the cached answers for postal codes whose mapping changed"""
+        with self._lock:
+            for code in map(normalize_postal_code, postal_codes):
+                self._cache.pop(code, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def close(self) -> None:
+        """Close the API client and stop its event loop thread"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        client = self._client
+        if client is not None:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result()
+        self._client = None
+        loop.call_soon_threadsafe(loop.stop)
+
+    # Memory tier
+
+    def _cached(self, code: str):
+        with self._lock:
+            entry = self._cache.get(code)
+            if entry is None:
+                return None
+            jis_code, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._cache[code]
+                return None
+            self._cache.move_to_end(code)
+            return _NOT_FOUND if jis_code is None else jis_code
+
+    def _remember(self, code: str, jis_code: Optional[str], ttl: float) -> None:
+        with self._lock:
+            self._cache[code] = (jis_code, time.monotonic() + ttl)
+            self._cache.move_to_end(code)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # Database tier
+
+    def _session(self, pool_name: str = POOL_INTERACTIVE) -> Session:
+        if self._session_factory is not None:
+            return self._session_factory()
+        from app.db.base import get_session_factory
+        return get_session_factory(pool_name)()
+
+    def _query_mapping(self, codes: List[str], db: Optional[Session]) -> Optional[Dict[str, str]]:
+        """
+        JIS codes of the postal codes found in the mapping table
+
+        Returns:
+            Dict of postal code -> JIS code, or None if the query failed
+        """
+        session = db or self._session()
+        found = {}
+        try:
+            for start in range(0, len(codes), DB_BATCH_SIZE):
+                rows = session.query(PostalJISMapping.HANMA45002, PostalJISMapping.HANMA45001).filter(
+                    PostalJISMapping.HANMA45002.in_(codes[start:start + DB_BATCH_SIZE])
+                ).all()
+                for postal_code, jis_code in rows:
+                    found.setdefault(postal_code.strip(), jis_code.strip())
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching JIS codes for {len(codes)} postal codes: {str(e)}")
+            return None
+        finally:
+            if db is None:
+                session.close()
+        return found
+
+    def _write_back(self, codes: Dict[str, str]) -> None:
+        """
+        Add API answers to the mapping table with the next update number
+
+        Runs in its own session on the write pool, so the caller's transaction
+        is untouched.
+        """
+        try:
+            session = self._session(POOL_WRITE)
+        except SQLAlchemyError as e:
+            logger.warning(f"Could not store postal codes from the API: {str(e)}")
+            return
+        try:
+            existing = {postal_code.strip() for postal_code, in session.query(PostalJISMapping.HANMA45002).filter(
+                PostalJISMapping.HANMA45002.in_(list(codes))
+            ).all()}
+            new_rows = {code: jis_code for code, jis_code in codes.items() if code not in existing}
+            if not new_rows:
+                return
+            update_number = (session.query(func.max(PostalJISMapping.HANMA45999)).scalar() or 0) + 1
+            session.add_all([
+                PostalJISMapping(HANMA45001=jis_code, HANMA45002=code, HANMA45999=update_number)
+                for code, jis_code in new_rows.items()
+            ])
+            session.commit()
+            logger.info(f"Added {len(new_rows)} postal codes from the postal code API to the mapping table")
+        except SQLAlchemyError as e:
+            # Another worker may have added them first; the next lookup finds them either way
+            session.rollback()
+            logger.warning(f"Could not store postal codes from the API: {str(e)}")
+        finally:
+            session.close()
+
+    # API tier
+
+    def _run(self, coroutine):
+        """Run a coroutine on the resolver's event loop and wait for it"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._event_loop()).result()
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="postal-code-resolver", daemon=True)
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    def _api_client(self):
+        # Only touched on the event loop thread
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                headers={"apikey": self.api_key, "Accept": "application/json"},
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._client
+
+    async def _fetch_many(self, codes: List[str]) -> Dict[str, object]:
+        client = self._api_client()
+        answers = await asyncio.gather(*(self._fetch(client, code) for code in codes))
+        return dict(zip(codes, answers))
+
+    async def _fetch(self, client, code: str):
+        """
+        Ask the API for one postal code
+
+        Returns:
+            JIS code, _NOT_FOUND if the API does not know the postal code, or
+            None if the request failed
+        """
+        import httpx
+
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.get(f"{self.base_url}/{code}")
+            except httpx.HTTPError as e:
+                metrics_registry.increment("postal_resolver_api_errors_total")
+                logger.error(f"Error fetching JIS code for postal code {code}: {str(e) or type(e).__name__}")
+                return None
+            finally:
+                metrics_registry.observe("postal_resolver_api", time.perf_counter() - started, 0)
+
+        if response.status_code == 404:
+            return _NOT_FOUND
+        if response.status_code != 200:
+            metrics_registry.increment("postal_resolver_api_errors_total")
+            logger.error(f"Postal code API answered {response.status_code} for postal code {code}")
+            return None
+
+        try:
+            data = response.json()
+        except ValueError:
+            logger.error(f"Postal code API sent an invalid response for postal code {code}")
+            return None
+        if data and "data" in data and len(data["data"]) > 0:
+            address = data["data"][0]
+            prefecture_code = address.get("prefecture_code", "")
+            city_code = address.get("city_code", "")
+            if prefecture_code and city_code:
+                # Combine to create 5-digit JIS code
+                return f"{prefecture_code}{city_code}"
+
+        logger.warning(f"Could not find JIS code for postal code {code}")
+        return _NOT_FOUND
+
+
+postal_code_resolver = PostalCodeResolver()
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from datetime import date
+from typing import List, Optional, Dict, Any, Callable, Tuple
+import threading
+import logging
+
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.services.fee_tiers import Parcels, parcel_size_histogram
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# Rounding only absorbs float noise from summing Decimal-converted values,
+# so a memoized evaluation is exactly the one the shipment would get
+METRIC_PRECISION = 6
+
+
+def shipment_fingerprint(jis_code: str, parcels: Parcels, volume: float, weight: float,
+                         size: float, shipping_date: date, delivery_deadline: date) -> Tuple:
+    """
+    Canonical key of everything a carrier evaluation depends on
+
+    Parcels are reduced to a histogram of (size, count) so the same shipment
+    built from products in a different order maps to the same key.
+    """
+    histogram: Dict[float, int] = {}
+    for parcel_size, count in parcel_size_histogram(parcels, size):
+        parcel_size = round(parcel_size, METRIC_PRECISION)
+        histogram[parcel_size] = histogram.get(parcel_size, 0) + count
+
+    return (
+        (jis_code or "").strip(),
+        round(float(volume), METRIC_PRECISION),
+        round(float(weight), METRIC_PRECISION),
+        round(float(size), METRIC_PRECISION),
+        tuple(sorted(histogram.items())),
+        shipping_date,
+        delivery_deadline,
+    )
+
+
+class SelectionMemo:
+    """
+    LRU memo of carrier evaluations keyed by shipment fingerprint
+
+    Entries are scoped to one master data snapshot and one calendar day: when
+    either changes the memo starts over, so cached fees, lead times and
+    capacity flags never outlive the data they were computed from.
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.max_size = settings.SELECTION_MEMO_SIZE if max_size is None else max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._scope: Optional[Tuple] = None
+
+    def get_or_compute(self, scope: Any, key: Tuple, compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Return the memoized evaluation for ``key``, computing it on a miss
+
+        Args:
+            scope: Identity of the data the evaluation is based on
+            key: Shipment fingerprint
+            compute: Produces the evaluation on a miss
+
+        Returns:
+            The evaluation
+        """
+        today = date.today()
+        with self._lock:
+            if not self._in_scope(scope, today):
+                self._entries.clear()
+                self._scope = (scope, today)
+            evaluation = self._entries.get(key)
+            if evaluation is not None:
+                self._entries.move_to_end(key)
+
+        if evaluation is not None:
+            metrics_registry.increment("selection_memo_hits_total")
+            return evaluation
+
+        metrics_registry.increment("selection_memo_misses_total")
+        evaluation = compute()
+        with self._lock:
+            if self._in_scope(scope, today):
+                self._entries[key] = evaluation
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return evaluation
+
+    def _in_scope(self, scope: Any, today: date) -> bool:
+        return self._scope is not None and self._scope[0] is scope and self._scope[1] == today
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._scope = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+selection_memo = SelectionMemo()
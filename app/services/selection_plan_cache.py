@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Iterable, Tuple
+import copy
+import threading
+import time
+import logging
+
+from app.core.config import settings
+from app.services.waybill_group import WaybillGroup, picking_work_key
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+
+def picking_work_fingerprint(works: Iterable[Any], headers: Iterable[Any] = ()) -> Tuple:
+    """
+    Fingerprint of the picking works a waybill grouping was built from
+
+    Covers everything the grouping depends on: the works themselves, their
+    quantities, their current carrier code and their update timestamp, and
+    the carrier code and update timestamp of their order headers (see
+    ``statements.order_header_versions``), which hold the destinations and
+    dates and decide which orders are still unassigned.
+    """
+    work_versions = tuple(sorted(
+        (
+            str(work.HANW002001), str(work.HANW002002), str(work.HANW002003),
+            float(work.HANW002041 or 0),
+            (work.HANW002A003 or "").strip(),
+            float(work.HANW002UPD or 0),
+        )
+        for work in works
+    ))
+    header_versions = tuple(sorted(
+        (
+            str(header.HANR004005), str(header.HANR004004),
+            (header.HANR004A008 or "").strip(),
+            float(header.HANR004UPD or 0),
+        )
+        for header in headers
+    ))
+    return work_versions, header_versions
+
+
+class SelectionPlanCache:
+    """
+    LRU cache of waybill groupings computed by dry runs
+
+    A plan holds the waybill groups of one picking, which refer to their
+    picking works by key, so a later commit can reuse the groups instead of
+    re-reading every order header and product.  Plans are only reused while
+    the fingerprint of the picking works and their order headers is unchanged.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_size = settings.SELECTION_PLAN_CACHE_SIZE if max_size is None else max_size
+        self.ttl = settings.SELECTION_PLAN_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._plans: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+
+    def store(self, picking_id: int, fingerprint: Tuple, waybills: List[WaybillGroup]) -> None:
+        planned = copy.deepcopy(waybills)
+
+        with self._lock:
+            self._plans[picking_id] = {
+                "fingerprint": fingerprint,
+                "waybills": planned,
+                "created_at": time.monotonic(),
+            }
+            self._plans.move_to_end(picking_id)
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+
+    def restore(self, picking_id: int, fingerprint: Tuple, works: Iterable[Any]) -> Optional[List[WaybillGroup]]:
+        """
+        Copy of the planned waybill groups for the given picking works
+
+        Returns:
+            The waybill groups, keeping only the keys of the given picking
+            works, or None if there is no plan or it no longer matches them
+        """
+        with self._lock:
+            plan = self._plans.get(picking_id)
+            if plan is None:
+                return None
+            if plan["fingerprint"] != fingerprint or time.monotonic() - plan["created_at"] >= self.ttl:
+                del self._plans[picking_id]
+                logger.info(f"Discarding stale selection plan for picking ID {picking_id}")
+                return None
+            planned = copy.deepcopy(plan["waybills"])
+
+        current_keys = {picking_work_key(work) for work in works}
+        for waybill in planned:
+            waybill.work_keys = [key for key in waybill.work_keys if key in current_keys]
+        return planned
+
+    def discard(self, picking_id: int) -> None:
+        with self._lock:
+            self._plans.pop(picking_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._plans.clear()
+
+
+selection_plan_cache = SelectionPlanCache()
@@ -0,0 +1,246 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Dict, Any, Optional, Callable, List
+import threading
+import time
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, configure_mappers
+
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.db import statements
+from app.db.pool import POOL_BATCH
+from app.models.postal_jis_mapping import PostalJISMapping
+from app.services.master_data_cache import master_data_cache
+from app.services.capacity_ledger import capacity_ledger
+from app.services.fee_calculation_service import FeeCalculationService
+from app.services import picking_service
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """
+    Progress of the startup warm-up, reported by the ``/ready`` endpoint
+
+    The backend counts as ready once every warm-up stage has finished, even if
+    some failed: the caches then fill lazily on first use as before.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ready = False
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    def start(self) -> None:
+        with self._lock:
+            self.ready = False
+            self.started_at = time.monotonic()
+            self.finished_at = None
+            self.stages = {}
+
+    def record(self, stage: str, seconds: float, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.stages[stage] = {"seconds": round(seconds, 3), "ok": error is None}
+            if error is not None:
+                self.stages[stage]["error"] = error
+
+    def finish(self) -> None:
+        with self._lock:
+            self.ready = True
+            self.finished_at = time.monotonic()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            seconds = None
+            if self.started_at is not None:
+                seconds = round((self.finished_at or time.monotonic()) - self.started_at, 3)
+            return {"ready": self.ready, "seconds": seconds, "stages": {k: dict(v) for k, v in self.stages.items()}}
+
+
+readiness = Readiness()
+
+
+def pool_target_size(engine: Engine) -> int:
+    """Number of connections the engine's pool keeps open, 1 for pools without a fixed size"""
+    size = getattr(engine.pool, "size", None)
+    return max(1, size()) if callable(size) else 1
+
+
+def prefill_pool(engine: Engine, size: Optional[int] = None) -> int:
+    """
+    Open ``size`` pooled connections concurrently and hand them back to the pool
+
+    Args:
+        engine: Engine whose pool is filled
+        size: Number of connections, the pool size by default
+
+    Returns:
+        Number of connections opened
+    """
+    size = size or pool_target_size(engine)
+
+    def open_connection(_):
+        connection = engine.connect()
+        connection.execute(text("SELECT 1"))
+        return connection
+
+    connections = []
+    try:
+        with ThreadPoolExecutor(max_workers=size) as executor:
+            connections = list(executor.map(open_connection, range(size)))
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+def prefill_batch_pool(engine: Engine) -> int:
+    """
+    Connect the batch pool, which carrier selection runs on, and fill it
+
+    Args:
+        engine: The interactive engine, which SQLite databases use for every pool
+
+    Returns:
+        Number of connections opened, 0 when the batch pool is the interactive engine
+    """
+    from app.db.base import get_engine
+    batch_engine = get_engine(POOL_BATCH)
+    if batch_engine is engine:
+        return 0
+    return prefill_pool(batch_engine)
+
+
+def load_master_data(session_factory: Callable[[], Session]) -> None:
+    """Load carriers, fees, areas, capacities, the calendar and lead times into the snapshot"""
+    db = session_factory()
+    try:
+        master_data_cache.snapshot(db)
+    finally:
+        db.close()
+
+
+def load_postal_codes(session_factory: Callable[[], Session]) -> int:
+    """
+    Fill the snapshot's postal code -> JIS code memo with the whole postal table
+
+    Returns:
+        Number of postal codes loaded
+    """
+    db = session_factory()
+    try:
+        snapshot = master_data_cache.snapshot(db)
+        rows = db.query(PostalJISMapping.HANMA45002, PostalJISMapping.HANMA45001).all()
+        return snapshot.preload("postal_jis", rows)
+    finally:
+        db.close()
+
+
+def load_capacity_usage(session_factory: Callable[[], Session]) -> None:
+    """Seed today's committed carrier capacity usage in the ledger"""
+    db = session_factory()
+    try:
+        snapshot = master_data_cache.snapshot(db)
+        today = date.today()
+        for carrier in snapshot.carriers:
+            capacity_ledger.usage(db, carrier.HANMA02001, today)
+    finally:
+        db.close()
+
+
+def compile_statements(session_factory: Callable[[], Session]) -> None:
+    """
+    Run the most common statements once so their compiled forms are cached
+
+    The queries match no rows; SQLAlchemy keeps the compiled SQL per statement
+    shape, so the first real request skips the compilation.  The dummy values
+    have the columns' types (numbers for the DECIMAL order number, document
+    type and product code), which SQL Server requires.  Every statement is
+    primed even if another one fails; the failures are raised together.
+    """
+    configure_mappers()
+    db = session_factory()
+    primers = [
+        ("pickings", lambda: picking_service.get_pickings(db, skip=0, limit=1)),
+        ("picking_works", lambda: statements.picking_works(db, -1)),
+        ("order_header", lambda: statements.order_header(
+            db, 0, document_type=0, carrier_code=settings.CARRIER_UNASSIGNED_CODE
+        )),
+        ("product_info", lambda: statements.product_info(db, 0)),
+        ("fee_records", lambda: statements.fee_records(db, "", 0)),
+        ("postal_to_jis", lambda: FeeCalculationService(db)._query_postal_to_jis("")),
+    ]
+    errors = []
+    try:
+        for name, prime in primers:
+            try:
+                prime()
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Priming statement {name} failed: {str(e)}")
+                errors.append(f"{name}: {str(e)}")
+    finally:
+        db.close()
+    if errors:
+        raise RuntimeError("; ".join(errors))
+
+
+def warm_up(engine: Engine, session_factory: Callable[[], Session],
+            state: Optional[Readiness] = None) -> Readiness:
+    """
+    Warm the pool and caches before the first request
+
+    Independent stages run concurrently; stages that depend on the master data
+    snapshot run after it.  Failures are logged and recorded but never raised.
+
+    Args:
+        engine: Database engine
+        session_factory: Factory of sessions bound to the engine
+        state: Readiness to report progress to (the global one by default)
+
+    Returns:
+        The readiness state, marked ready
+    """
+    state = state or readiness
+    state.start()
+
+    def run(stage: str, action: Callable[[], Any]) -> None:
+        started = time.perf_counter()
+        error = None
+        try:
+            action()
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Warm-up stage {stage} failed: {error}")
+        seconds = time.perf_counter() - started
+        state.record(stage, seconds, error)
+        metrics_registry.observe(f"warmup_{stage}", seconds, 0)
+
+    def master_data_stages() -> None:
+        run("master_data", lambda: load_master_data(session_factory))
+        dependent: List[tuple] = [("capacity_usage", lambda: load_capacity_usage(session_factory))]
+        if settings.WARMUP_PRELOAD_POSTAL_CODES:
+            dependent.append(("postal_codes", lambda: load_postal_codes(session_factory)))
+        with ThreadPoolExecutor(max_workers=len(dependent)) as executor:
+            list(executor.map(lambda stage: run(*stage), dependent))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(run, "connection_pool", lambda: prefill_pool(engine)),
+            executor.submit(run, "batch_pool", lambda: prefill_batch_pool(engine)),
+            executor.submit(master_data_stages),
+            executor.submit(run, "statements", lambda: compile_statements(session_factory)),
+        ]
+        for future in futures:
+            future.result()
+
+    state.finish()
+    logger.info(f"Warm-up finished in {state.status()['seconds']}s")
+    return state
@@ -0,0 +1,88 @@
+from datetime import date
+from typing import List, Optional, Any, Tuple
+
+# Primary key of a picking work row
+WorkKey = Tuple[Any, Any, Any, Any]
+
+# Outer box dimensions in cm: (length, width, height)
+BoxDimensions = Tuple[float, float, float]
+
+
+def picking_work_key(work: Any) -> WorkKey:
+    """
+    Primary key of a picking work row (document type, order number, line,
+    HANW002078), in the order ``Session.get`` takes it
+    """
+    return (work.HANW002001, work.HANW002002, work.HANW002003, work.HANW002078)
+
+
+class ProductLine:
+    """
+    One product of a waybill with the quantity shipped and its packing data
+
+    ``box_dimensions`` holds the outer box of every box of a set product, in
+    box order.
+    """
+
+    __slots__ = ("product_code", "quantity", "set_parcel_count", "outer_box_count",
+                 "weight_per_unit", "volume_per_unit", "box_dimensions")
+
+    def __init__(self, product_code: Any, quantity: float, set_parcel_count: int = 1, outer_box_count: int = 1,
+                 weight_per_unit: float = 1.0, volume_per_unit: float = 0.0,
+                 box_dimensions: Tuple[BoxDimensions, ...] = ()):
+        self.product_code = product_code
+        self.quantity = quantity
+        self.set_parcel_count = set_parcel_count
+        self.outer_box_count = outer_box_count
+        self.weight_per_unit = weight_per_unit
+        self.volume_per_unit = volume_per_unit
+        self.box_dimensions = box_dimensions
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, ProductLine):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+
+class WaybillGroup:
+    """
+    Picking works shipped together on one waybill
+
+    Works are grouped by shipping date, delivery date, customer, delivery info
+    and destination.  The group holds the works' primary keys rather than the
+    rows themselves, so a picking's groups don't keep its rows in the session
+    and can outlive it (see SelectionPlanCache).
+    """
+
+    __slots__ = ("customer_code", "prefecture_code", "delivery_info1", "delivery_info2",
+                 "dest_name1", "dest_name2", "dest_postal", "dest_addr1", "dest_addr2", "dest_addr3",
+                 "jis_code", "shipping_date", "delivery_date", "products", "order_ids", "work_keys")
+
+    def __init__(self, customer_code: str = "", prefecture_code: str = "",
+                 delivery_info1: str = "", delivery_info2: str = "",
+                 dest_name1: str = "", dest_name2: str = "", dest_postal: str = "",
+                 dest_addr1: str = "", dest_addr2: str = "", dest_addr3: str = "",
+                 jis_code: Optional[str] = None, shipping_date: Optional[date] = None,
+                 delivery_date: Optional[date] = None, products: Optional[List[ProductLine]] = None,
+                 order_ids: Optional[List[Any]] = None, work_keys: Optional[List[WorkKey]] = None):
+        self.customer_code = customer_code
+        self.prefecture_code = prefecture_code
+        self.delivery_info1 = delivery_info1
+        self.delivery_info2 = delivery_info2
+        self.dest_name1 = dest_name1
+        self.dest_name2 = dest_name2
+        self.dest_postal = dest_postal
+        self.dest_addr1 = dest_addr1
+        self.dest_addr2 = dest_addr2
+        self.dest_addr3 = dest_addr3
+        self.jis_code = jis_code
+        self.shipping_date = shipping_date
+        self.delivery_date = delivery_date
+        self.products = [] if products is None else products
+        self.order_ids = [] if order_ids is None else order_ids
+        self.work_keys = [] if work_keys is None else work_keys
+
+    @property
+    def postal_code(self) -> str:
+        """Destination postal code, the one the JIS code is resolved from"""
+        return self.dest_postal
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+"""
+Carrier selection benchmark suite
+---------------------------------
+
+Runs the hot paths of carrier selection against a synthetic SQLite database
+and reports throughput, p50/p99 latency and database round trips per
+operation.  Results can be written as JSON and compared with a previous run
+to catch regressions.
+
+Usage:
+    python -m benchmarks.bench_selection
+    python -m benchmarks.bench_selection --json results.json
+    python -m benchmarks.bench_selection --baseline results.json --tolerance 0.25
+"""
+
+from typing import Any, Callable, Dict, List, Sequence
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import environment
+
+RUN_DB_PATH = os.path.join(environment.BENCHMARK_DIR, "bench_run.sqlite3")
+PAGE_SIZE = 50
+SIMULATION_BATCH_SIZE = 10
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of the given samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def measure(name: str, operation: Callable[[Any], Any], inputs: Sequence[Any],
+            iterations: int = 3, warmup: int = 1) -> Dict[str, Any]:
+    """
+    Run ``operation`` over all inputs and collect timing statistics
+
+    The first ``warmup`` passes are executed but not recorded.
+    """
+    from app.core.metrics import query_count
+
+    durations: List[float] = []
+    queries: List[int] = []
+    for iteration in range(warmup + iterations):
+        for item in inputs:
+            start_queries = query_count()
+            start = time.perf_counter()
+            operation(item)
+            elapsed = time.perf_counter() - start
+            if iteration >= warmup:
+                durations.append(elapsed)
+                queries.append(query_count() - start_queries)
+
+    total = sum(durations)
+    return {
+        "name": name,
+        "ops": len(durations),
+        "seconds": round(total, 6),
+        "throughput": round(len(durations) / total, 3) if total else 0.0,
+        "mean_ms": round(statistics.mean(durations) * 1000, 3) if durations else 0.0,
+        "p50_ms": round(percentile(durations, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(durations, 0.99) * 1000, 3),
+        "queries_per_op": round(sum(queries) / len(queries), 2) if queries else 0.0,
+    }
+
+
+def prepare_database(args) -> None:
+    """Generate the template database if needed and copy it for this run"""
+    if args.regenerate or not os.path.exists(args.db):
+        command = [
+            sys.executable, "-m", "benchmarks.synthetic_data",
+            "--db", args.db, "--pickings", str(args.pickings), "--seed", str(args.seed),
+        ]
+        subprocess.run(command, check=True, cwd=environment.PROJECT_ROOT)
+    shutil.copyfile(args.db, RUN_DB_PATH)
+
+
+def run_benchmarks(args) -> List[Dict[str, Any]]:
+    from app.db.base import SessionLocal
+    from app.models.picking import PickingManagement
+    from app.services.picking_service import get_pickings
+    from app.services.carrier_selection_service import (
+        CarrierSelectionService, select_carriers_for_picking, simulate_carrier_selection,
+        optimize_carrier_selection
+    )
+    from app.services.selection_plan_cache import selection_plan_cache
+    from app.services.master_data_cache import master_data_cache
+    from app.services.selection_memo import selection_memo
+
+    with SessionLocal() as db:
+        picking_ids = [row[0] for row in db.query(PickingManagement.HANCA11001).order_by(PickingManagement.HANCA11001)]
+    picking_ids = [int(picking_id) for picking_id in picking_ids[:args.limit_pickings]]
+    page_offsets = list(range(0, len(picking_ids), PAGE_SIZE)) or [0]
+    results = []
+
+    def list_pickings(skip):
+        with SessionLocal() as db:
+            get_pickings(db, skip=skip, limit=PAGE_SIZE)
+
+    results.append(measure("get_pickings", list_pickings, page_offsets, args.iterations, args.warmup))
+
+    def fetch_waybills(picking_id):
+        with SessionLocal() as db:
+            CarrierSelectionService(db).get_picking_waybills(picking_id)
+
+    results.append(measure("get_picking_waybills", fetch_waybills, picking_ids, args.iterations, args.warmup))
+
+    # Inputs for the per-waybill stages, computed once outside the timings
+    db = SessionLocal()
+    try:
+        service = CarrierSelectionService(db)
+        waybills = []
+        for picking_id in picking_ids:
+            for waybill in service.get_picking_waybills(picking_id):
+                jis_code = waybill.jis_code or service.fee_calculator.get_postal_to_jis_mapping(waybill.postal_code)
+                if waybill.products and jis_code:
+                    waybill.jis_code = jis_code
+                    waybills.append(waybill)
+
+        results.append(measure(
+            "calculate_package_metrics",
+            lambda waybill: service.calculate_package_metrics(waybill.products),
+            waybills, args.iterations, args.warmup,
+        ))
+
+        selection_inputs = []
+        for waybill in waybills:
+            parcels, volume, weight, max_size, parcels_info = service.calculate_package_metrics(waybill.products)
+            if parcels and volume and weight:
+                selection_inputs.append((waybill, parcels_info, float(volume), float(weight), float(max_size)))
+
+        cached_service = CarrierSelectionService(db, master_data=master_data_cache, memo=selection_memo)
+
+        def select_optimal(selection_input, fee_calculator=service.fee_calculator):
+            waybill, parcels_info, volume, weight, max_size = selection_input
+            fee_calculator.select_optimal_carrier(
+                jis_code=waybill.jis_code,
+                parcels=parcels_info,
+                volume=volume,
+                weight=weight,
+                size=max_size,
+                shipping_date=waybill.shipping_date,
+                delivery_deadline=waybill.delivery_date,
+            )
+
+        results.append(measure("select_optimal_carrier", select_optimal, selection_inputs, args.iterations, args.warmup))
+        results.append(measure(
+            "select_optimal_carrier_memo",
+            lambda selection_input: select_optimal(selection_input, cached_service.fee_calculator),
+            selection_inputs, args.iterations, args.warmup,
+        ))
+    finally:
+        db.close()
+
+    batches = [picking_ids[i:i + SIMULATION_BATCH_SIZE] for i in range(0, len(picking_ids), SIMULATION_BATCH_SIZE)]
+
+    def simulate(batch):
+        with SessionLocal() as db:
+            simulate_carrier_selection(db, batch)
+
+    results.append(measure("simulate_carrier_selection", simulate, batches, args.iterations, args.warmup))
+
+    def optimize(wave):
+        with SessionLocal() as db:
+            optimize_carrier_selection(db, wave)
+
+    results.append(measure("optimize_carrier_selection", optimize, [picking_ids], args.iterations, args.warmup))
+
+    if not args.skip_writes:
+        # Writes change the data, so every picking is selected exactly once,
+        # without reusing the groupings planned by the simulation above
+        selection_plan_cache.clear()
+        def select_for_picking(picking_id):
+            with SessionLocal() as db:
+                select_carriers_for_picking(db, picking_id)
+
+        results.append(measure("select_carriers_for_picking", select_for_picking, picking_ids, iterations=1, warmup=0))
+
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compare results against a baseline run
+
+    A benchmark regresses when its p50 grows by more than ``tolerance`` or it
+    issues more queries per operation than before (query counts are
+    deterministic for a given data set).
+    """
+    previous = {result["name"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result["name"])
+        if not before:
+            continue
+        if before["p50_ms"] and result["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{result['name']}: p50 {before['p50_ms']}ms -> {result['p50_ms']}ms")
+        if result["queries_per_op"] > before["queries_per_op"]:
+            regressions.append(f"{result['name']}: queries/op {before['queries_per_op']} -> {result['queries_per_op']}")
+    return regressions
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    header = f"{'benchmark':<28} {'ops':>6} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'queries/op':>11}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            f"{result['name']:<28} {result['ops']:>6} {result['throughput']:>10.1f} "
+            f"{result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['queries_per_op']:>11.2f}"
+        )
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark carrier selection against synthetic data")
+    parser.add_argument("--db", default=environment.DEFAULT_DB_PATH, help="Template database (generated if missing)")
+    parser.add_argument("--regenerate", action="store_true", help="Regenerate the template database")
+    parser.add_argument("--pickings", type=int, default=100, help="Pickings to generate")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the data generator")
+    parser.add_argument("--limit-pickings", type=int, default=50, help="Pickings used by the benchmarks")
+    parser.add_argument("--iterations", type=int, default=3, help="Measured passes per read benchmark")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured passes per read benchmark")
+    parser.add_argument("--skip-writes", action="store_true", help="Skip the full selection (write) benchmark")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with results from a previous --json run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p50 slowdown against the baseline")
+    parser.add_argument("--verbose", action="store_true", help="Keep the application's logging")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_arguments(argv)
+    prepare_database(args)
+    environment.configure(RUN_DB_PATH)
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    results = run_benchmarks(args)
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "arguments": vars(args),
+                "results": results,
+            }, output, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
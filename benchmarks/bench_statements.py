@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""
+Prebuilt statement micro-benchmark
+----------------------------------
+
+Times the hot lookups of carrier selection issued as the ``Query`` they used
+to be built from on every call, and through the prebuilt lambda statements of
+``app.db.statements``, against the same synthetic SQLite database.  The
+difference of the two is the per call cost of building, cache-keying and
+converting the ``Query`` and, for the master tables, of loading full ORM
+entities instead of the column records of ``app.db.records``.
+
+Usage:
+    python -m benchmarks.bench_statements
+    python -m benchmarks.bench_statements --calls 2000 --json statements.json
+"""
+
+from typing import Any, Dict, List
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import environment
+from benchmarks.bench_selection import measure
+
+
+def lookups(db) -> Dict[str, tuple]:
+    """
+    The lookups to compare, as name -> (query function, statement function, inputs)
+
+    Inputs are drawn from the database, so the lookups find rows.
+    """
+    from app.core.config import settings
+    from app.db import statements
+    from app.models.holiday_calendar_master import HolidayCalendarMaster
+    from app.models.juhachu import JuHachuHeader
+    from app.models.product_master import ProductMaster
+    from app.models.product_sub_master import ProductSubMaster
+    from app.models.special_capacity import SpecialCapacity
+    from app.models.special_lead_time_master import SpecialLeadTimeMaster
+    from app.models.transportation_capacity import TransportationCapacity
+    from app.models.transportation_fee import TransportationFee
+
+    fee_keys = db.query(TransportationFee.HANMA46002, TransportationFee.HANMA46003).distinct().limit(20).all()
+    product_codes = [row[0] for row in db.query(ProductMaster.HANM003001).limit(20)]
+    headers = db.query(JuHachuHeader.HANR004005, JuHachuHeader.HANR004004).limit(20).all()
+    carriers = [row[0] for row in db.query(TransportationCapacity.HANMA47001).limit(20)] or ["01"]
+    dates = [row[0] for row in db.query(HolidayCalendarMaster.HANMA04002).limit(20)] or [20250101]
+    lead_times = db.query(SpecialLeadTimeMaster.HANMA41001, SpecialLeadTimeMaster.HANMA41002,
+                          SpecialLeadTimeMaster.HANMA41003).limit(20).all() or [("01", "13", 20250101)]
+    unassigned = settings.CARRIER_UNASSIGNED_CODE
+
+    return {
+        "fee_records": (
+            lambda key: db.query(TransportationFee).filter(
+                TransportationFee.HANMA46002 == key[0]
+            ).filter(
+                TransportationFee.HANMA46003 == str(key[1])
+            ).order_by(TransportationFee.HANMA46001).all(),
+            lambda key: statements.fee_records(db, key[0], key[1]),
+            fee_keys,
+        ),
+        "product_info": (
+            lambda code: db.query(ProductMaster, ProductSubMaster).join(
+                ProductSubMaster, ProductMaster.HANM003001 == ProductSubMaster.HANMA33001
+            ).filter(
+                ProductMaster.HANM003001 == code,
+                ProductSubMaster.HANMA33001 == code
+            ).first(),
+            lambda code: statements.product_info(db, code),
+            product_codes,
+        ),
+        "order_header": (
+            lambda key: db.query(JuHachuHeader).filter(
+                JuHachuHeader.HANR004005 == key[0],
+                JuHachuHeader.HANR004004 == key[1]
+            ).filter(JuHachuHeader.HANR004A008 == unassigned).first(),
+            lambda key: statements.order_header(db, key[0], document_type=key[1], carrier_code=unassigned),
+            headers,
+        ),
+        "capacity": (
+            lambda carrier: (
+                db.query(TransportationCapacity).filter(TransportationCapacity.HANMA47001 == carrier).first(),
+                db.query(SpecialCapacity).filter(
+                    SpecialCapacity.HANMA48001 == carrier,
+                    SpecialCapacity.HANMA48002 == dates[0]
+                ).first(),
+            ),
+            lambda carrier: (
+                statements.capacity(db, carrier),
+                statements.special_capacity(db, carrier, dates[0]),
+            ),
+            carriers,
+        ),
+        "holiday": (
+            lambda date_int: db.query(HolidayCalendarMaster).filter(
+                HolidayCalendarMaster.HANMA04002 == date_int
+            ).first(),
+            lambda date_int: statements.holiday(db, date_int),
+            dates,
+        ),
+        "special_lead_time": (
+            lambda key: db.query(SpecialLeadTimeMaster).filter(
+                SpecialLeadTimeMaster.HANMA41001 == key[0],
+                SpecialLeadTimeMaster.HANMA41002 == key[1],
+                SpecialLeadTimeMaster.HANMA41003 == key[2]
+            ).first(),
+            lambda key: statements.special_lead_time(db, key[0], key[1], key[2]),
+            lead_times,
+        ),
+    }
+
+
+def run_benchmarks(args) -> List[Dict[str, Any]]:
+    from app.db.base import SessionLocal
+
+    results = []
+    with SessionLocal() as db:
+        for name, (query, statement, inputs) in lookups(db).items():
+            inputs = [inputs[i % len(inputs)] for i in range(args.calls)] if inputs else []
+            if not inputs:
+                continue
+            # Expire the identity map between passes so both sides load rows alike
+            before = measure(f"{name}_query", query, inputs, args.iterations, args.warmup)
+            db.expire_all()
+            after = measure(f"{name}_statement", statement, inputs, args.iterations, args.warmup)
+            db.expire_all()
+            before["saved_us_per_call"] = after["saved_us_per_call"] = round(
+                (before["mean_ms"] - after["mean_ms"]) * 1000, 1
+            )
+            results.extend([before, after])
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    header = f"{'benchmark':<28} {'ops':>6} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'saved us/call':>14}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            f"{result['name']:<28} {result['ops']:>6} {result['throughput']:>10.1f} "
+            f"{result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['saved_us_per_call']:>14.1f}"
+        )
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Compare per-call ORM Query lookups with the prebuilt statements")
+    parser.add_argument("--db", default=environment.DEFAULT_DB_PATH, help="Template database (see bench_selection)")
+    parser.add_argument("--calls", type=int, default=500, help="Lookups per pass")
+    parser.add_argument("--iterations", type=int, default=3, help="Measured passes per lookup")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured passes per lookup")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Keep the application's logging")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_arguments(argv)
+    if not os.path.exists(args.db):
+        print(f"{args.db} does not exist; generate it with python -m benchmarks.synthetic_data")
+        return 1
+    # Read-only, so the template database is used as is
+    environment.configure(args.db)
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    results = run_benchmarks(args)
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "arguments": vars(args),
+                "results": results,
+            }, output, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+Desktop startup benchmark
+-------------------------
+
+Launches ``main.py --startup-probe`` in fresh interpreters with
+``-X importtime`` and reports the time to first paint of the main window,
+plus the packages whose imports cost the most on the way there.  The backend
+import (``app.main``) is measured the same way, since it competes with the UI
+for the interpreter while the window comes up.
+
+The UI runs on Qt's offscreen platform unless QT_QPA_PLATFORM is set.
+
+Usage:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --json startup.json
+    python -m benchmarks.startup --baseline startup.json --tolerance 0.25
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import environment
+
+FIRST_PAINT_MARKER = "FIRST_PAINT"
+
+
+def import_time_by_package(stderr: str) -> Dict[str, int]:
+    """Self import time (us) summed per top-level package, from ``-X importtime`` output"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[0].strip().isdigit():
+            continue  # Header line
+        package = fields[2].strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(fields[0])
+    return totals
+
+
+def run_probe(command: List[str], env: Dict[str, str], marker: Optional[str]) -> Tuple[float, str]:
+    """
+    Run one fresh interpreter
+
+    Returns:
+        Seconds until the marker was printed (or the process exited), and stderr
+    """
+    started = time.time()
+    completed = subprocess.run(command, env=env, cwd=environment.PROJECT_ROOT,
+                               capture_output=True, text=True, timeout=120)
+    finished = time.time()
+    if marker is None:
+        if completed.returncode != 0:
+            raise RuntimeError(f"{' '.join(command)} failed:\n{completed.stderr[-2000:]}")
+        return finished - started, completed.stderr
+
+    for line in completed.stdout.splitlines():
+        if line.startswith(marker):
+            return float(line.split()[1]) - started, completed.stderr
+    raise RuntimeError(f"{' '.join(command)} never painted:\n{completed.stderr[-2000:]}")
+
+
+def measure(name: str, command: List[str], env: Dict[str, str], runs: int,
+            marker: Optional[str] = None, top: int = 10) -> Dict[str, Any]:
+    seconds = []
+    imports: Dict[str, List[int]] = {}
+    for _ in range(runs):
+        elapsed, stderr = run_probe(command, env, marker)
+        seconds.append(elapsed)
+        for module, cumulative in import_time_by_package(stderr).items():
+            imports.setdefault(module, []).append(cumulative)
+
+    slowest = sorted(
+        ((module, statistics.median(values) / 1000.0) for module, values in imports.items()),
+        key=lambda item: item[1], reverse=True
+    )[:top]
+    return {
+        "name": name,
+        "runs": runs,
+        "p50_ms": round(statistics.median(seconds) * 1000, 1),
+        "min_ms": round(min(seconds) * 1000, 1),
+        "max_ms": round(max(seconds) * 1000, 1),
+        "top_imports_ms": {module: round(ms, 1) for module, ms in slowest},
+    }
+
+
+def run_benchmarks(args) -> List[Dict[str, Any]]:
+    environment.configure(args.db)
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    python = [sys.executable, "-X", "importtime"]
+
+    results = []
+    if not args.skip_ui:
+        launcher = python + ["main.py", "--startup-probe"]
+        if args.no_backend:
+            launcher.append("--no-backend")
+        results.append(measure("first_paint", launcher, env, args.runs, FIRST_PAINT_MARKER, args.top))
+    if not args.skip_backend:
+        results.append(measure("backend_import", python + ["-c", "import app.main"], env, args.runs, top=args.top))
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """A measurement regresses when its p50 grows by more than ``tolerance``"""
+    previous = {result["name"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result["name"])
+        if before and before["p50_ms"] and result["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{result['name']}: p50 {before['p50_ms']}ms -> {result['p50_ms']}ms")
+    return regressions
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    header = f"{'measurement':<16} {'runs':>5} {'p50 ms':>9} {'min ms':>9} {'max ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(f"{result['name']:<16} {result['runs']:>5} {result['p50_ms']:>9.1f} "
+              f"{result['min_ms']:>9.1f} {result['max_ms']:>9.1f}")
+    for result in results:
+        print(f"\nSlowest packages to import before {result['name']} (median ms):")
+        for module, ms in result["top_imports_ms"].items():
+            print(f"  {module:<40} {ms:>9.1f}")
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the desktop app's cold start")
+    parser.add_argument("--db", default=environment.DEFAULT_DB_PATH, help="Database the backend is pointed at")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=10, help="Slowest packages to report")
+    parser.add_argument("--no-backend", action="store_true", help="Launch the UI without starting the backend")
+    parser.add_argument("--skip-ui", action="store_true", help="Skip the first paint measurement (needs PySide6)")
+    parser.add_argument("--skip-backend", action="store_true", help="Skip the backend import measurement")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with results from a previous --json run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p50 slowdown against the baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_arguments(argv)
+    results = run_benchmarks(args)
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "arguments": vars(args),
+                "results": results,
+            }, output, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+"""
+Synthetic master and picking data generator
+-------------------------------------------
+
+Fills a local SQLite database with deterministic, realistically shaped data
+for the benchmark suite: carriers with area/JIS mappings, fee tiers of all
+three fee types, capacities, lead times, a holiday calendar, postal→JIS
+mappings, products with 1–5 box sets, customers and pickings.
+
+Usage:
+    python -m benchmarks.synthetic_data --db benchmarks/bench.sqlite3 --pickings 200
+"""
+
+from dataclasses import dataclass, asdict
+from datetime import date, timedelta
+from typing import Any, Dict, List
+import argparse
+import os
+import random
+import sys
+import time
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import environment
+
+UNASSIGNED_CARRIER = "95"
+DOCUMENT_TYPE = 1
+COMPANY_CODE = "01"
+TIMESTAMP = 20250401000000.0
+
+# (max size cm, base fee) rows of a per-parcel (type 3) fee table
+PARCEL_TIERS = [(60, 450), (80, 490), (100, 530), (120, 650), (140, 780), (160, 900)]
+
+
+@dataclass
+class DatasetSpec:
+    """Sizes of the generated data set"""
+    carriers: int = 8
+    jis_codes: int = 400
+    carrier_coverage: float = 0.85     # Share of prefectures each carrier serves
+    postal_codes_per_jis: int = 3
+    products: int = 1000
+    customers: int = 100
+    staff: int = 10
+    pickings: int = 100
+    orders_per_picking: int = 12
+    lines_per_order: int = 4
+    destinations_per_picking: int = 6
+    special_capacity_days: int = 10
+    special_lead_times: int = 50
+    base_date: date = date(2025, 4, 1)
+    seed: int = 42
+
+
+def _is_numeric(column) -> bool:
+    from sqlalchemy import Numeric, Integer
+    return isinstance(column.type, (Numeric, Integer))
+
+
+def _complete_row(table, values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Give every column of the row a literal value
+
+    SQL Server expression defaults (timestamps via SYSDATETIME/getdate) don't
+    exist in SQLite, so those columns always get a literal value; all rows
+    of one insert must also share the same keys.
+    """
+    row = dict(values)
+    for column in table.columns:
+        if column.name in row:
+            continue
+        default = column.default
+        expression_default = column.server_default is not None or (
+            default is not None and getattr(default, "is_clause_element", False)
+        )
+        if expression_default:
+            if column.name.endswith(("INS", "UPD")):
+                row[column.name] = TIMESTAMP
+            else:
+                row[column.name] = 0 if _is_numeric(column) else ""
+        elif default is not None and getattr(default, "is_scalar", False):
+            row[column.name] = default.arg
+        elif not column.nullable:
+            row[column.name] = 0 if _is_numeric(column) else ""
+        else:
+            row[column.name] = None
+    return row
+
+
+def _insert(session, model, rows: List[Dict[str, Any]]) -> int:
+    if not rows:
+        return 0
+    table = model.__table__
+    session.execute(table.insert(), [_complete_row(table, row) for row in rows])
+    return len(rows)
+
+
+def _date_int(value: date) -> int:
+    return int(value.strftime("%Y%m%d"))
+
+
+def generate(session, spec: DatasetSpec) -> Dict[str, int]:
+    """
+    Insert a complete synthetic data set
+
+    Returns:
+        Row counts per table
+    """
+    from app.models.customer import Customer
+    from app.models.personal import Personal
+    from app.models.picking import PickingManagement, PickingDetail, PickingWork
+    from app.models.juhachu import JuHachuHeader, MeisaiKakucho
+    from app.models.product_master import ProductMaster
+    from app.models.product_sub_master import ProductSubMaster
+    from app.models.holiday_calendar_master import HolidayCalendarMaster
+    from app.models.special_lead_time_master import SpecialLeadTimeMaster
+    from app.models.transportation_company_master import TransportationCompanyMaster
+    from app.models.transportation_company_sub_master import TransportationCompanySubMaster
+    from app.models.transportation_area import TransportationArea
+    from app.models.transportation_area_jis import TransportationAreaJISMapping
+    from app.models.transportation_fee import TransportationFee
+    from app.models.transportation_capacity import TransportationCapacity
+    from app.models.special_capacity import SpecialCapacity
+    from app.models.postal_jis_mapping import PostalJISMapping
+
+    rng = random.Random(spec.seed)
+    counts: Dict[str, int] = {}
+
+    # Carriers ("95" is reserved for the unassigned carrier code)
+    carrier_codes = [code for code in (f"{n:02d}" for n in range(1, 100)) if code != UNASSIGNED_CARRIER][:spec.carriers]
+    counts["carriers"] = _insert(session, TransportationCompanyMaster, [
+        {"HANMA02001": code, "HANMA02002": f"運送会社{code}"} for code in carrier_codes
+    ])
+
+    # JIS codes spread over the 47 prefectures, each with a few postal codes
+    jis_codes = [f"{(n % 47) + 1:02d}{(n // 47) + 101:03d}" for n in range(spec.jis_codes)]
+    postal_rows = []
+    postal_codes_by_jis: Dict[str, List[str]] = {}
+    for index, jis_code in enumerate(jis_codes):
+        postal_codes = [f"{index * spec.postal_codes_per_jis + k + 1000000:07d}" for k in range(spec.postal_codes_per_jis)]
+        postal_codes_by_jis[jis_code] = postal_codes
+        postal_rows.extend({"HANMA45001": jis_code, "HANMA45002": postal} for postal in postal_codes)
+    counts["postal_codes"] = _insert(session, PostalJISMapping, postal_rows)
+
+    # One area per carrier and served prefecture, fee tables per area
+    area_rows, area_jis_rows, fee_rows = [], [], []
+    fee_number = 0
+    for carrier_index, carrier in enumerate(carrier_codes):
+        fee_type = (3, 1, 2)[carrier_index % 3]
+        served = sorted(rng.sample(range(1, 48), max(1, int(47 * spec.carrier_coverage))))
+        for prefecture in served:
+            area_code = f"A{carrier}{prefecture:02d}"
+            area_rows.append({"HANMA43001": area_code, "HANMA43002": f"エリア{area_code}", "HANMA43003": prefecture})
+            area_jis_rows.extend(
+                {"HANMA44001": area_code, "HANMA44002": jis_code}
+                for jis_code in jis_codes if int(jis_code[:2]) == prefecture
+            )
+            distance_factor = 1.0 + abs(prefecture - 13) / 47.0 + carrier_index * 0.03
+            if fee_type == 3:
+                tiers = [(size, round(fee * distance_factor)) for size, fee in PARCEL_TIERS]
+            elif fee_type == 1:
+                tiers = [(0, round(1800 * distance_factor))]
+            else:
+                tiers = [(0, round(600 * distance_factor))]
+            for max_size, base_fee in tiers:
+                fee_number += 1
+                fee_rows.append({
+                    "HANMA46001": f"F{fee_number:09d}",
+                    "HANMA46002": carrier,
+                    "HANMA46003": area_code,
+                    "HANMA46004": 30 if fee_type == 3 else 0,
+                    "HANMA46005": 0,
+                    "HANMA46006": max_size,
+                    "HANMA46007": round(45 * distance_factor) if fee_type == 2 else 0,
+                    "HANMA46008": 2 if fee_type == 2 else 0,
+                    "HANMA46009": base_fee,
+                    "HANMA46010": fee_type,
+                })
+    counts["areas"] = _insert(session, TransportationArea, area_rows)
+    counts["area_jis_mappings"] = _insert(session, TransportationAreaJISMapping, area_jis_rows)
+    counts["fees"] = _insert(session, TransportationFee, fee_rows)
+
+    # Capacities, lead times and the holiday calendar
+    counts["capacities"] = _insert(session, TransportationCapacity, [
+        {"HANMA47001": carrier, "HANMA47002": rng.choice([0, 2000, 5000, 20000]),
+         "HANMA47003": rng.choice([0, 20000, 50000]), "HANMA47004": 8}
+        for carrier in carrier_codes if rng.random() < 0.75
+    ])
+    counts["special_capacities"] = _insert(session, SpecialCapacity, [
+        {"HANMA48001": carrier, "HANMA48002": _date_int(spec.base_date + timedelta(days=day)),
+         "HANMA48003": rng.choice([500, 1000]), "HANMA48004": rng.choice([5000, 10000])}
+        for carrier in carrier_codes
+        for day in sorted(rng.sample(range(60), min(60, spec.special_capacity_days)))
+    ])
+    counts["carrier_lead_times"] = _insert(session, TransportationCompanySubMaster, [
+        {"HANMA03001": carrier, "HANMA03002": 1, "HANMA03003": f"{prefecture:02d}",
+         "HANMA03004": 1 + (abs(prefecture - 13) // 12) + (carrier_index % 2)}
+        for carrier_index, carrier in enumerate(carrier_codes)
+        for prefecture in range(1, 48)
+    ])
+    special_lead_time_keys = {
+        (rng.choice(carrier_codes), f"{rng.randint(1, 47):02d}", rng.randrange(60))
+        for _ in range(spec.special_lead_times)
+    }
+    counts["special_lead_times"] = _insert(session, SpecialLeadTimeMaster, [
+        {"HANMA41001": carrier, "HANMA41002": prefecture,
+         "HANMA41003": _date_int(spec.base_date + timedelta(days=day)),
+         "HANMA41004": _date_int(spec.base_date + timedelta(days=day + 4))}
+        for carrier, prefecture, day in sorted(special_lead_time_keys)
+    ])
+    holidays = [
+        spec.base_date + timedelta(days=day) for day in range(120)
+        if (spec.base_date + timedelta(days=day)).weekday() == 6 or day in (28, 33, 34, 35)
+    ]
+    counts["holidays"] = _insert(session, HolidayCalendarMaster, [
+        {"HANMA04001": COMPANY_CODE, "HANMA04002": _date_int(holiday), "HANMA04003": 0}
+        for holiday in holidays
+    ])
+
+    # Products with 1–5 box sets; half carry a direct volume, half only dimensions
+    product_rows, product_sub_rows, product_codes = [], [], []
+    for n in range(spec.products):
+        code = 100000 + n
+        product_codes.append(code)
+        set_parcel_count = rng.choices([1, 2, 3, 4, 5], weights=[70, 15, 8, 4, 3])[0]
+        product_rows.append({
+            "HANM003001": code,
+            "HANM003002": f"商品{code}",
+            "HANM003004": "個",
+            "HANM003K007": "1",
+            "HANM003K008": str(rng.choice([1, 2, 4, 6, 12, 24])),
+            "HANM003A005": set_parcel_count,
+            "HANM003A007": rng.randint(200, 15000),
+            "HANM003A107": round(rng.uniform(0.05, 0.9), 6) if n % 2 else 0,
+        })
+        sub_row = {"HANMA33001": code}
+        for box in range(set_parcel_count):
+            offset = 22 + box * 5  # 外箱nW / D / H / GW
+            sub_row[f"HANMA330{offset}"] = rng.randint(150, 600)
+            sub_row[f"HANMA330{offset + 1}"] = rng.randint(100, 450)
+            sub_row[f"HANMA330{offset + 2}"] = rng.randint(50, 400)
+            sub_row[f"HANMA330{offset + 3}"] = rng.randint(500, 20000)
+        product_sub_rows.append(sub_row)
+    counts["products"] = _insert(session, ProductMaster, product_rows)
+    _insert(session, ProductSubMaster, product_sub_rows)
+
+    # Staff and customers
+    staff_codes = [f"S{n:07d}" for n in range(spec.staff)]
+    counts["staff"] = _insert(session, Personal, [
+        {"HANM004001": code, "HANM004003": f"担当{n}"} for n, code in enumerate(staff_codes)
+    ])
+    customer_codes = [f"C{n:010d}" for n in range(spec.customers)]
+    counts["customers"] = _insert(session, Customer, [
+        {"HANM001003": code, "HANM001006": f"得意先{n}", "HANM001015": staff_codes[n % len(staff_codes)]}
+        for n, code in enumerate(customer_codes)
+    ])
+
+    # Pickings: orders grouped onto a handful of destinations per picking
+    management_rows, detail_rows, work_rows, header_rows, meisai_rows = [], [], [], [], []
+    order_number = 500000
+    for p in range(spec.pickings):
+        picking_id = 1000 + p
+        shipping_date = spec.base_date + timedelta(days=p % 30)
+        customer = customer_codes[p % len(customer_codes)]
+        destinations = []
+        for _ in range(spec.destinations_per_picking):
+            jis_code = rng.choice(jis_codes)
+            destinations.append({
+                "postal": rng.choice(postal_codes_by_jis[jis_code]),
+                "prefecture": jis_code[:2],
+                "name": f"納品先{rng.randint(1, 9999)}",
+                "address": f"住所{rng.randint(1, 9999)}",
+                "deadline": shipping_date + timedelta(days=rng.choice([2, 3, 5, 7])),
+            })
+
+        first_order = order_number + 1
+        for _ in range(spec.orders_per_picking):
+            order_number += 1
+            destination = rng.choice(destinations)
+            header_rows.append({
+                "HANR004001": 1,
+                "HANR004002": customer,
+                "HANR004004": DOCUMENT_TYPE,
+                "HANR004005": order_number,
+                "HANR004006": destination["deadline"].strftime("%Y%m%d"),
+                "HANR004015": shipping_date.strftime("%Y%m%d"),
+                "HANR004A008": UNASSIGNED_CARRIER,
+                "HANR004A009": rng.choice([1, 2]),  # 納期情報1/2 are NOT NULL on the waybill
+                "HANR004A010": rng.choice([1, 2]),
+                "HANR004A031": destination["prefecture"],
+                "HANR004A035": destination["name"],
+                "HANR004A037": destination["postal"],
+                "HANR004A039": destination["address"],
+            })
+            meisai_rows.append({
+                "HANR030001": 2, "HANR030002": DOCUMENT_TYPE, "HANR030003": 0,
+                "HANR030004": order_number, "HANR030005": 0,
+            })
+            for line in range(1, spec.lines_per_order + 1):
+                work_rows.append({
+                    "HANW002001": DOCUMENT_TYPE,
+                    "HANW002002": order_number,
+                    "HANW002003": line,
+                    "HANW002009": picking_id,
+                    "HANW002030": str(rng.choice(product_codes)),
+                    "HANW002041": rng.choice([1, 2, 3, 5, 8, 12, 24, 30]),
+                    "HANW002A003": UNASSIGNED_CARRIER,
+                })
+
+        management_rows.append({"HANCA11001": picking_id, "HANCA11002": 0})
+        detail_rows.append({
+            "HANC016001": picking_id,
+            "HANC016002": _date_int(shipping_date - timedelta(days=1)),
+            "HANC016003": 90000 + p,
+            "HANC016014": _date_int(shipping_date),
+            "HANC016A001": first_order,
+            "HANC016A002": order_number,
+            "HANC016A003": customer,
+            "HANC016A004": customer,
+        })
+
+    counts["pickings"] = _insert(session, PickingManagement, management_rows)
+    _insert(session, PickingDetail, detail_rows)
+    counts["orders"] = _insert(session, JuHachuHeader, header_rows)
+    _insert(session, MeisaiKakucho, meisai_rows)
+    counts["picking_works"] = _insert(session, PickingWork, work_rows)
+
+    session.commit()
+    return counts
+
+
+def create_database(db_path: str, spec: DatasetSpec) -> Dict[str, int]:
+    """
+    (Re)create the SQLite file at ``db_path`` and fill it
+
+    The app engine binds to ``DATABASE_URL`` at import time, so this must run
+    in a process that hasn't imported ``app`` for a different database yet.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    environment.configure(db_path)
+
+    import app.models  # noqa: F401 - registers the core tables
+    from app.db.base import Base, engine, SessionLocal
+    from app.models import (  # noqa: F401 - register the remaining tables
+        holiday_calendar_master, special_lead_time_master, transportation_company_master,
+        transportation_company_sub_master, special_capacity, product_master, product_sub_master, juhachu
+    )
+
+    environment.adapt_server_defaults(Base.metadata)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        return generate(session, spec)
+    finally:
+        session.close()
+
+
+def parse_arguments(argv=None):
+    defaults = DatasetSpec()
+    parser = argparse.ArgumentParser(description="Generate a synthetic SQLite database for benchmarks")
+    parser.add_argument("--db", default=environment.DEFAULT_DB_PATH, help="SQLite file to (re)create")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--carriers", type=int, default=defaults.carriers)
+    parser.add_argument("--jis-codes", type=int, default=defaults.jis_codes)
+    parser.add_argument("--products", type=int, default=defaults.products)
+    parser.add_argument("--customers", type=int, default=defaults.customers)
+    parser.add_argument("--pickings", type=int, default=defaults.pickings)
+    parser.add_argument("--orders-per-picking", type=int, default=defaults.orders_per_picking)
+    parser.add_argument("--lines-per-order", type=int, default=defaults.lines_per_order)
+    parser.add_argument("--destinations-per-picking", type=int, default=defaults.destinations_per_picking)
+    return parser.parse_args(argv)
+
+
+def spec_from_arguments(args) -> DatasetSpec:
+    return DatasetSpec(
+        carriers=args.carriers,
+        jis_codes=args.jis_codes,
+        products=args.products,
+        customers=args.customers,
+        pickings=args.pickings,
+        orders_per_picking=args.orders_per_picking,
+        lines_per_order=args.lines_per_order,
+        destinations_per_picking=args.destinations_per_picking,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    spec = spec_from_arguments(args)
+
+    print(f"Generating synthetic data into {args.db}: {asdict(spec)}")
+    start = time.perf_counter()
+    counts = create_database(args.db, spec)
+    elapsed = time.perf_counter() - start
+
+    for table, count in counts.items():
+        print(f"  {table:<20} {count:>8}")
+    print(f"Done in {elapsed:.2f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
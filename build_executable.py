@@ -14,75 +14,41 @@ def get_platform_specific_settings():
     """Get platform-specific settings for the build."""
     system = platform.system()
     settings = {
+        # Only modules PyInstaller cannot find by itself: uvicorn picks its
+        # loop/protocol implementations and the app by name at runtime, and
+        # SQLAlchemy loads the dialect from the URL
         'hidden_imports': [
-            # FastAPI and dependencies
-            'fastapi',
-            'fastapi.middleware',
-            'fastapi.middleware.cors',
-            'pydantic',
-            'pydantic_core',
-            'pydantic_settings',
-            'pydantic.json',
-            'starlette',
-            'starlette.middleware',
-            'starlette.middleware.cors',
-            'starlette.responses',
-            'starlette.routing',
-            'starlette.applications',
-            'starlette.types',
-            'starlette.datastructures',
-            'starlette.background',
-            'starlette.concurrency',
-            'starlette.config',
-            'starlette.exceptions',
-            'starlette.staticfiles',
-            'starlette.templating',
-            'starlette.websockets',
-            # Uvicorn and dependencies
-            'uvicorn',
             'uvicorn.logging',
-            'uvicorn.loops',
             'uvicorn.loops.auto',
-            'uvicorn.protocols',
-            'uvicorn.protocols.http',
+            'uvicorn.loops.asyncio',
             'uvicorn.protocols.http.auto',
-            'uvicorn.protocols.websockets',
-            'uvicorn.protocols.websockets.auto',
-            'uvicorn.lifespan',
-            'uvicorn.lifespan.on',
-            'uvicorn.lifespan.off',
             'uvicorn.protocols.http.h11_impl',
-            'uvicorn.protocols.http.httptools_impl',
-            'uvicorn.protocols.websockets.websockets_impl',
-            'uvicorn.protocols.websockets.wsproto_impl',
-            # SQLAlchemy and database
-            'sqlalchemy',
-            'sqlalchemy.ext.declarative',
-            'sqlalchemy.orm',
-            'pymysql',
-            # Request handling
-            'requests',
-            # UI components
-            'PySide6',
-            'PySide6.sip',
-            'PySide6.QtCore',
-            'PySide6.QtGui',
-            'PySide6.QtWidgets',
-            'PySide6.QtNetwork',
-            # App modules
-            'app',
+            'uvicorn.lifespan.on',
+            'sqlalchemy.dialects.mssql.pyodbc',
+            'pyodbc',
             'app.main',
-            'app.database',
-            'app.models',
-            'app.routers',
-            'app.schemas',
-            'app.services',
-            'app.utils'
         ]
     }
     return settings
 
 
+# Large packages that are never imported at runtime
+EXCLUDED_MODULES = [
+    'numpy',
+    'tkinter',
+    'PySide6.QtNetwork',
+    'PySide6.QtQml',
+    'PySide6.QtQuick',
+    'PySide6.QtWebEngineCore',
+    'PySide6.QtWebEngineWidgets',
+    'PySide6.QtMultimedia',
+    'PySide6.Qt3DCore',
+    'PySide6.QtCharts',
+    'PySide6.QtPdf',
+    'uvicorn.protocols.websockets',
+]
+
+
 def get_platform_specific_extensions():
     """Get platform-specific executable extensions and launcher extensions."""
     system = platform.system()
@@ -132,12 +98,10 @@ def create_spec_file(platform, debug=False, onefile=True):
     """Create a PyInstaller spec file for the given platform."""
     # Get the absolute paths
     main_script = os.path.abspath('main.py')
-    app_dir = os.path.abspath('app')
     
     # Fix path for Windows
     if platform == 'Windows':
         main_script = main_script.replace('\\', '\\\\')
-        app_dir = app_dir.replace('\\', '\\\\')
     
     # Get platform-specific settings
     platform_ext = get_platform_specific_extensions()
@@ -217,12 +181,13 @@ a = Analysis(
     ['{main_script}'],
     pathex=[os.path.abspath('.')],
     binaries=[],
-    datas=[("{app_dir}", "app")],
+    # The app package is collected through its imports, not copied as data
+    datas=[],
     hiddenimports={get_platform_specific_settings()['hidden_imports'] + platform_specific_imports},
     hookspath=[],
     hooksconfig={{}},
     runtime_hooks=[],
-    excludes=[],
+    excludes={EXCLUDED_MODULES},
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
@@ -9,11 +9,12 @@ import os
 import threading
 import time
 import argparse
-import requests
 
 # Make sure we can import from the app and ui directories
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+READY_URL = "http://localhost:8000/ready"
+
 def parse_arguments():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description="Shipping Application")
@@ -21,28 +22,38 @@ def parse_arguments():
                         help="URL of the FastAPI backend")
     parser.add_argument("--no-backend", action="store_true", 
                         help="Don't start the backend server")
+    parser.add_argument("--transport", choices=["http", "inprocess"],
+                        help="How the UI calls the backend (default: inprocess when the backend runs here, else http)")
+    parser.add_argument("--backend-timeout", type=float, default=120,
+                        help="Seconds to wait for the backend to finish warming up")
+    parser.add_argument("--startup-probe", action="store_true",
+                        help="Print the time of the first paint and exit (used by benchmarks/startup.py)")
     return parser.parse_args()
 
-def wait_for_backend(url, timeout=10, interval=0.2):
+def wait_for_backend(url, timeout=120, interval=0.2):
     """Poll the backend until it responds or times out."""
+    # urllib instead of requests: the launcher should not pay for importing it
+    import urllib.request
+    import urllib.error
+
     start_time = time.time()
 
     while True:
         try:
-            response = requests.get(url, timeout=1)
-            if response.status_code == 200:
-                print("✅ Backend is up and running")
-                return True
-        except requests.RequestException:
-            pass  # Ignore and retry
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    print("✅ Backend is up and running")
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass  # Not listening yet, or still warming up (503); retry
 
-        # if time.time() - start_time > timeout:
-        #     print("❌ Timed out waiting for backend to start")
-        #     return False
+        if timeout is not None and time.time() - start_time > timeout:
+            print("❌ Timed out waiting for backend to start")
+            return False
 
         time.sleep(interval)
 
-def start_backend():
+def start_backend(timeout=120):
     """Start the FastAPI backend server in a thread and wait for it to be ready"""
     try:
         import uvicorn
@@ -58,7 +69,8 @@ def start_backend():
         )
         backend_thread.start()
 
-        backend_ready = wait_for_backend("http://localhost:8000")
+        # /ready answers 200 once the pool and caches are warm
+        backend_ready = wait_for_backend(READY_URL, timeout)
         return backend_ready
     except Exception as e:
         print(f"Error starting backend server: {e}")
@@ -70,17 +82,15 @@ def main():
 
     # Set environment variable for the backend URL
     os.environ["BACKEND_URL"] = args.backend_url
+    # A backend started here is called directly instead of over localhost HTTP
+    os.environ["BACKEND_TRANSPORT"] = args.transport or ("http" if args.no_backend else "inprocess")
 
-    # Start the backend if not disabled
-    if not args.no_backend:
-        if not start_backend():
-            print("Failed to start backend server. Exiting.")
-            sys.exit(1)
-
-    # Import and start the UI
+    # Import and start the UI; the window is shown first and the backend
+    # starts and warms up behind it
     print("============= Starting UI =============")
     from ui.main_window import main as start_ui
-    start_ui()
+    backend_starter = None if args.no_backend else (lambda: start_backend(args.backend_timeout))
+    start_ui(start_backend=backend_starter, startup_probe=args.startup_probe)
 
 if __name__ == "__main__":
     main()
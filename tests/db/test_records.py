@@ -0,0 +1,42 @@
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.db.records import FEE, SPECIAL_LEAD_TIME, product_box_columns
+from app.models.special_lead_time_master import SpecialLeadTimeMaster
+
+
+class TestRecords(unittest.TestCase):
+    def test_decimals_are_converted_once_at_load(self):
+        fee = FEE.make(("F001", "01", "1001", Decimal("30"), None, Decimal("60"),
+                        Decimal("0"), Decimal("0"), Decimal("450"), Decimal("3")))
+
+        self.assertEqual(fee.HANMA46002, "01")
+        self.assertIsNone(fee.HANMA46005)
+        self.assertEqual((fee.HANMA46006, fee.HANMA46009, fee.HANMA46010), (60, 450, 3))
+        self.assertIsInstance(fee.HANMA46009, int)
+
+    def test_read_selects_only_the_record_columns(self):
+        engine = create_engine("sqlite://")
+        SpecialLeadTimeMaster.__table__.create(engine)
+        with engine.begin() as connection:
+            connection.execute(SpecialLeadTimeMaster.__table__.insert(), [
+                {"HANMA41001": "01", "HANMA41002": "13", "HANMA41003": 20250105, "HANMA41004": 20250107,
+                 "HANMA41INS": 0, "HANMA41UPD": 0, "HANMA41999": 1},
+            ])
+        with Session(bind=engine) as db:
+            records = SPECIAL_LEAD_TIME.read(db, SpecialLeadTimeMaster.HANMA41001 == "01")
+        engine.dispose()
+
+        self.assertEqual([tuple(record) for record in records], [("01", "13", 20250105, 20250107)])
+        self.assertFalse(hasattr(records[0], "HANMA41999"))
+
+    def test_product_box_columns(self):
+        self.assertEqual(product_box_columns(1), ["HANMA33022", "HANMA33023", "HANMA33024"])
+        self.assertEqual(product_box_columns(2), ["HANMA33027", "HANMA33028", "HANMA33029"])
+
+
+if __name__ == "__main__":
+    unittest.main()
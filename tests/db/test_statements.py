@@ -0,0 +1,53 @@
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.db import statements
+from app.models.holiday_calendar_master import HolidayCalendarMaster
+from app.models.special_lead_time_master import SpecialLeadTimeMaster
+
+
+class TestStatements(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        HolidayCalendarMaster.__table__.create(self.engine)
+        SpecialLeadTimeMaster.__table__.create(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(HolidayCalendarMaster.__table__.insert(), [
+                {"HANMA04001": "1", "HANMA04002": 20250101, "HANMA04003": 0, "HANMA04999": 1},
+            ])
+            connection.execute(SpecialLeadTimeMaster.__table__.insert(), [
+                {"HANMA41001": "01", "HANMA41002": "13", "HANMA41003": 20250105, "HANMA41004": 20250107,
+                 "HANMA41INS": 0, "HANMA41UPD": 0, "HANMA41999": 1},
+                {"HANMA41001": "02", "HANMA41002": "13", "HANMA41003": 20250105, "HANMA41004": 20250108,
+                 "HANMA41INS": 0, "HANMA41UPD": 0, "HANMA41999": 1},
+            ])
+        self.db = Session(bind=self.engine)
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
+
+    def test_cached_statements_bind_the_values_of_each_call(self):
+        self.assertIsNotNone(statements.holiday(self.db, 20250101))
+        self.assertIsNone(statements.holiday(self.db, 20250102))
+
+        first = statements.special_lead_time(self.db, "01", "13", 20250105)
+        second = statements.special_lead_time(self.db, "02", "13", 20250105)
+        self.assertEqual((first.HANMA41004, second.HANMA41004), (20250107, 20250108))
+        self.assertIsNone(statements.special_lead_time(self.db, "01", "27", 20250105))
+
+    def test_statements_are_compiled_once(self):
+        compiled_cache = {}
+        with self.engine.connect().execution_options(compiled_cache=compiled_cache) as connection:
+            db = Session(bind=connection)
+            for date_int in (20250101, 20250102, 20250103):
+                statements.holiday(db, date_int)
+            db.close()
+
+        self.assertEqual(len(compiled_cache), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
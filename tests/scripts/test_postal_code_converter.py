@@ -0,0 +1,150 @@
+import csv
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future
+
+from sqlalchemy import create_engine, inspect, select, MetaData, Table, Column, CHAR, DECIMAL
+from sqlalchemy.pool import StaticPool
+
+from app.models.postal_jis_mapping import PostalJISMapping
+from app.scripts import postal_code_converter as converter
+
+
+def write_japan_post_csv(path, rows):
+    """Write (postal code, prefecture, city, town) rows in Japan Post's KEN_ALL layout"""
+    with open(path, "w", encoding="utf-8", newline="") as outfile:
+        writer = csv.writer(outfile)
+        for postal_code, prefecture, city, town in rows:
+            writer.writerow(["00000", postal_code[:3], postal_code, "", "", "", prefecture, city, town,
+                             0, 0, 0, 0, 0, 0])
+
+
+class RecordingExecutor:
+    """Runs submitted tasks right away and counts them"""
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, function, item):
+        self.submitted += 1
+        future = Future()
+        future.set_result(function(item))
+        return future
+
+
+class TestPostalRecords(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_file = os.path.join(self.directory.name, "utf_ken_all.csv")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_records_are_deduplicated_across_chunks_and_workers(self):
+        write_japan_post_csv(self.input_file, [
+            ("0600000", "北海道", "札幌市中央区", "以下に掲載がない場合"),
+            ("0640941", "北海道", "札幌市中央区", "旭ケ丘"),
+            ("0640941", "北海道", "札幌市中央区", "旭ケ丘（番地）"),
+            ("1000001", "東京都", "千代田区", "千代田"),
+            ("0600000", "北海道", "札幌市中央区", "重複"),
+        ])
+
+        records = list(converter.iter_postal_records(self.input_file, workers=2, chunk_size=1))
+
+        self.assertEqual([record[:2] for record in records],
+                         [["0600000", "01101"], ["0640941", "01101"], ["1000001", "13101"]])
+        self.assertEqual(records[1][4], "旭ケ丘")
+        self.assertEqual(records, list(converter.iter_postal_records(self.input_file, workers=1, chunk_size=2)))
+
+    def test_bounded_map_keeps_order_with_a_window_of_tasks(self):
+        executor = RecordingExecutor()
+        results = converter._bounded_map(executor, lambda item: item * 10, iter(range(10)), 3)
+
+        self.assertEqual(next(results), 0)
+        self.assertEqual(executor.submitted, 3)
+        self.assertEqual(list(results), [10, 20, 30, 40, 50, 60, 70, 80, 90])
+
+
+class TestPostalMappingUpdates(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+        # Same columns as the mapping table, without its SQL Server defaults
+        Table(PostalJISMapping.__tablename__, MetaData(),
+              Column("HANMA45001", CHAR(5), primary_key=True), Column("HANMA45002", CHAR(10), primary_key=True),
+              Column("HANMA45999", DECIMAL(9, 0)), Column("HANMA45INS", DECIMAL(20, 6)),
+              Column("HANMA45UPD", DECIMAL(20, 6))).create(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(PostalJISMapping.__table__.insert(), [
+                {"HANMA45001": "01101", "HANMA45002": "0600000", "HANMA45999": 1},
+                {"HANMA45001": "01101", "HANMA45002": "0640941", "HANMA45999": 1},
+                {"HANMA45001": "13101", "HANMA45002": "1000001", "HANMA45999": 1},
+            ])
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def rows(self):
+        mapping = PostalJISMapping.__table__
+        with self.engine.connect() as connection:
+            return {
+                postal_code.strip(): (jis_code.strip(), int(update_number), updated_at)
+                for jis_code, postal_code, update_number, updated_at in connection.execute(select(
+                    mapping.c.HANMA45001, mapping.c.HANMA45002, mapping.c.HANMA45999, mapping.c.HANMA45UPD
+                ))
+            }
+
+    def csv_file(self, name, rows):
+        path = os.path.join(self.directory.name, name)
+        write_japan_post_csv(path, rows)
+        return path
+
+    def test_full_load_replaces_the_table(self):
+        records = iter([
+            ["0600000", "01101", "北海道", "札幌市中央区", ""],
+            ["1500001", "13113", "東京都", "渋谷区", "神宮前"],
+        ])
+
+        count = converter.load_postal_mapping(self.engine, records, batch_size=1)
+
+        self.assertEqual(count, 2)
+        self.assertEqual({code: row[:2] for code, row in self.rows().items()},
+                         {"0600000": ("01101", 2), "1500001": ("13113", 2)})
+        self.assertFalse(inspect(self.engine).has_table(converter.STAGING_TABLE))
+
+    def test_add_and_delete_files(self):
+        add_file = self.csv_file("ADD_2501.CSV", [
+            ("0640941", "北海道", "旭川市", "旭ケ丘"),
+            ("1500001", "東京都", "渋谷区", "神宮前"),
+        ])
+        delete_file = self.csv_file("DEL_2501.CSV", [
+            ("0640941", "北海道", "札幌市中央区", "旭ケ丘"),
+            ("1000001", "東京都", "千代田区", "千代田"),
+        ])
+
+        inserts, updates, deletes = converter.postal_diff_from_files(self.engine, add_file, delete_file)
+
+        # In both files it moved; only in the delete file it is gone
+        self.assertEqual(inserts, [("13113", "1500001")])
+        self.assertEqual(updates, [("01201", "0640941")])
+        self.assertEqual(deletes, ["1000001"])
+
+    def test_applied_diff_stamps_the_changed_rows(self):
+        update_number = converter.apply_postal_diff(
+            self.engine, inserts=[("13113", "1500001")], updates=[("01201", "0640941")], deletes=["1000001"]
+        )
+
+        rows = self.rows()
+        self.assertEqual(update_number, 2)
+        self.assertEqual(set(rows), {"0600000", "0640941", "1500001"})
+        self.assertEqual(rows["0640941"][:2], ("01201", 2))
+        self.assertEqual(rows["1500001"][:2], ("13113", 2))
+        # Untouched rows keep their update number and time
+        self.assertEqual(rows["0600000"], ("01101", 1, None))
+        self.assertGreater(rows["0640941"][2], 20250101000000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import math
+
+from app.services.batch_optimizer import WaveItem, optimize_wave, remaining_capacity
+
+SHIPPING_DATE = 20250401
+
+
+class TestBatchOptimizer(unittest.TestCase):
+    def test_beats_order_dependent_greedy(self):
+        # Carrier 01 only has room for one of the two waybills
+        items = [
+            WaveItem("first", 10, 50, SHIPPING_DATE, [("01", 100.0), ("02", 110.0)]),
+            WaveItem("second", 10, 50, SHIPPING_DATE, [("01", 100.0), ("02", 200.0)]),
+        ]
+        capacities = {("01", SHIPPING_DATE): (10.0, math.inf)}
+
+        solution = optimize_wave(items, capacities, previous_carrier_bonus=0)
+
+        self.assertEqual(solution.assignments, ["02", "01"])
+        self.assertEqual(solution.total_cost, 210.0)
+        self.assertEqual(solution.greedy_cost, 300.0)
+        self.assertLessEqual(solution.lower_bound, solution.objective)
+
+    def test_waybill_without_capacity_or_options_is_unassigned(self):
+        items = [
+            WaveItem("large", 30, 50, SHIPPING_DATE, [("01", 100.0)]),
+            WaveItem("late", 1, 5, SHIPPING_DATE, []),
+        ]
+        capacities = {("01", SHIPPING_DATE): (20.0, 1000.0)}
+
+        solution = optimize_wave(items, capacities)
+
+        self.assertEqual(solution.assignments, [None, None])
+        self.assertEqual(solution.unassigned, 2)
+        self.assertEqual(solution.total_cost, 0)
+
+    def test_previous_carrier_is_preferred_within_bonus(self):
+        items = [
+            WaveItem("near", 1, 5, SHIPPING_DATE, [("01", 100.0), ("02", 105.0)], previous_carrier="02"),
+            WaveItem("far", 1, 5, SHIPPING_DATE, [("01", 100.0), ("02", 150.0)], previous_carrier="02"),
+        ]
+
+        solution = optimize_wave(items, {}, previous_carrier_bonus=0.1)
+
+        self.assertEqual(solution.assignments, ["02", "01"])
+
+    def test_remaining_capacity_combines_limits(self):
+        limits = [(100.0, 800.0, 10.0), (60.0, 0.0, 0.0)]
+
+        self.assertEqual(remaining_capacity(limits, 20.0, 300.0), (40.0, 500.0))
+        self.assertEqual(remaining_capacity([(0.0, 400.0, 8.0)]), (50.0, 400.0))
+        self.assertEqual(remaining_capacity([]), (math.inf, math.inf))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+import threading
+import time
+from unittest.mock import MagicMock
+from datetime import date
+
+from app.services.capacity_ledger import CapacityLedger, fits_limits
+
+
+def make_db(rows):
+    """Session whose committed usage query returns the given (carrier, volume, weight) rows"""
+    db = MagicMock()
+    db.query.return_value.join.return_value.filter.return_value.group_by.return_value.all.return_value = rows
+    return db
+
+
+class TestCapacityLedger(unittest.TestCase):
+    def setUp(self):
+        self.ledger = CapacityLedger(ttl=60)
+        self.shipping_date = date(2025, 4, 1)
+        # 100 volume units, 1000 kg per day
+        self.limits = [(100.0, 1000.0, 0.0)]
+
+    def test_fits_limits_applies_volume_weight_ratio(self):
+        self.assertTrue(fits_limits([(0.0, 100.0, 8.0)], 12, 50))
+        self.assertFalse(fits_limits([(0.0, 100.0, 8.0)], 13, 50))
+        self.assertTrue(fits_limits([], 10 ** 6, 10 ** 6))
+
+    def test_committed_usage_is_seeded_once_per_date(self):
+        db = make_db([("01", 60, 100)])
+
+        self.assertTrue(self.ledger.fits(db, "01", self.shipping_date, 40, 10, self.limits))
+        self.assertFalse(self.ledger.fits(db, "01 ", self.shipping_date, 41, 10, self.limits))
+        self.assertTrue(self.ledger.fits(db, "02", self.shipping_date, 100, 10, self.limits))
+        self.assertEqual(db.query.call_count, 1)
+
+    def test_reservations_accumulate_until_released(self):
+        db = make_db([])
+
+        first = self.ledger.try_reserve(db, "01", self.shipping_date, 60, 100, self.limits)
+        self.assertIsNotNone(first)
+        self.assertIsNone(self.ledger.try_reserve(db, "01", self.shipping_date, 60, 100, self.limits))
+
+        self.ledger.release(first)
+        self.assertIsNotNone(self.ledger.try_reserve(db, "01", self.shipping_date, 60, 100, self.limits))
+
+    def test_confirmed_reservation_counts_as_committed(self):
+        db = make_db([])
+
+        reservation = self.ledger.try_reserve(db, "01", self.shipping_date, 60, 100, self.limits)
+        self.ledger.confirm(reservation)
+
+        self.assertEqual(self.ledger.usage(db, "01", self.shipping_date), (60, 100))
+        self.assertFalse(self.ledger.fits(db, "01", self.shipping_date, 41, 0, self.limits))
+
+    def test_reseed_after_the_log_was_written_is_not_counted_twice(self):
+        db = make_db([])
+        reservation = self.ledger.try_reserve(db, "01", self.shipping_date, 60, 100, self.limits)
+
+        # The selection log is committed, then a reseed picks it up before the confirmation
+        db = make_db([("01", 60, 100)])
+        logged_at = time.monotonic()
+        self.ledger.ttl = 0
+        self.ledger.usage(db, "01", self.shipping_date)
+        self.ledger.ttl = 60
+        self.ledger.confirm(reservation, logged_at)
+
+        self.assertEqual(self.ledger.usage(db, "01", self.shipping_date), (60, 100))
+
+    def test_confirmation_during_a_slow_reseed_is_kept(self):
+        db = make_db([])
+        reservation = self.ledger.try_reserve(db, "01", self.shipping_date, 60, 100, self.limits)
+        querying, finish = threading.Event(), threading.Event()
+
+        slow_db = MagicMock()
+
+        def slow_rows():
+            # Started before the selection log was written, so it doesn't see it
+            querying.set()
+            finish.wait(5)
+            return []
+        slow_db.query.return_value.join.return_value.filter.return_value.group_by.return_value.all.side_effect = slow_rows
+
+        self.ledger.ttl = 0
+        seeding = threading.Thread(target=self.ledger.usage, args=(slow_db, "01", self.shipping_date))
+        seeding.start()
+        querying.wait(5)
+        self.ledger.ttl = 60
+        try:
+            self.ledger.confirm(reservation, time.monotonic())
+        finally:
+            finish.set()
+            seeding.join()
+
+        self.assertEqual(self.ledger.usage(db, "01", self.shipping_date), (60, 100))
+        self.assertFalse(self.ledger.fits(db, "01", self.shipping_date, 41, 0, self.limits))
+
+    def test_seed_query_does_not_hold_the_lock(self):
+        self.ledger.usage(make_db([]), "01", self.shipping_date)
+        querying, finish = threading.Event(), threading.Event()
+
+        slow_db = MagicMock()
+
+        def slow_rows():
+            querying.set()
+            finish.wait(5)
+            return []
+        slow_db.query.return_value.join.return_value.filter.return_value.group_by.return_value.all.side_effect = slow_rows
+
+        seeding = threading.Thread(target=self.ledger.usage, args=(slow_db, "01", date(2025, 4, 2)))
+        seeding.start()
+        querying.wait(5)
+        try:
+            # Another date is served while the slow reseed is in flight
+            self.assertIsNotNone(self.ledger.try_reserve(make_db([]), "01", self.shipping_date, 1, 1, self.limits))
+        finally:
+            finish.set()
+            seeding.join()
+
+    def test_parallel_reservations_do_not_oversubscribe(self):
+        db = make_db([])
+        reservations = []
+
+        def reserve():
+            for _ in range(20):
+                reservation = self.ledger.try_reserve(db, "01", self.shipping_date, 1, 1, self.limits)
+                if reservation is not None:
+                    reservations.append(reservation)
+
+        workers = [threading.Thread(target=reserve) for _ in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(reservations), 100)
+        self.assertEqual(self.ledger.usage(db, "01", self.shipping_date), (100, 100))
+
+
+if __name__ == "__main__":
+    unittest.main()
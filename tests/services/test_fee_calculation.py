@@ -5,6 +5,7 @@ from decimal import Decimal
 from sqlalchemy.orm import Session
 
 from app.services.fee_calculation_service import FeeCalculationService
+from app.services.waybill_group import ProductLine
 from app.models.transportation_fee import TransportationFee
 from app.models.transportation_company_master import TransportationCompanyMaster
 from app.models.product_master import ProductMaster
@@ -86,27 +87,17 @@ class TestFeeCalculationService(unittest.TestCase):
         yamato_fee.HANMA46009 = Decimal('800')  # Base fee
         yamato_fee.HANMA46010 = Decimal('1')   # Fee type (fixed price)
         
-        # Set up fee records query response
-        sagawa_fees_query = MagicMock()
-        sagawa_fees_query.filter.return_value.order_by.return_value.all.return_value = [
-            sagawa_120, sagawa_100, sagawa_80, sagawa_60
-        ]
-        
-        yamato_fees_query = MagicMock()
-        yamato_fees_query.filter.return_value.order_by.return_value.all.return_value = [
-            yamato_fee
-        ]
-        
-        # Configure the db query to return different fee records based on carrier code
-        def get_fees_query(model):
-            if model == TransportationFee:
-                return MagicMock(filter=lambda *args, **kwargs: (
-                    sagawa_fees_query if "SAGAWA" in str(args) else yamato_fees_query
-                ))
-            # For other queries, return a generic mock
-            return MagicMock()
-            
-        self.db.query.side_effect = get_fees_query
+        # Set up fee records lookup response
+        fee_records = {
+            "SAGAWA": [sagawa_120, sagawa_100, sagawa_80, sagawa_60],
+            "YAMATO": [yamato_fee],
+        }
+        patcher = patch(
+            "app.services.fee_calculation_service.statements.fee_records",
+            side_effect=lambda db, carrier_code, area_code: fee_records.get(carrier_code, [])
+        )
+        self.fee_records = patcher.start()
+        self.addCleanup(patcher.stop)
         
         # Mock product info response
         product1 = MagicMock()
@@ -208,9 +199,9 @@ class TestFeeCalculationService(unittest.TestCase):
         
         # Expected fee:
         # 2 boxes at 60cm = 2 * 450 = 900
-        # 1 box at 90cm = 1 * 490 = 490
-        # Total: 1390
-        self.assertEqual(fee, 1390)
+        # 1 box at 90cm falls in the 100cm tier = 1 * 530 = 530
+        # Total: 1430
+        self.assertEqual(fee, 1430)
     
     def test_calculate_shipping_fee_yamato(self):
         """Test calculating shipping fee for Yamato Transport (fixed price)"""
@@ -254,8 +245,8 @@ class TestFeeCalculationService(unittest.TestCase):
     def test_calculate_package_metrics(self):
         """Test calculating all package metrics including parcels info"""
         products = [
-            {"product_code": 1001, "quantity": 15},  # 1 full box (10) + 5 loose items
-            {"product_code": 1002, "quantity": 8}    # 1 full box (5) + 3 loose items
+            ProductLine(1001, 15),  # 1 full box (10) + 5 loose items
+            ProductLine(1002, 8)    # 1 full box (5) + 3 loose items
         ]
         
         parcels, volume, weight, max_size, parcels_info = self.service.calculate_package_metrics(products)
@@ -266,8 +257,9 @@ class TestFeeCalculationService(unittest.TestCase):
         # Verify volume calculation
         # Product 1: 15 * 2.5 = 37.5
         # Product 2: 8 * 5.0 = 40.0
-        # Total: 77.5 -> round up to 78
-        self.assertEqual(volume, 78)
+        # Total: 77.5 -- the metrics keep the raw 才数; it is only rounded up
+        # to whole units when the fee is billed (see calculate_shipping_fee)
+        self.assertEqual(volume, 77.5)
         
         # Verify weight calculation
         # Product 1: 15 * 0.5 = 7.5kg
@@ -283,7 +275,7 @@ class TestFeeCalculationService(unittest.TestCase):
         self.assertEqual(max_size, 90)
         
         # Verify parcels info
-        self.assertEqual(len(parcels_info), 4)  # 4 different sized parcels
+        self.assertEqual(sum(count for _, count in parcels_info), 4)  # 4 parcels counted by size
         
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
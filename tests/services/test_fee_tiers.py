@@ -0,0 +1,52 @@
+import unittest
+from unittest.mock import MagicMock
+from decimal import Decimal
+
+from app.models.transportation_fee import TransportationFee
+from app.services.fee_tiers import SizeTierTable, parcel_size_histogram
+
+
+def make_fee(max_size, base_fee, fee_type=3, max_weight=0, max_volume=0):
+    fee = MagicMock(spec=TransportationFee)
+    fee.HANMA46004 = Decimal(max_weight)
+    fee.HANMA46005 = Decimal(max_volume)
+    fee.HANMA46006 = Decimal(max_size)
+    fee.HANMA46009 = Decimal(base_fee)
+    fee.HANMA46010 = Decimal(fee_type)
+    return fee
+
+
+class TestSizeTierTable(unittest.TestCase):
+    def setUp(self):
+        # Rows in code order, not size order; the fixed-price row is ignored
+        self.tiers = SizeTierTable([
+            make_fee(100, 530), make_fee(60, 450), make_fee(0, 1800, fee_type=1), make_fee(80, 490),
+        ])
+
+    def test_histogram_merges_parcels_of_the_same_size(self):
+        parcels = [{"size": 80, "count": 1}, {"size": 60, "count": 2}, {"size": 80, "count": 3}, {"count": 1}]
+
+        self.assertEqual(parcel_size_histogram(parcels, default_size=60), ((60.0, 3), (80.0, 4)))
+
+    def test_each_parcel_is_charged_at_its_own_tier(self):
+        histogram = parcel_size_histogram([{"size": 60, "count": 2}, {"size": 61, "count": 1}, {"size": 100, "count": 1}])
+
+        self.assertEqual(len(self.tiers), 3)
+        self.assertEqual(self.tiers.price(histogram), 2 * 450 + 490 + 530)
+
+    def test_parcel_larger_than_every_tier_has_no_fee(self):
+        self.assertIsNone(self.tiers.price(((120.0, 1),)))
+
+        unbounded = SizeTierTable([make_fee(60, 450), make_fee(0, 900)])
+        self.assertEqual(unbounded.price(((120.0, 1),)), 900)
+
+    def test_shipment_limits_skip_to_the_next_tier(self):
+        tiers = SizeTierTable([make_fee(60, 450, max_weight=10), make_fee(80, 490, max_weight=30)])
+
+        self.assertEqual(tiers.price(((50.0, 1),), weight=5), 450)
+        self.assertEqual(tiers.price(((50.0, 1),), weight=20), 490)
+        self.assertIsNone(tiers.price(((50.0, 1),), weight=40))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app.services.picking_list_cache import PickingListCache, page_etag
+
+
+class TestPickingListCache(unittest.TestCase):
+    def setUp(self):
+        self.version = (20250101120000, 20250101120000, 10, 20250101120000)
+        patcher = patch("app.services.picking_list_cache.picking_list_version", side_effect=lambda db: self.version)
+        self.probe = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = PickingListCache(ttl=60, max_size=2, check_interval=0)
+        self.db = MagicMock()
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        return {"pickings": [{"picking_id": 1}], "total": 1, "page": 1, "size": 50}
+
+    def test_pages_are_served_from_memory_with_a_stable_etag(self):
+        page, etag = self.cache.get(self.db, ((), 0, 50), self.load)
+        cached_page, cached_etag = self.cache.get(self.db, ((), 0, 50), self.load)
+
+        self.assertEqual(self.loads, 1)
+        self.assertIs(cached_page, page)
+        self.assertEqual(cached_etag, etag)
+        self.assertEqual(etag, page_etag(self.load()))
+
+    def test_invalidate_and_picking_changes_drop_pages(self):
+        self.cache.get(self.db, ((), 0, 50), self.load)
+        self.cache.invalidate()
+        self.cache.get(self.db, ((), 0, 50), self.load)
+        self.assertEqual(self.loads, 2)
+
+        self.version = (20250101120000, 20250101130000, 10, 20250101120000)
+        self.cache.get(self.db, ((), 0, 50), self.load)
+        self.assertEqual(self.loads, 3)
+
+    def test_carriers_assigned_by_another_process_drop_pages(self):
+        self.cache.get(self.db, ((), 0, 50), self.load)
+
+        # Only the picking works' update time moves when carriers are assigned
+        self.version = (20250101120000, 20250101120000, 10, 20250101140000)
+        self.cache.get(self.db, ((), 0, 50), self.load)
+        self.assertEqual(self.loads, 2)
+
+    def test_least_recently_used_page_is_evicted(self):
+        for skip in (0, 50, 100):
+            self.cache.get(self.db, ((), skip, 50), self.load)
+        self.cache.get(self.db, ((), 100, 50), self.load)
+        self.cache.get(self.db, ((), 0, 50), self.load)
+
+        self.assertEqual(self.loads, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
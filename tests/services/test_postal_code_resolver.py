@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import create_engine, MetaData, Table, Column, CHAR, DECIMAL
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models.postal_jis_mapping import PostalJISMapping
+from app.services.postal_code_resolver import PostalCodeResolver, normalize_postal_code
+
+
+class StandInPostcodeAPI(BaseHTTPRequestHandler):
+    """Answers like postcode-jp.com for the postal codes in ``addresses``"""
+
+    addresses = {"1500001": ("13", "113"), "5300001": ("27", "127")}
+    slow = {"9000001"}
+    requests = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        code = self.path.rsplit("/", 1)[-1]
+        with self.lock:
+            self.requests.append(code)
+        if code in self.slow:
+            time.sleep(0.5)
+        address = self.addresses.get(code)
+        data = [{"prefecture_code": address[0], "city_code": address[1]}] if address else []
+        body = json.dumps({"data": data}).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client timed out
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPostalCodeResolver(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInPostcodeAPI)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}/api/postcode"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInPostcodeAPI.requests = []
+        engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+        # Same columns as the mapping table, without its SQL Server defaults
+        Table(PostalJISMapping.__tablename__, MetaData(),
+              Column("HANMA45001", CHAR(5), primary_key=True), Column("HANMA45002", CHAR(10), primary_key=True),
+              Column("HANMA45999", DECIMAL(9, 0)), Column("HANMA45INS", DECIMAL(20, 6)),
+              Column("HANMA45UPD", DECIMAL(20, 6))).create(engine)
+        with engine.begin() as connection:
+            connection.execute(PostalJISMapping.__table__.insert(),
+                               [{"HANMA45001": "13101", "HANMA45002": "1000001", "HANMA45999": 1}])
+        self.Session = sessionmaker(bind=engine)
+        self.resolver = PostalCodeResolver(self.Session, base_url=self.base_url, api_key="test",
+                                           timeout=0.2, concurrency=2)
+
+    def tearDown(self):
+        self.resolver.close()
+
+    def test_normalizes_postal_code_notations(self):
+        self.assertEqual(normalize_postal_code("100-0001"), "1000001")
+        self.assertEqual(normalize_postal_code("１００－０００１ "), "1000001")
+
+    def test_mapping_table_answers_before_the_api(self):
+        self.assertEqual(self.resolver.resolve("100-0001"), "13101")
+        self.assertEqual(StandInPostcodeAPI.requests, [])
+
+    def test_api_answers_are_written_back_and_cached(self):
+        results = self.resolver.resolve_many(["1500001", "530-0001", "1000001"])
+
+        self.assertEqual(results, {"1500001": "13113", "5300001": "27127", "1000001": "13101"})
+        self.assertCountEqual(StandInPostcodeAPI.requests, ["1500001", "5300001"])
+        db = self.Session()
+        stored = dict(db.query(PostalJISMapping.HANMA45002, PostalJISMapping.HANMA45001).all())
+        db.close()
+        self.assertEqual(stored["1500001"], "13113")
+
+        self.resolver.resolve_many(["1500001", "5300001"])
+        self.assertEqual(len(StandInPostcodeAPI.requests), 2)
+
+    def test_unknown_postal_codes_are_cached_but_failures_are_not(self):
+        self.assertIsNone(self.resolver.resolve("0000000"))
+        self.assertIsNone(self.resolver.resolve("0000000"))
+        self.assertEqual(StandInPostcodeAPI.requests, ["0000000"])
+
+        # Times out against the 0.2 s limit and is asked again next time
+        self.assertIsNone(self.resolver.resolve("9000001"))
+        self.assertIsNone(self.resolver.resolve("9000001"))
+        self.assertEqual(StandInPostcodeAPI.requests.count("9000001"), 2)
+
+    def test_without_api_key_only_the_mapping_table_is_used(self):
+        resolver = PostalCodeResolver(self.Session, base_url=self.base_url, api_key="")
+
+        self.assertIsNone(resolver.resolve("1500001"))
+        self.assertEqual(StandInPostcodeAPI.requests, [])
+
+    def test_mapping_table_failures_are_not_cached(self):
+        resolver = PostalCodeResolver(sessionmaker(bind=create_engine("sqlite://")), api_key="")
+        self.assertIsNone(resolver.resolve("1000001"))
+
+        resolver._session_factory = self.Session
+        self.assertEqual(resolver.resolve("1000001"), "13101")
+
+    def test_evicted_postal_codes_are_looked_up_again(self):
+        self.assertEqual(self.resolver.resolve("1000001"), "13101")
+        db = self.Session()
+        db.query(PostalJISMapping).filter(PostalJISMapping.HANMA45002 == "1000001").update({"HANMA45001": "13102"})
+        db.commit()
+        db.close()
+        self.assertEqual(self.resolver.resolve("1000001"), "13101")
+
+        self.resolver.evict(["100-0001"])
+        self.assertEqual(self.resolver.resolve("1000001"), "13102")
+
+
+if __name__ == "__main__":
+    unittest.main()
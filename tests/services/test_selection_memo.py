@@ -0,0 +1,57 @@
+import unittest
+from datetime import date
+
+from app.services.selection_memo import SelectionMemo, shipment_fingerprint
+
+
+class TestSelectionMemo(unittest.TestCase):
+    def setUp(self):
+        self.memo = SelectionMemo(max_size=2)
+        self.snapshot = object()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return {"message": None, "carriers": [], "lowest_cost_carrier": None, "call": self.calls}
+
+    def fingerprint(self, parcels, volume=3.0):
+        return shipment_fingerprint("13101", parcels, volume, 12.5, 80.0, date(2025, 4, 1), date(2025, 4, 3))
+
+    def test_fingerprint_ignores_parcel_order_and_float_noise(self):
+        parcels = [{"size": 60.0, "count": 2}, {"size": 80.0, "count": 1}, {"size": 60.0, "count": 1}]
+        reordered = [{"size": 80.0, "count": 1}, {"size": 60.0, "count": 3}]
+
+        self.assertEqual(self.fingerprint(parcels), self.fingerprint(reordered))
+        self.assertEqual(self.fingerprint(parcels, 0.1 + 0.2), self.fingerprint(parcels, 0.3))
+        self.assertNotEqual(self.fingerprint(parcels, 3.0), self.fingerprint(parcels, 3.01))
+
+    def test_identical_shipments_are_evaluated_once(self):
+        key = self.fingerprint([{"size": 60.0, "count": 1}])
+
+        first = self.memo.get_or_compute(self.snapshot, key, self.compute)
+        second = self.memo.get_or_compute(self.snapshot, key, self.compute)
+
+        self.assertIs(first, second)
+        self.assertEqual(self.calls, 1)
+
+    def test_new_master_data_snapshot_starts_over(self):
+        key = self.fingerprint([{"size": 60.0, "count": 1}])
+        self.memo.get_or_compute(self.snapshot, key, self.compute)
+
+        self.memo.get_or_compute(object(), key, self.compute)
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(len(self.memo), 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        keys = [self.fingerprint([{"size": size, "count": 1}]) for size in (60.0, 80.0, 100.0)]
+        for key in keys:
+            self.memo.get_or_compute(self.snapshot, key, self.compute)
+
+        self.memo.get_or_compute(self.snapshot, keys[0], self.compute)
+
+        self.assertEqual(self.calls, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
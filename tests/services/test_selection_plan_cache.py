@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import MagicMock
+from datetime import date
+
+from app.services.selection_plan_cache import SelectionPlanCache, picking_work_fingerprint
+from app.services.waybill_group import ProductLine, WaybillGroup, picking_work_key
+
+
+def make_work(order_id, line, quantity=1, carrier="95", updated=20250401000000):
+    work = MagicMock()
+    work.HANW002001 = 1
+    work.HANW002002 = order_id
+    work.HANW002003 = line
+    work.HANW002078 = 0
+    work.HANW002041 = quantity
+    work.HANW002A003 = carrier
+    work.HANW002UPD = updated
+    return work
+
+
+def make_header(order_id, carrier="95", updated=20250401000000):
+    header = MagicMock()
+    header.HANR004005 = order_id
+    header.HANR004004 = 1
+    header.HANR004A008 = carrier
+    header.HANR004UPD = updated
+    return header
+
+
+class TestSelectionPlanCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = SelectionPlanCache(max_size=2, ttl=60)
+        self.works = [make_work(500001, 1), make_work(500001, 2), make_work(500002, 1)]
+        self.waybills = [
+            WaybillGroup(
+                customer_code="C0000000001",
+                shipping_date=date(2025, 4, 1),
+                products=[ProductLine("100001", 2.0)],
+                order_ids=[500001],
+                work_keys=[picking_work_key(work) for work in self.works[:2]],
+            ),
+            WaybillGroup(
+                customer_code="C0000000001",
+                shipping_date=date(2025, 4, 1),
+                products=[ProductLine("100002", 1.0)],
+                order_ids=[500002],
+                work_keys=[picking_work_key(work) for work in self.works[2:]],
+            ),
+        ]
+
+    def test_restore_keeps_the_keys_of_current_picking_works(self):
+        fingerprint = picking_work_fingerprint(self.works)
+        self.cache.store(1000, fingerprint, self.waybills)
+
+        # A commit loads fresh rows for the same keys
+        fresh_works = [make_work(500001, 1), make_work(500001, 2), make_work(500002, 1)]
+        restored = self.cache.restore(1000, picking_work_fingerprint(fresh_works), fresh_works[:2])
+
+        self.assertEqual(len(restored), 2)
+        self.assertEqual(restored[0].work_keys, [(1, 500001, 1, 0), (1, 500001, 2, 0)])
+        self.assertEqual(restored[1].work_keys, [])
+        self.assertEqual(restored[0].products, self.waybills[0].products)
+
+    def test_restore_discards_plan_when_works_changed(self):
+        self.cache.store(1000, picking_work_fingerprint(self.works), self.waybills)
+
+        changed_works = [make_work(500001, 1), make_work(500001, 2, quantity=5), make_work(500002, 1)]
+        self.assertIsNone(self.cache.restore(1000, picking_work_fingerprint(changed_works), changed_works))
+
+        # The stale plan is gone even for the original fingerprint
+        self.assertIsNone(self.cache.restore(1000, picking_work_fingerprint(self.works), self.works))
+
+    def test_restore_discards_plan_when_order_headers_changed(self):
+        headers = [make_header(500001), make_header(500002)]
+        self.cache.store(1000, picking_work_fingerprint(self.works, headers), self.waybills)
+
+        # Another run assigned a carrier to one of the orders meanwhile
+        assigned = [make_header(500001), make_header(500002, carrier="01", updated=20250401093000)]
+        self.assertIsNone(self.cache.restore(1000, picking_work_fingerprint(self.works, assigned), self.works))
+
+    def test_restored_plan_is_a_copy(self):
+        fingerprint = picking_work_fingerprint(self.works)
+        self.cache.store(1000, fingerprint, self.waybills)
+
+        restored = self.cache.restore(1000, fingerprint, self.works)
+        restored[0].products[0].quantity = 99
+
+        again = self.cache.restore(1000, fingerprint, self.works)
+        self.assertEqual(again[0].products[0].quantity, 2.0)
+
+    def test_least_recently_used_plan_is_evicted(self):
+        fingerprint = picking_work_fingerprint(self.works)
+        for picking_id in (1000, 1001, 1002):
+            self.cache.store(picking_id, fingerprint, self.waybills)
+
+        self.assertIsNone(self.cache.restore(1000, fingerprint, self.works))
+        self.assertIsNotNone(self.cache.restore(1002, fingerprint, self.works))
+
+
+if __name__ == "__main__":
+    unittest.main()
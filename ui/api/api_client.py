@@ -1,27 +1,28 @@
-import os
-import requests
-import time
+from ui.api.transports import RequestCancelled, TransportError, make_transport
 
 class ApiClient:
-    def __init__(self, base_url=None):
-        self.base_url = base_url or os.environ.get("BACKEND_URL", "http://localhost:8000/api")
-        print(f"======== Connecting to backend at: {self.base_url} ==========")
+    def __init__(self, base_url=None, transport=None):
+        # HTTP by default; main.py selects the in-process transport when it
+        # runs the backend itself (see BACKEND_TRANSPORT)
+        self.transport = transport or make_transport(base_url=base_url)
 
-    def get_pickings(self, params):
+    def get_pickings(self, params, cancel=None):
         try:
-            response = requests.get(f"{self.base_url}/pickings/", params=params or {})
-            response.raise_for_status()
-            time.sleep(1)  
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return self.transport.get_pickings(params, cancel)
+        except RequestCancelled:
+            return None
+        except TransportError as e:
             print(f"Error fetching items: {e}")
             return []
 
-    def do_shipping(self, params):
+    def do_shipping(self, params, cancel=None):
         try:
-            response = requests.post(f"{self.base_url}/carrier-selection/batch-select/", json=params or {})
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return self.transport.batch_select(params, cancel)
+        except RequestCancelled:
+            return None
+        except TransportError as e:
             print(f"Error fetching items: {e}")
             return { "err_msg": f"{e}" }
+
+    def close(self):
+        self.transport.close()
@@ -0,0 +1,16 @@
+from PySide6.QtCore import QThread, Signal
+
+class BackendStarterThread(QThread):
+    backend_ready = Signal(bool)
+
+    def __init__(self, start_backend):
+        super().__init__()
+        self.start_backend = start_backend
+
+    def run(self):
+        try:
+            ready = bool(self.start_backend())
+        except Exception as e:
+            print(f"Error starting backend: {e}")
+            ready = False
+        self.backend_ready.emit(ready)
@@ -0,0 +1,48 @@
+from collections import OrderedDict
+import threading
+import time
+
+class PageCache:
+    """
+    Recently fetched picking pages keyed by (query, page, page size)
+
+    Pages expire after ``ttl`` seconds and the least recently used page is
+    evicted beyond ``max_pages``.  Cleared whenever pickings change (after a
+    carrier selection run).
+    """
+
+    def __init__(self, max_pages=50, ttl=60.0):
+        self.max_pages = max_pages
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()
+
+    @staticmethod
+    def key(query, page, page_size):
+        return (query or "", page, page_size)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                return None
+            stored_at, page = entry
+            if time.monotonic() - stored_at >= self.ttl:
+                del self._pages[key]
+                return None
+            self._pages.move_to_end(key)
+            return page
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def put(self, key, page):
+        with self._lock:
+            self._pages[key] = (time.monotonic(), page)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
@@ -0,0 +1,145 @@
+import itertools
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from ui.api.transports import CancelToken
+
+MAX_WORKERS = 4
+
+class _TaskSignals(QObject):
+    succeeded = Signal(int, object)
+    failed = Signal(int, str)
+    done = Signal(int)
+
+class _Task(QRunnable):
+    def __init__(self, task_id, fn):
+        super().__init__()
+        self.task_id = task_id
+        self.fn = fn
+        self.cancel_token = CancelToken()
+        self.signals = _TaskSignals()
+        # Python keeps the task alive until it is done (see TaskExecutor._tasks)
+        self.setAutoDelete(False)
+
+    def run(self):
+        try:
+            result = self.fn(self.cancel_token)
+            if not self.cancel_token.cancelled:
+                self.signals.succeeded.emit(self.task_id, result)
+        except Exception as e:
+            if not self.cancel_token.cancelled:
+                self.signals.failed.emit(self.task_id, str(e))
+        finally:
+            self.signals.done.emit(self.task_id)
+
+class _InFlight:
+    __slots__ = ("channel", "key", "generation", "task", "callbacks")
+
+    def __init__(self, channel, key, generation, task):
+        self.channel = channel
+        self.key = key
+        self.generation = generation
+        self.task = task
+        self.callbacks = []
+
+class TaskExecutor(QObject):
+    """
+    Runs UI background work on a shared QThreadPool
+
+    Work is submitted on a named channel ("pickings", "prefetch", ...).  Each
+    submission starts a new generation of its channel and cancels the task
+    still running there, and only the current generation's result reaches
+    its callbacks, so a slow stale response never overwrites a newer one.
+    Submitting the key that is already in flight on the channel joins that
+    task instead of starting another, so rapid clicks share one request.
+
+    Tasks get a CancelToken, which the HTTP transport checks while reading.
+    Callbacks run on the UI thread.
+    """
+
+    def __init__(self, parent=None, max_workers=MAX_WORKERS):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+        self._ids = itertools.count(1)
+        self._generations = {}
+        self._in_flight = {}  # channel -> _InFlight
+        self._tasks = {}  # task id -> (_Task, _InFlight); keeps running tasks alive
+
+    def submit(self, channel, key, fn, on_success=None, on_error=None):
+        """
+        Run ``fn(cancel_token)`` on the pool
+
+        Args:
+            channel: Name of the stream of requests this one supersedes
+            key: Identifies equal requests; None never coalesces
+            fn: Work to run on a worker thread
+            on_success: Called with the result on the UI thread
+            on_error: Called with the error message on the UI thread
+
+        Returns:
+            Generation of the channel that will deliver the result
+        """
+        current = self._in_flight.get(channel)
+        if current is not None and key is not None and current.key == key:
+            current.callbacks.append((on_success, on_error))
+            return current.generation
+
+        self.cancel(channel)
+        generation = self._generations.get(channel, 0) + 1
+        self._generations[channel] = generation
+
+        task = _Task(next(self._ids), fn)
+        flight = _InFlight(channel, key, generation, task)
+        flight.callbacks.append((on_success, on_error))
+        self._in_flight[channel] = flight
+        self._tasks[task.task_id] = (task, flight)
+
+        # Bound methods of this QObject: the signals are queued to the UI thread
+        task.signals.succeeded.connect(self._on_succeeded)
+        task.signals.failed.connect(self._on_failed)
+        task.signals.done.connect(self._on_done)
+        self.pool.start(task)
+        return generation
+
+    def cancel(self, channel):
+        """Cancel the channel's running task and drop its result"""
+        current = self._in_flight.pop(channel, None)
+        if current is not None:
+            current.task.cancel_token.cancel()
+            self._generations[channel] = self._generations.get(channel, 0) + 1
+
+    def cancel_all(self):
+        for channel in list(self._in_flight):
+            self.cancel(channel)
+
+    def is_running(self, channel):
+        return channel in self._in_flight
+
+    def _current(self, task_id):
+        entry = self._tasks.get(task_id)
+        if entry is None:
+            return None
+        flight = entry[1]
+        if self._generations.get(flight.channel) != flight.generation:
+            return None  # Superseded
+        if self._in_flight.get(flight.channel) is flight:
+            del self._in_flight[flight.channel]
+        return flight
+
+    def _on_succeeded(self, task_id, result):
+        flight = self._current(task_id)
+        if flight is not None:
+            for on_success, _ in flight.callbacks:
+                if on_success is not None:
+                    on_success(result)
+
+    def _on_failed(self, task_id, message):
+        flight = self._current(task_id)
+        if flight is not None:
+            for _, on_error in flight.callbacks:
+                if on_error is not None:
+                    on_error(message)
+
+    def _on_done(self, task_id):
+        self._tasks.pop(task_id, None)
@@ -0,0 +1,234 @@
+from collections import OrderedDict
+import json
+import os
+import threading
+
+# Backend imports (requests, or the app and SQLAlchemy) happen on first use so
+# that creating a transport stays cheap on the UI thread
+
+TRANSPORT_HTTP = "http"
+TRANSPORT_IN_PROCESS = "inprocess"
+
+# HTTP client settings, overridable through the environment
+CONNECT_TIMEOUT = float(os.environ.get("BACKEND_CONNECT_TIMEOUT", 3))  # Seconds to establish a connection
+READ_TIMEOUT = float(os.environ.get("BACKEND_READ_TIMEOUT", 30))  # Seconds to wait for a picking page
+SELECT_TIMEOUT = float(os.environ.get("BACKEND_SELECT_TIMEOUT", 600))  # Seconds to wait for carrier selection
+MAX_RETRIES = int(os.environ.get("BACKEND_MAX_RETRIES", 3))
+RETRY_BACKOFF = float(os.environ.get("BACKEND_RETRY_BACKOFF", 0.3))  # 0.3s, 0.6s, 1.2s, ...
+POOL_SIZE = 4  # Keep-alive connections; the UI runs at most a few calls at once
+CHUNK_SIZE = 64 * 1024
+ETAG_CACHE_SIZE = 50  # Picking pages kept for conditional requests
+
+
+class TransportError(Exception):
+    """A backend call failed; the message is shown to the user"""
+
+
+class RequestCancelled(TransportError):
+    """The call was cancelled before its result arrived"""
+
+
+class CancelToken:
+    """Set by the UI when a call's result is no longer wanted"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self.cancelled:
+            raise RequestCancelled("Request cancelled")
+
+
+class HttpTransport:
+    """
+    Calls a FastAPI backend over HTTP (remote backends, or --no-backend)
+
+    All calls share one keep-alive session.  Connection failures are retried
+    with exponential backoff for every call; failed reads and 502/503/504
+    answers only for GETs, since carrier selection is not idempotent.  The
+    backend gzips large responses, which requests decodes transparently.
+    Picking pages are requested with the ETag of the last copy, so unchanged
+    pages come back as an empty 304.
+    """
+
+    def __init__(self, base_url, session=None):
+        self.base_url = base_url
+        self._session = session
+        self._session_lock = threading.Lock()
+        self._etag_lock = threading.Lock()
+        self._etag_pages = OrderedDict()  # params -> (etag, data)
+        print(f"======== Connecting to backend at: {self.base_url} ==========")
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._create_session()
+            return self._session
+
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=MAX_RETRIES,
+            connect=MAX_RETRIES,
+            read=MAX_RETRIES,
+            status=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"Accept-Encoding": "gzip", "Accept": "application/json"})
+        return session
+
+    def _request(self, method, path, read_timeout, cancel=None, meta=None, **kwargs):
+        import requests
+
+        cancel = cancel or CancelToken()
+        cancel.check()
+        try:
+            # Streamed so a cancelled call stops reading and frees its connection
+            with self.session.request(method, f"{self.base_url}{path}", stream=True,
+                                      timeout=(CONNECT_TIMEOUT, read_timeout), **kwargs) as response:
+                response.raise_for_status()
+                if meta is not None:
+                    meta["status"] = response.status_code
+                    meta["etag"] = response.headers.get("ETag")
+                if response.status_code == 304:
+                    return None
+                body = bytearray()
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    cancel.check()
+                    body.extend(chunk)
+                cancel.check()
+                return json.loads(body)
+        except requests.exceptions.RequestException as e:
+            raise TransportError(str(e)) from e
+        except ValueError as e:
+            raise TransportError(f"Invalid response from backend: {e}") from e
+
+    def get_pickings(self, params, cancel=None):
+        params = params or {}
+        key = tuple(sorted(params.items()))
+        with self._etag_lock:
+            cached = self._etag_pages.get(key)
+        meta = {}
+        data = self._request("GET", "/pickings/", READ_TIMEOUT, cancel, meta=meta, params=params,
+                             headers={"If-None-Match": cached[0]} if cached else None)
+        if meta.get("status") == 304 and cached:
+            return cached[1]
+        if meta.get("etag"):
+            with self._etag_lock:
+                self._etag_pages[key] = (meta["etag"], data)
+                self._etag_pages.move_to_end(key)
+                while len(self._etag_pages) > ETAG_CACHE_SIZE:
+                    self._etag_pages.popitem(last=False)
+        return data
+
+    def batch_select(self, params, cancel=None):
+        return self._request("POST", "/carrier-selection/batch-select/", SELECT_TIMEOUT, cancel, json=params or {})
+
+    def close(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class InProcessTransport:
+    """
+    Calls the service layer directly, for a backend running in this process
+
+    Each call runs on the caller's (worker) thread with its own session and
+    returns the same JSON-compatible data as the HTTP endpoints, without the
+    socket and JSON encoding in between.
+    """
+
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory
+        print("======== Calling the backend in-process ==========")
+
+    def _session(self, batch=False):
+        if self._session_factory is not None:
+            return self._session_factory()
+        from app.db.base import get_session_factory
+        from app.db.pool import POOL_BATCH, POOL_READ
+        # Picking pages are read-only and may come from the replica
+        return get_session_factory(POOL_BATCH if batch else POOL_READ)()
+
+    def get_pickings(self, params, cancel=None):
+        from app.services import picking_service
+        from app.schemas.picking import PickingList
+
+        params = params or {}
+        skip = int(params.get("skip", 0))
+        limit = int(params.get("limit", 50))
+        filters = {"query": params["query"]} if params.get("query") else {}
+        if cancel is not None:
+            cancel.check()
+
+        db = None
+        try:
+            # Connecting may fail too when the pool is created on first use
+            db = self._session()
+            page, _ = picking_service.get_picking_page(db, skip=skip, limit=limit, filters=filters)
+        except Exception as e:
+            raise TransportError(str(e)) from e
+        finally:
+            if db is not None:
+                db.close()
+
+        return PickingList(**page).model_dump(mode="json")
+
+    def batch_select(self, params, cancel=None):
+        from app.services import carrier_selection_service
+        from app.schemas.carrier_selection import CarrierSelectionBatchRequest, CarrierSelectionBatchResponse
+
+        db = None
+        try:
+            # Coerce the UI's string IDs as the endpoint would
+            request = CarrierSelectionBatchRequest.model_validate(params or {})
+            db = self._session(batch=True)
+            # Already on a worker thread, so large batches run here too instead
+            # of in the endpoint's background task
+            result = carrier_selection_service.batch_select_carriers(
+                db, request.picking_ids, include_timings=request.include_timings
+            )
+        except Exception as e:
+            raise TransportError(str(e)) from e
+        finally:
+            if db is not None:
+                db.close()
+
+        return CarrierSelectionBatchResponse.model_validate(result).model_dump(mode="json")
+
+    def close(self):
+        pass
+
+
+def make_transport(kind=None, base_url=None):
+    """
+    Create the transport named by ``kind`` or the BACKEND_TRANSPORT variable
+
+    Defaults to HTTP, which works with any backend.
+    """
+    kind = (kind or os.environ.get("BACKEND_TRANSPORT") or TRANSPORT_HTTP).lower()
+    if kind == TRANSPORT_IN_PROCESS:
+        return InProcessTransport()
+    if kind != TRANSPORT_HTTP:
+        raise ValueError(f"Unknown backend transport '{kind}'")
+    return HttpTransport(base_url or os.environ.get("BACKEND_URL", "http://localhost:8000/api"))
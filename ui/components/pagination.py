@@ -77,6 +77,10 @@ class Pagination(QWidget):
         self.current_page = 0
         self.on_page_size_changed.emit()
 
+    def reset_page(self):
+        self.current_page = 0
+        self.update_page()
+
     def get_current_page(self):
         return self.current_page
     
@@ -0,0 +1,101 @@
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PySide6.QtWidgets import QApplication
+
+# (header, picking field) per column; column 0 holds the check box
+COLUMNS = [
+    ("", None),
+    ("出荷日付", "shipping_date"),
+    ("ピッキング連番", "picking_id"),
+    ("ピッキング日", "picking_date"),
+    ("ピッキング時刻", "picking_time"),
+    ("受注No_From", "order_no_from"),
+    ("受注No_To", "order_no_to"),
+    ("得意先CD_From", "customer_code_from"),
+    ("得意先CD_To", "customer_code_to"),
+    ("得意先略称", "customer_short_name"),
+    ("担当者CD", "staff_code"),
+    ("担当者略称", "staff_short_name"),
+]
+FIELDS = [field for _, field in COLUMNS[1:]]
+
+class PickingTableModel(QAbstractTableModel):
+    """
+    One page of pickings plus the checked picking IDs
+
+    Rows are kept as tuples of display strings, so the view only formats what
+    it paints.  Checked IDs live in a set that survives page changes.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.picking_ids = []
+        self.selected = set()
+
+    # Qt model interface
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMNS[section][0]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role == Qt.DisplayRole and column > 0:
+            return self.rows[row][column - 1]
+        if role == Qt.CheckStateRole and column == 0:
+            return Qt.Checked if self.picking_ids[row] in self.selected else Qt.Unchecked
+        if role in (Qt.BackgroundRole, Qt.ForegroundRole) and self.picking_ids[row] in self.selected:
+            palette = QApplication.palette()
+            return palette.highlight() if role == Qt.BackgroundRole else palette.highlightedText()
+        return None
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled if index.isValid() else Qt.NoItemFlags
+
+    # Page and selection
+
+    def set_pickings(self, pickings):
+        self.beginResetModel()
+        self.rows = [tuple(str(picking.get(field, "")) for field in FIELDS) for picking in pickings]
+        self.picking_ids = [str(picking.get("picking_id", "")) for picking in pickings]
+        self.endResetModel()
+
+    def clear(self):
+        self.set_pickings([])
+
+    def toggle_row(self, row):
+        picking_id = self.picking_ids[row]
+        if picking_id in self.selected:
+            self.selected.discard(picking_id)
+        else:
+            self.selected.add(picking_id)
+        self._rows_changed(row, row)
+
+    def set_page_checked(self, checked):
+        if checked:
+            self.selected.update(self.picking_ids)
+        else:
+            self.selected.difference_update(self.picking_ids)
+        if self.rows:
+            self._rows_changed(0, len(self.rows) - 1)
+
+    def is_page_checked(self):
+        # An empty page (a search without results) has nothing to check
+        return bool(self.picking_ids) and all(picking_id in self.selected for picking_id in self.picking_ids)
+
+    def remove_selected(self, picking_ids):
+        self.selected.difference_update(str(picking_id) for picking_id in picking_ids)
+        if self.rows:
+            self._rows_changed(0, len(self.rows) - 1)
+
+    def _rows_changed(self, first, last):
+        self.dataChanged.emit(self.index(first, 0), self.index(last, len(COLUMNS) - 1))
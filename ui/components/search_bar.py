@@ -1,6 +1,9 @@
 import os
 from PySide6.QtWidgets import ( QWidget, QHBoxLayout, QLineEdit, QPushButton )
-from PySide6.QtCore import Qt, Signal
+from PySide6.QtCore import Qt, Signal, QTimer
+
+# Typing pauses this long (ms) before the search runs
+SEARCH_DEBOUNCE_MS = 300
 
 class SearchBar(QWidget):
 
@@ -13,6 +16,14 @@ class SearchBar(QWidget):
         self.search_edit = QLineEdit()
         self.search_edit.setStyleSheet("QLineEdit { padding: 6px; }")
         self.search_edit.setPlaceholderText("検索語を入力してください...")
+        self.search_edit.textChanged.connect(self.on_text_changed)
+        self.search_edit.returnPressed.connect(self.on_search_button_clicked)
+
+        # Search as you type, once typing pauses
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.debounce_timer.timeout.connect(self.on_search_button_clicked)
         
         self.search_button = QPushButton("検 索")
         self.search_button.setStyleSheet("QPushButton { text-align: center; width: 60px; height: 26px;}")
@@ -25,7 +36,11 @@ class SearchBar(QWidget):
         
         self.setLayout(search_layout)
     
+    def on_text_changed(self, text):
+        self.debounce_timer.start()
+
     def on_search_button_clicked(self):
+        self.debounce_timer.stop()
         self.on_search.emit(self.search_edit.text())
     def get_text(self):
         return self.search_edit.text()
@@ -1,7 +1,19 @@
-from PySide6.QtWidgets import ( QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView, QCheckBox, QWidget, QHBoxLayout )
+from PySide6.QtWidgets import ( QTableView, QAbstractItemView, QHeaderView, QCheckBox, QWidget, QHBoxLayout )
 from PySide6.QtCore import Qt, QRect, Signal, QTimer
 
-class TableWidget(QTableWidget):
+from ui.components.picking_table_model import PickingTableModel, COLUMNS
+
+ROW_HEIGHT = 30
+# Column widths are fitted to this many rows instead of the whole page
+ROWS_SAMPLED_FOR_WIDTH = 100
+
+class TableWidget(QTableView):
+    """
+    Picking list on a model/view pair
+
+    Only the visible rows are painted, and checking rows touches the model's
+    selection set instead of per-row widgets.
+    """
     
     selection_updated = Signal(int, int)
 
@@ -9,30 +21,24 @@ class TableWidget(QTableWidget):
         super().__init__()
         self.total_count = 0
         self.selected_count = 0
-        self.selected_items = {}
+        self.picking_model = PickingTableModel(self)
+        self.setModel(self.picking_model)
         self.init_ui()
 
     def init_ui(self):
-        self.setColumnCount(12)
         self.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        self.setSelectionMode(QTableWidget.NoSelection)
-        self.setHorizontalHeaderLabels(["", "出荷日付", "ピッキング連番", "ピッキング日", "ピッキング時刻","受注No_From", "受注No_To", "得意先CD_From", "得意先CD_To", "得意先略称", "担当者CD", "担当者略称"])
-        self.horizontalHeader().setSectionResizeMode(11, QHeaderView.Stretch)
-        self.horizontalHeader().setSectionResizeMode(0, QHeaderView.Fixed)
-        self.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(5, QHeaderView.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(6, QHeaderView.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(7, QHeaderView.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(8, QHeaderView.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(9, QHeaderView.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(10, QHeaderView.ResizeToContents)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        header = self.horizontalHeader()
+        header.setResizeContentsPrecision(ROWS_SAMPLED_FOR_WIDTH)
+        for column in range(1, len(COLUMNS) - 1):
+            header.setSectionResizeMode(column, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(len(COLUMNS) - 1, QHeaderView.Stretch)
+        header.setSectionResizeMode(0, QHeaderView.Fixed)
+        # Fixed row heights: the view never measures rows it doesn't paint
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.verticalHeader().setDefaultSectionSize(ROW_HEIGHT)
         self.setColumnWidth(0, 40)  # First column (checkbox)
-        # self.setColumnHidden(1, True)
         self.setStyleSheet("QHeaderView::section { padding: 8px; font-size: 14px;}")
-        self.setSelectionBehavior(QTableWidget.SelectRows)
         self.clicked.connect(self.on_row_click)
         QTimer.singleShot(0, lambda: self.setColumnWidth(0, 40))
 
@@ -40,129 +46,41 @@ class TableWidget(QTableWidget):
         self.checkbox_all.setChecked(False)
         self.checkbox_all.clicked.connect(self.toggle_select_all)
         
-        widget=QWidget(self.horizontalHeader())
+        widget=QWidget(header)
         widget.setGeometry(QRect(0, 0, 38, 40))
         layout=QHBoxLayout(widget)
         layout.setAlignment(Qt.AlignCenter)  # Center the checkbox
         layout.setContentsMargins(0, 0, 0, 0)
         layout.addWidget(self.checkbox_all)
         widget.setLayout(layout)
-        self.setCellWidget(0, 0, widget)
 
     def update_table(self, items, total_count):
         self.total_count = total_count
-        self.setRowCount(0)
-        self.checkbox_all.setChecked(True)
-        for row, item in enumerate(items):
-            self.insertRow(row)
-            
-            checkbox_layout = QHBoxLayout()
-            checkbox_layout.setContentsMargins(0, 0, 0, 0)
-            checkbox_widget = QWidget()
-            checkbox = QCheckBox()
-            checkbox.clicked.connect(self.on_checkbox_clicked)
-            checkbox_layout.setAlignment(Qt.AlignCenter)
-            checkbox_layout.addWidget(checkbox)
-            checkbox_widget.setLayout(checkbox_layout)
-            self.setCellWidget(row, 0, checkbox_widget)
-            self.setItem(row, 1, QTableWidgetItem(str(item.get("shipping_date", ""))))
-            self.setItem(row, 2, QTableWidgetItem(str(item.get("picking_id", ""))))
-            self.setItem(row, 3, QTableWidgetItem(str(item.get("picking_date", ""))))
-            self.setItem(row, 4, QTableWidgetItem(str(item.get("picking_time", ""))))
-            self.setItem(row, 5, QTableWidgetItem(str(item.get("order_no_from", ""))))
-            self.setItem(row, 6, QTableWidgetItem(str(item.get("order_no_to", ""))))
-            self.setItem(row, 7, QTableWidgetItem(str(item.get("customer_code_from", ""))))
-            self.setItem(row, 8, QTableWidgetItem(str(item.get("customer_code_to", ""))))
-            self.setItem(row, 9, QTableWidgetItem(str(item.get("customer_short_name", ""))))
-            self.setItem(row, 10, QTableWidgetItem(str(item.get("staff_code", ""))))
-            self.setItem(row, 11, QTableWidgetItem(str(item.get("staff_short_name", ""))))
-
-            picking_id = str(item.get("picking_id", ""))
-            if picking_id in self.selected_items and self.selected_items[picking_id] == 1:
-                checkbox.setChecked(True)
-                for i in range(self.columnCount()):
-                    item = self.item(row, i)
-                    if item:
-                        item.setSelected(True)
-            else:
-                self.checkbox_all.setChecked(False)
-
+        self.picking_model.set_pickings(items)
+        self.checkbox_all.setChecked(self.picking_model.is_page_checked())
         self.update_selected_count()
 
-    def on_checkbox_clicked(self):
-        self.update_selection()
-
-    def on_row_click(self, item):
-        row = item.row()
-        checkbox = self.cellWidget(row, 0).findChild(QCheckBox)
-        if checkbox and checkbox.isChecked():
-            checkbox.setChecked(False)
-        else:
-            checkbox.setChecked(True)
-
-        self.update_selection()
-
-    def toggle_select_all(self):
-        state = self.checkbox_all.checkState()
-
-        for row in range(self.rowCount()):
-            item = self.cellWidget(row, 0).findChild(QCheckBox)
-            if item:
-                item.setChecked(state == Qt.Checked)
-
-            if state == Qt.Checked:
-                for i in range(self.columnCount()):
-                    item = self.item(row, i)
-                    if item:
-                        item.setSelected(True)
-                        self.selected_items[self.item(row, 2).text()] = 1
-            else:
-                for i in range(self.columnCount()):
-                    item = self.item(row, i)
-                    if item:
-                        item.setSelected(False)
-                        self.selected_items[self.item(row, 2).text()] = 0
+    def on_row_click(self, index):
+        self.picking_model.toggle_row(index.row())
+        self.checkbox_all.setChecked(self.picking_model.is_page_checked())
         self.update_selected_count()
 
-    def update_selection (self):
-        for row in range(self.rowCount()):
-            checkbox = self.cellWidget(row, 0).findChild(QCheckBox)
-
-            if checkbox and checkbox.isChecked():
-                for i in range(self.columnCount()):
-                    item = self.item(row, i)
-                    if item:
-                        item.setSelected(True)
-                        self.selected_items[self.item(row, 2).text()] = 1
-            else:
-                for i in range(self.columnCount()):
-                    item = self.item(row, i)
-                    if item:
-                        item.setSelected(False)
-                        self.selected_items[self.item(row, 2).text()] = 0
-        
+    def toggle_select_all(self):
+        self.picking_model.set_page_checked(self.checkbox_all.isChecked())
         self.update_selected_count()
 
     def update_selected_count (self):
-        self.selected_count = 0
-        for key in self.selected_items.keys():
-            if self.selected_items[key] == 1:
-                self.selected_count += 1
-
+        self.selected_count = len(self.picking_model.selected)
         self.selection_updated.emit(self.total_count, self.selected_count)
 
     def get_selected_items(self):
-        result = []
-        for key in self.selected_items.keys():
-            if self.selected_items[key] == 1:
-                result.append(key)
-        return result
+        return list(self.picking_model.selected)
 
     def remove_pickings(self, pickings):
-        """Remove pickings from the table."""
-        for picking in pickings:
-            self.selected_items[str(picking['picking_id'])] = -1
+        """Remove pickings from the selection."""
+        self.picking_model.remove_selected(picking['picking_id'] for picking in pickings)
+        self.update_selected_count()
 
     def clear_table(self):
         """Clear all rows from the table."""
-        self.setRowCount(0)
+        self.picking_model.clear()
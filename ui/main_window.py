@@ -1,7 +1,9 @@
+import os
 import sys
+import time
 
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QMessageBox)
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer, Signal
 
 # UI Components
 from ui.components.search_bar import SearchBar
@@ -9,16 +11,54 @@ from ui.components.table_widget import TableWidget
 from ui.components.pagination import Pagination
 from ui.components.spinner import Spinner
 
-# Api Client
-from ui.api.api_client import ApiClient
-from ui.api.data_fetcher_thread import DataFetcherThread
+# Api Client (ApiClient, and with it requests, is imported on first use)
+from ui.api.task_executor import TaskExecutor
+from ui.api.backend_starter_thread import BackendStarterThread
+from ui.api.page_cache import PageCache
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+
+    first_painted = Signal()
+
+    def __init__(self, start_backend=None):
         super().__init__()
+        self.start_backend = start_backend
+        self._api_client = None
+        self._painted = False
+        self.tasks = TaskExecutor(self)
+        self.page_cache = PageCache()
         self.init_ui()
-        self.api_client = ApiClient()
-        self.get_pickings()
+        self.first_painted.connect(self.on_first_paint)
+
+    @property
+    def api_client(self):
+        if self._api_client is None:
+            from ui.api.api_client import ApiClient
+            self._api_client = ApiClient()
+        return self._api_client
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._painted:
+            self._painted = True
+            # Start the slow work only once the window is on screen
+            QTimer.singleShot(0, self.first_painted.emit)
+
+    def on_first_paint(self):
+        if self.start_backend is None:
+            self.get_pickings()
+            return
+        self.spinner.start()
+        self.backend_thread = BackendStarterThread(self.start_backend)
+        self.backend_thread.backend_ready.connect(self.on_backend_ready)
+        self.backend_thread.start()
+
+    def on_backend_ready(self, ready):
+        if ready:
+            self.get_pickings()
+        else:
+            self.show_error("バックエンドの起動に失敗しました。")
+            QApplication.quit()
 
     def init_ui(self):
         
@@ -35,7 +75,7 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(title_label)                                                             
 
         self.search_bar = SearchBar()
-        self.search_bar.on_search.connect(lambda search_text: self.get_pickings())
+        self.search_bar.on_search.connect(lambda search_text: self.on_search())
         main_layout.addWidget(self.search_bar)
 
         self.table = TableWidget()
@@ -66,25 +106,65 @@ class MainWindow(QMainWindow):
         self.spinner = Spinner(self)
         self.shipping_btn.setFocus()
 
+    def call_api(self, channel, key, method, params, on_success, on_error=None):
+        """Run an ApiClient call on the worker pool; see TaskExecutor for channels and keys"""
+        api_client = self.api_client
+
+        def run(cancel):
+            resp = getattr(api_client, method)(params, cancel)
+            if isinstance(resp, dict) and "err_msg" in resp:
+                raise RuntimeError(resp["err_msg"])
+            return resp
+
+        self.tasks.submit(channel, key, run, on_success, on_error)
+
     def get_pickings(self):
+        query = self.search_bar.get_text()
+        page = self.pagination.get_current_page()
+        page_size = self.pagination.get_page_size()
+        key = PageCache.key(query, page, page_size)
+
+        cached = self.page_cache.get(key)
+        if cached is not None:
+            # Supersedes a fetch that is still running for another page
+            self.tasks.cancel("pickings")
+            self.on_picking_data_success(cached)
+            self.prefetch_next_page(query, page, page_size, cached["total"])
+            return
+
         self.spinner.start()
-        self.data_thread = DataFetcherThread(self.api_client, "get-pickings", {
-            "query": self.search_bar.get_text(),
-            "skip": self.pagination.get_page_size() * (self.pagination.get_current_page()),
-            "limit": self.pagination.get_page_size()
-        })
-        self.data_thread.data_fetched.connect(lambda resp: self.on_picking_data_success(resp))
-        self.data_thread.error_occurred.connect(self.show_error)
-        self.data_thread.start()
+        self.call_api("pickings", key, "get_pickings", self.pickings_params(query, page, page_size),
+                      lambda resp: self.on_pickings_fetched(key, resp), self.show_error)
+
+    def pickings_params(self, query, page, page_size):
+        return {
+            "query": query,
+            "skip": page_size * page,
+            "limit": page_size
+        }
+
+    def on_pickings_fetched(self, key, resp):
+        if "pickings" in resp:
+            self.page_cache.put(key, resp)
+            query, page, page_size = key
+            self.prefetch_next_page(query, page, page_size, resp["total"])
+        self.on_picking_data_success(resp)
+
+    def prefetch_next_page(self, query, page, page_size, total):
+        """Fetch the following page in the background so the next click is instant"""
+        next_key = PageCache.key(query, page + 1, page_size)
+        if (page + 1) * page_size >= total or next_key in self.page_cache:
+            return
+        self.call_api("prefetch", next_key, "get_pickings", self.pickings_params(query, page + 1, page_size),
+                      lambda resp: self.page_cache.put(next_key, resp) if "pickings" in resp else None)
 
     def do_shipping(self):
         self.spinner.start()
-        self.shipping_thread = DataFetcherThread(self.api_client, "do-shipping", {
-            "picking_ids": self.table.get_selected_items()
-        })
-        self.shipping_thread.data_fetched.connect(lambda resp: self.on_shipping_success(resp))
-        self.shipping_thread.error_occurred.connect(self.show_error)
-        self.shipping_thread.start()
+        picking_ids = self.table.get_selected_items()
+        # Repeated clicks on the same selection join the running request
+        self.call_api("shipping", tuple(sorted(picking_ids)), "do_shipping", {
+            "picking_ids": picking_ids
+        }, self.on_shipping_success, self.show_error)
 
     def on_picking_data_success(self, resp):
         if "pickings" in resp:
@@ -96,6 +176,8 @@ class MainWindow(QMainWindow):
         if(resp['success'] == True):
             self.show_message("運送会社", resp["message"], QMessageBox.Information)
             self.table.remove_pickings(resp['results'])
+            # Selected pickings drop out of the list, so every cached page is stale
+            self.page_cache.clear()
             self.get_pickings()
         else:
             self.show_message("運送会社", "選定に失敗しました。", QMessageBox.Critical)
@@ -115,17 +197,30 @@ class MainWindow(QMainWindow):
         self.spinner.stop()
         QMessageBox.critical(self, "Error", message)
 
+    def closeEvent(self, event):
+        # Stop reading responses nobody will see
+        self.tasks.cancel_all()
+        super().closeEvent(event)
+
     # Signals
 
+    def on_search(self):
+        # New results start on the first page
+        self.pagination.reset_page()
+        self.get_pickings()
+
     def on_page_changed(self):
         self.get_pickings()
     
     def on_page_size_changed(self):
         self.get_pickings()
 
-def main():
+def main(start_backend=None, startup_probe=False):
     app = QApplication(sys.argv)
-    window = MainWindow()
+    window = MainWindow(start_backend)
+    if startup_probe:
+        # Report time-to-first-paint to benchmarks/startup.py and exit right away
+        window.first_painted.connect(lambda: (print(f"FIRST_PAINT {time.time():.6f}", flush=True), os._exit(0)))
     window.show()
     sys.exit(app.exec_())
 